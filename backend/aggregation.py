@@ -0,0 +1,129 @@
+"""Category aggregation for the /visualize route.
+
+Totals are read from the expense_rollup table maintained by rollups.py, so a
+dashboard read touches O(categories x periods) rows instead of every expense.
+The GROUP BY over raw expenses and the original pandas implementation are
+kept as reference paths for benchmarks/bench_visualize.py.
+"""
+from sqlalchemy import func, select
+
+from models import db, Expense, ExpenseRollup
+from validation import parse_date
+
+# strftime patterns used to bucket expenses by period
+GRANULARITIES = {
+    'day': '%Y-%m-%d',
+    'week': '%Y-W%W',
+    'month': '%Y-%m',
+    'year': '%Y',
+}
+
+
+def parse_aggregation_args(args):
+    """Extract start/end/granularity from request args, raising ValueError on bad input"""
+    start = parse_date(args['start'], 'start') if args.get('start') else None
+    end = parse_date(args['end'], 'end') if args.get('end') else None
+    granularity = args.get('granularity')
+    if granularity is not None and granularity not in GRANULARITIES:
+        raise ValueError(f"'granularity' must be one of: {', '.join(GRANULARITIES)}")
+    return start, end, granularity
+
+
+def _apply_range(stmt, user_id, start, end):
+    stmt = stmt.where(Expense.user_id == user_id)
+    if start:
+        stmt = stmt.where(Expense.date >= start)
+    if end:
+        stmt = stmt.where(Expense.date <= end)
+    return stmt
+
+
+def rollup_totals_query(user_id, start=None, end=None, granularity=None):
+    """Build the statement behind category_totals, reading from the rollups
+
+    All-time and month/year totals without a date range come from the 'all'
+    and 'month' buckets; anything else sums the 'day' buckets in range.
+    """
+    rollup = ExpenseRollup
+    if not start and not end and granularity in (None, 'month', 'year'):
+        period_type = 'month' if granularity else 'all'
+    else:
+        period_type = 'day'
+
+    filters = [rollup.user_id == user_id, rollup.period_type == period_type]
+    if start:
+        filters.append(rollup.period >= start.isoformat())
+    if end:
+        filters.append(rollup.period <= end.isoformat())
+
+    if not granularity:
+        return (select(rollup.category, func.sum(rollup.total))
+                .where(*filters).group_by(rollup.category).order_by(rollup.category))
+
+    if period_type == 'month':
+        period = rollup.period if granularity == 'month' else func.substr(rollup.period, 1, 4)
+    else:
+        period = func.strftime(GRANULARITIES[granularity], rollup.period)
+    period = period.label('period')
+    return (select(period, rollup.category, func.sum(rollup.total))
+            .where(*filters).group_by(period, rollup.category).order_by(period, rollup.category))
+
+
+def category_totals_query(user_id, start=None, end=None, granularity=None):
+    """Build the equivalent GROUP BY over the raw expense rows"""
+    if granularity:
+        period = func.strftime(GRANULARITIES[granularity], Expense.date).label('period')
+        stmt = select(period, Expense.category, func.sum(Expense.amount))
+        stmt = _apply_range(stmt, user_id, start, end)
+        return stmt.group_by(period, Expense.category).order_by(period, Expense.category)
+
+    stmt = select(Expense.category, func.sum(Expense.amount))
+    stmt = _apply_range(stmt, user_id, start, end)
+    return stmt.group_by(Expense.category).order_by(Expense.category)
+
+
+def category_totals(user_id, start=None, end=None, granularity=None, query=rollup_totals_query):
+    """Return the chart payload for a user, or None if no expenses match"""
+    return totals_payload(db.session.execute(query(user_id, start, end, granularity)).all(), granularity)
+
+
+def totals_payload(rows, granularity=None):
+    """Shape category_totals rows into the chart payload, or None for no rows"""
+    if not rows:
+        return None
+
+    if granularity:
+        return {
+            "periods": [row[0] for row in rows],
+            "categories": [row[1] for row in rows],
+            "amounts": [row[2] for row in rows],
+        }
+    return {
+        "categories": [row[0] for row in rows],
+        "amounts": [row[1] for row in rows],
+    }
+
+
+def category_totals_pandas(user_id, start=None, end=None):
+    """Previous implementation: load every Expense and group in pandas"""
+    import pandas as pd
+
+    query = Expense.query.filter_by(user_id=user_id)
+    if start:
+        query = query.filter(Expense.date >= start)
+    if end:
+        query = query.filter(Expense.date <= end)
+    expenses = query.all()
+    if not expenses:
+        return None
+
+    df = pd.DataFrame({
+        "Date": [expense.date for expense in expenses],
+        "Category": [expense.category for expense in expenses],
+        "Amount": [expense.amount for expense in expenses]
+    })
+    grouped_data = df.groupby("Category")["Amount"].sum().reset_index()
+    return {
+        "categories": grouped_data["Category"].tolist(),
+        "amounts": grouped_data["Amount"].tolist()
+    }
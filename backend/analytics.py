@@ -0,0 +1,140 @@
+"""Spending time series for /analytics/<user_id>/timeseries.
+
+Daily totals come from the 'day' rollups (one row per active day and
+category, not per expense) and are laid out as a dense day x category
+frame. Each day is mapped to the period it falls in, period totals are
+summed with np.add.reduceat, and rolling windows are taken from running
+sums over the daily series, read off at the end of each period. Cumulative
+sums and period-over-period deltas are computed on the per-period totals.
+The frame spans only the days that have rows, and a range holding more
+periods than PERIOD_LIMITS allows is refused before anything is allocated.
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+
+from models import db, ExpenseRollup
+
+ROLLING_WINDOWS = (7, 30, 90)
+
+# Most periods in one response: a year of days, twenty years of weeks, a century of months
+PERIOD_LIMITS = {'day': 366, 'week': 1044, 'month': 1200}
+
+# For each granularity, the first day of the period each day falls in
+TIMESERIES_GRANULARITIES = {
+    'day': lambda days: days,
+    # Monday-to-Sunday weeks labelled by their Monday; 1970-01-01 was a Thursday
+    'week': lambda days: days - ((days.astype('int64') + 3) % 7).astype('timedelta64[D]'),
+    'month': lambda days: days.astype('datetime64[M]'),
+}
+
+
+def daily_totals_query(user_id, start=None, end=None, categories=None):
+    """SELECT (category, days, totals) from the user's 'day' rollups, one row per category
+
+    days and totals are comma-separated lists in matching order, so a handful
+    of strings reach Python rather than a row for every day and category.
+    """
+    rollup = ExpenseRollup
+    stmt = (select(rollup.category, func.group_concat(rollup.period), func.group_concat(rollup.total))
+            .where(rollup.user_id == user_id, rollup.period_type == 'day')
+            .group_by(rollup.category))
+    if start:
+        stmt = stmt.where(rollup.period >= start.isoformat())
+    if end:
+        stmt = stmt.where(rollup.period <= end.isoformat())
+    if categories:
+        stmt = stmt.where(rollup.category.in_(categories))
+    return stmt
+
+
+def daily_totals(user_id, granularity='month', start=None, end=None, categories=None):
+    """Return a day x category DataFrame of spend, with missing days filled with 0"""
+    stmt = daily_totals_query(user_id, start, end, categories)
+    return daily_frame(db.session.connection().execute(stmt).all(), granularity)
+
+
+def period_count(first, last, granularity):
+    """Number of periods of a granularity from day first to day last"""
+    periods = TIMESERIES_GRANULARITIES[granularity](np.array([first, last], dtype='datetime64[D]'))
+    step = 7 if granularity == 'week' else 1
+    return int((periods[1] - periods[0]).astype('int64')) // step + 1
+
+
+def daily_frame(rows, granularity='month'):
+    """Lay daily_totals_query rows out as the dense frame, or None if there are none
+
+    Raises ValueError if the rows span more periods than PERIOD_LIMITS allows.
+    """
+    if not rows:
+        return None
+
+    rows = sorted(rows)
+    days = [np.array(periods.split(','), dtype='datetime64[D]') for _, periods, _ in rows]
+    # From the first to the last day with spend, whatever start/end asked for
+    first = min(column.min() for column in days)
+    last = max(column.max() for column in days)
+    limit = PERIOD_LIMITS[granularity]
+    if period_count(first, last, granularity) > limit:
+        raise ValueError(f"A {granularity} series covers at most {limit} periods; narrow 'start' and 'end'")
+    grid = np.zeros(((last - first).astype('int64') + 1, len(rows)))
+    for position, (column_days, (_, _, totals)) in enumerate(zip(days, rows)):
+        # Each category has at most one rollup per day
+        grid[(column_days - first).astype('int64'), position] = np.array(totals.split(','), dtype='float64')
+
+    index = pd.date_range(pd.Timestamp(first), periods=len(grid), freq='D')
+    return pd.DataFrame(grid, index=index, columns=[name for name, _, _ in rows])
+
+
+def _columns(values):
+    """Round a periods x columns float array for JSON, one list per column, NaN/inf as None"""
+    values = np.round(values, 2).T
+    columns = values.tolist()
+    for column, period in zip(*np.nonzero(~np.isfinite(values))):
+        columns[column][period] = None
+    return columns
+
+
+def timeseries(user_id, granularity='month', start=None, end=None, categories=None):
+    """Build the timeseries payload, or None if the user has no matching expenses"""
+    return timeseries_payload(daily_totals(user_id, granularity, start, end, categories), granularity)
+
+
+def timeseries_payload(daily, granularity='month'):
+    """Build the timeseries payload from a daily_totals frame (None passes through)"""
+    if daily is None:
+        return None
+    names = list(daily.columns)
+    values = daily.to_numpy()
+    # The last column is the total over all categories
+    spend = np.column_stack([values, values.sum(axis=1)])
+
+    # Days are consecutive, so each period is a run of rows
+    periods = TIMESERIES_GRANULARITIES[granularity](daily.index.to_numpy().astype('datetime64[D]'))
+    starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+    ends = np.r_[starts[1:], len(periods)]
+
+    totals = np.add.reduceat(spend, starts, axis=0)
+    change = np.full_like(totals, np.nan)
+    change[1:] = totals[1:] - totals[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change_pct = np.r_[np.full((1, totals.shape[1]), np.nan), change[1:] / totals[:-1] * 100]
+    series = {"totals": totals, "cumulative": np.cumsum(totals, axis=0), "change": change, "change_pct": change_pct}
+
+    # Trailing averages of daily spend, read off at each period's last day
+    running = np.vstack([np.zeros((1, spend.shape[1])), np.cumsum(spend, axis=0)])
+    for window in ROLLING_WINDOWS:
+        lengths = np.minimum(ends, window)
+        series[f"rolling_{window}d"] = (running[ends] - running[ends - lengths]) / lengths[:, None]
+
+    series = {key: _columns(values) for key, values in series.items()}
+
+    def describe(position):
+        return {key: columns[position] for key, columns in series.items()}
+
+    return {
+        "granularity": granularity,
+        "periods": np.datetime_as_string(periods[starts]).tolist(),
+        "categories": {name: describe(position) for position, name in enumerate(names)},
+        "total": describe(len(names)),
+    }
@@ -1,51 +1,150 @@
-from flask import Flask, jsonify, request
-from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
-import pandas as pd
+from flask import Flask, Response, g, jsonify, request, stream_with_context
+
+from models import db, User, Expense
+from aggregation import parse_aggregation_args, rollup_totals_query, totals_payload
+from analytics import TIMESERIES_GRANULARITIES, daily_frame, daily_totals_query, timeseries_payload
+from auth import InvalidToken, bearer_token, check_token, issue_token, require_auth, revoke, sync_revocations
+from cache import bump_versions, conditional, data_version, data_version_query, response_cache
+from changes import changes_since, deleted_change, expense_change, parse_changes_args, record_deletes
+from config import get_config
+from events import STREAM_HEADERS, TooManySubscribers, broker, change_event, iter_events
+from export import EXPORT_FORMATS, export_stream, iter_expense_batches, parquet_available
+from importer import DEFAULT_CATEGORY, import_statement, open_text_stream
+from ingest import ingest, iter_bulk_records
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics, span
+from migrate import upgrade
+from passwords import PasswordPoolBusy, hasher
+from pragmas import apply_pragmas
+from profiling import format_collapsed, profiler, require_profiling_token
+from queries import expense_filters, expense_row_to_dict, filtered_expenses, paginate_expenses
+from serialization import (COLUMNS_MIMETYPE, FastJSONProvider, compress_response, compressible, expense_columns,
+                           wants_columns)
+from validation import parse_amount, parse_category, parse_date, parse_description
+import rollups
 
 # Initialize the Flask app
 app = Flask(__name__)
+# orjson for jsonify() and request bodies when it is installed (see serialization.py)
+app.json = FastJSONProvider(app)
 
-# Configure the SQLite database
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///finance.db'  # Database file will be created in the project directory
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Load settings from the config object named by FINANCE_CONFIG (see config.py)
+app.config.from_object(get_config())
 
 # Initialize the database
-db = SQLAlchemy(app)
-bcrypt = Bcrypt()
-
-# Define the User model
-class User(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(50), unique=True, nullable=False)
-    password = db.Column(db.String(128), nullable=False)  # Increased size for hashed passwords
-
-    # Method to set password securely
-    def set_password(self, password):
-        self.password = bcrypt.generate_password_hash(password).decode('utf-8')
-
-    # Method to check password validity
-    def check_password(self, password):
-        return bcrypt.check_password_hash(self.password, password)
-
-# Define the Expense model
-class Expense(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    date = db.Column(db.String(10), nullable=False)  # Format: YYYY-MM-DD
-    category = db.Column(db.String(50), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
-    description = db.Column(db.String(200))
-
-# Create the database tables
+db.init_app(app)
+hasher.init_app(app)
+response_cache.init_app(app)
+metrics.init_app(app)
+profiler.init_app(app)
+
+# Create the database tables and bring databases from older versions up to date
 with app.app_context():
-    db.create_all()
+    apply_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+    upgrade(db.engine)
+    metrics.instrument(db.engine)
+
+# Time every request by route for /metrics
+@app.before_request
+def start_request_timer():
+    metrics.start_request(request.url_rule)
+
+@app.after_request
+def record_request_timer(response):
+    metrics.finish_request(request.method, response.status_code)
+    return response
+
+@app.teardown_request
+def drop_request_timer(exc):
+    metrics.finish_request(request.method, 500)  # Only still running if no response was made
+
+# Profile the request if it asks to be or its endpoint is selected (see profiling.py)
+@app.before_request
+def start_profile():
+    profile = profiler.start(request.endpoint, request.method, request.path, request.headers)
+    if profile is not None:
+        g.profile = profile
+
+@app.after_request
+def finish_profile(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.finish(profile, response.status_code)
+        response.headers['X-Profile-Id'] = str(profile.id)
+    return response
+
+@app.teardown_request
+def drop_profile(exc):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.finish(profile, 500)
+
+# Compress large JSON and text bodies for clients that accept it; registered last, so it runs
+# before the hooks above and its cost is counted in the request's timings
+@app.after_request
+def compress(response):
+    if compressible(response) and not response.is_streamed:
+        compress_response(response, response.get_data(), request.accept_encodings, app.config['COMPRESS_MIN_BYTES'])
+    return response
 
 # Home route
 @app.route('/')
 def home():
     return jsonify({"message": "Welcome to the Finance Dashboard!"})
 
+# Request, stage and SQL timings for this process in Prometheus text format (see metrics.py)
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    if not app.config['METRICS_ENABLED']:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+# Recent request profiles, newest first, plus the live profiling settings
+@app.route('/admin/profiles', methods=['GET'])
+@require_profiling_token
+def list_profiles():
+    return jsonify({
+        "profiles": [profile.to_dict() for profile in profiler.profiles()],
+        "settings": profiler.settings()
+    }), 200
+
+# One profile as collapsed stacks for flamegraph tools, or format=pstats for a cProfile table
+@app.route('/admin/profiles/<int:profile_id>', methods=['GET'])
+@require_profiling_token
+def get_profile(profile_id):
+    profile = profiler.get(profile_id)
+    if profile is None:
+        return jsonify({"error": "Profile not found (it may have been rotated out)"}), 404
+
+    if request.args.get('format') == 'pstats':
+        if profile.profiler is None:
+            return jsonify({"error": "Only cprofile profiles have a pstats table"}), 400
+        return Response(profile.pstats_text(), mimetype='text/plain')
+    return Response(format_collapsed(profile.collapsed()), mimetype='text/plain')
+
+# Every kept profile merged into one set of collapsed stacks; optional query param: endpoint
+@app.route('/admin/profiles/collapsed', methods=['GET'])
+@require_profiling_token
+def merged_profiles():
+    return Response(format_collapsed(profiler.merged(request.args.get('endpoint'))), mimetype='text/plain')
+
+# Change which endpoints are profiled, how often and how, without a restart (this process only)
+@app.route('/admin/profiles/settings', methods=['GET', 'PUT'])
+@require_profiling_token
+def profiling_settings():
+    if request.method == 'GET':
+        return jsonify(profiler.settings()), 200
+    try:
+        settings = profiler.update_settings(request.get_json() or {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(settings), 200
+
+# Password hashing is saturated; ask the client to retry shortly instead of queueing
+@app.errorhandler(PasswordPoolBusy)
+def password_pool_busy(e):
+    db.session.rollback()
+    return jsonify({"error": "Server busy, please retry"}), 503, {"Retry-After": "1"}
+
 # User registration route
 @app.route('/register', methods=['POST'])
 def register():
@@ -75,16 +174,42 @@ def login():
     user = User.query.filter_by(username=username).first()
 
     # Check if user exists and verify password
-    if not user or not user.check_password(password):
+    with span('password'):
+        valid = user is not None and user.check_password(password)
+    if not valid:
         return jsonify({"error": "Invalid username or password"}), 401
 
-    return jsonify({"message": "Login successful", "user_id": user.id}), 200
+    # Re-hash with the current work factor now that we have the plain password
+    if user.password_needs_rehash():
+        try:
+            user.set_password(password)
+            db.session.commit()
+        except PasswordPoolBusy:
+            pass  # Not worth failing a good login over; it will be retried next time
+
+    token, expires = issue_token(user.id)
+    return jsonify({"message": "Login successful", "user_id": user.id, "token": token, "expires": expires}), 200
+
+# Logout route: revokes the bearer token until it would have expired
+@app.route('/logout', methods=['POST'])
+def logout():
+    token = bearer_token()
+    try:
+        if token is None:
+            raise InvalidToken("Missing token")
+        revoke(token)
+    except InvalidToken as e:
+        return jsonify({"error": f"Authentication required: {e}"}), 401
+
+    return jsonify({"message": "Logged out"}), 200
 
 # Add an expense route
+# user_id defaults to the signed-in user and may not name anyone else
 @app.route('/expenses', methods=['POST'])
+@require_auth
 def add_expense():
     data = request.get_json()
-    user_id = data.get('user_id')
+    user_id = data.get('user_id', g.user_id)
     date = data.get('date')
     category = data.get('category')
     amount = data.get('amount')
@@ -93,86 +218,315 @@ def add_expense():
     if not user_id or not date or not category or not amount:
         return jsonify({"error": "Missing required fields"}), 400
 
-    new_expense = Expense(user_id=user_id, date=date, category=category, amount=amount, description=description)
+    if str(user_id) != str(g.user_id):
+        return jsonify({"error": "Forbidden"}), 403
+
+    try:
+        date = parse_date(date)
+        category = parse_category(category)
+        amount = parse_amount(amount)
+        description = parse_description(description)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    seq = bump_versions(db.session, [g.user_id])[g.user_id]
+    new_expense = Expense(user_id=g.user_id, date=date, category=category, amount=amount, description=description,
+                          updated_seq=seq)
     db.session.add(new_expense)
-    db.session.commit()
+    rollups.record(db.session, new_expense)
+    db.session.flush()
+    event = change_event(seq, [expense_change(new_expense)])
+    with span('commit'):
+        db.session.commit()
+    broker.publish(g.user_id, event)
 
     return jsonify({"message": "Expense added successfully"}), 201
 
-# Get all expenses for a user
+# Bulk add expenses from a JSON array or NDJSON body
+# Valid rows are inserted in one transaction; invalid rows (including other users' rows) are reported by position
+# As with POST /expenses, a row's user_id defaults to the signed-in user
+@app.route('/expenses/bulk', methods=['POST'])
+@require_auth
+def add_expenses_bulk():
+    try:
+        with span('ingest'):
+            inserted, errors = ingest(iter_bulk_records(request), user_id=g.user_id)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+
+    if not inserted and errors:
+        db.session.rollback()
+        return jsonify({"inserted": 0, "errors": errors}), 400
+
+    with span('commit'):
+        db.session.commit()
+    broker.publish(g.user_id, change_event(data_version(g.user_id)))
+    return jsonify({"inserted": inserted, "errors": errors}), 201
+
+# Import a bank statement (CSV or OFX) for a user
+# Send the file as the raw body or as a multipart 'file' field
+# Optional query params: format (csv/ofx), category, date_format, debits_negative
+@app.route('/expenses/<int:user_id>/import', methods=['POST'])
+@require_auth
+def import_expenses(user_id):
+    upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+    stream = upload.stream if upload else request.stream
+    filename = (upload.filename or '') if upload else ''
+
+    fmt = request.args.get('format')
+    if not fmt:
+        is_ofx = filename.lower().endswith(('.ofx', '.qfx')) or request.mimetype in ('application/x-ofx', 'application/ofx')
+        fmt = 'ofx' if is_ofx else 'csv'
+
+    try:
+        result = import_statement(
+            open_text_stream(stream), user_id, fmt,
+            category=request.args.get('category', DEFAULT_CATEGORY),
+            date_format=request.args.get('date_format'),
+            debits_negative=request.args.get('debits_negative', '').lower() in ('1', 'true', 'yes')
+        )
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+
+    if result.imported:
+        broker.publish(user_id, change_event(data_version(user_id)))
+    return jsonify(result.to_dict()), 201 if result.imported else 200
+
+# Get expenses for a user, newest first
+# Paginated with limit/before/after cursors; filters: category, start, end, min_amount, max_amount
+# Pass all=true for the old unpaginated response
+# Send Accept: application/vnd.finance.columns+json for one array per field (see serialization.py)
+# Responses carry an ETag; send it back in If-None-Match to get a 304 when nothing changed
 @app.route('/expenses/<int:user_id>', methods=['GET'])
+@require_auth
+@conditional
 def get_expenses(user_id):
-    expenses = Expense.query.filter_by(user_id=user_id).all()
-    expense_list = []
-    for expense in expenses:
-        expense_list.append({
-            "id": expense.id,
-            "date": expense.date,
-            "category": expense.category,
-            "amount": expense.amount,
-            "description": expense.description
-        })
-
-    return jsonify({"expenses": expense_list}), 200
+    columns = wants_columns(request.accept_mimetypes)
+    try:
+        if request.args.get('all', '').lower() in ('1', 'true', 'yes'):
+            with span('query'):
+                expenses = filtered_expenses(user_id, request.args)
+            with span('serialize'):
+                if columns:
+                    response = jsonify(expense_columns(expenses))
+                    response.mimetype = COLUMNS_MIMETYPE
+                else:
+                    response = jsonify({"expenses": [expense_row_to_dict(row) for row in expenses]})
+            return response, 200
+
+        with span('query'):
+            expenses, next_cursor, prev_cursor = paginate_expenses(user_id, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with span('serialize'):
+        if columns:
+            response = jsonify({**expense_columns(expenses), "next_cursor": next_cursor, "prev_cursor": prev_cursor})
+            response.mimetype = COLUMNS_MIMETYPE
+        else:
+            response = jsonify({
+                "expenses": [expense_row_to_dict(row) for row in expenses],
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor
+            })
+    return response, 200
+
+# Expenses inserted, updated or deleted since a data version, for clients keeping a local copy
+# Query params: since (the 'version' of the previous sync, 0 for everything), after (the 'next' cursor), limit
+# Columnar like the listing when the Accept header asks for it
+@app.route('/expenses/<int:user_id>/changes', methods=['GET'])
+@require_auth
+def expense_changes(user_id):
+    try:
+        since, after, limit = parse_changes_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    columns = wants_columns(request.accept_mimetypes)
+    with span('query'):
+        changes = changes_since(db.session, user_id, since, after, limit, columns)
+    if changes is None:
+        return jsonify({"error": "User not found"}), 404
+
+    with span('serialize'):
+        response = jsonify(changes)
+        if columns:
+            response.mimetype = COLUMNS_MIMETYPE
+    return response, 200
+
+# Live updates for an open dashboard, as server-sent events (see events.py)
+# At most EVENT_STREAMS are open per process; beyond that clients get a 503 and poll the change feed
+@app.route('/events/<int:user_id>', methods=['GET'])
+@require_auth
+def expense_events(user_id):
+    version = data_version(user_id)
+    if version is None:
+        return jsonify({"error": "User not found"}), 404
+    try:
+        subscription = broker.subscribe(user_id, app.config['EVENT_STREAMS'])
+    except TooManySubscribers:
+        return jsonify({"error": "Too many live connections, please retry"}), 503, {"Retry-After": "30"}
+
+    # The stream outlives the request context, so the heartbeat uses the engine directly
+    engine, key, token = db.engine, app.config['SECRET_KEY'].encode('utf-8'), bearer_token()
+    sync_seconds = app.config['REVOCATION_SYNC_SECONDS']
+
+    def read_version():
+        with engine.connect() as conn:
+            sync_revocations(conn, sync_seconds)
+            try:
+                check_token(key, token)  # Logged out or expired: end the stream
+            except InvalidToken:
+                return None
+            return conn.execute(data_version_query(user_id)).scalar()
+
+    response = Response(iter_events(subscription, version, read_version), mimetype='text/event-stream',
+                        headers=STREAM_HEADERS)
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    return response
+
+# Stream a user's expenses as a file download
+# format: csv (default), ndjson or parquet; accepts the same filters as GET /expenses/<user_id>
+@app.route('/expenses/<int:user_id>/export', methods=['GET'])
+@require_auth
+def export_expenses(user_id):
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"'format' must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    if fmt == 'parquet' and not parquet_available():
+        return jsonify({"error": "Parquet export requires pyarrow to be installed"}), 501
+
+    try:
+        filters = expense_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    chunks = export_stream(fmt, iter_expense_batches(user_id, filters))
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=expenses-{user_id}.{extension}"}
+    )
 
 # Visualization route
+# Optional query params: start, end (YYYY-MM-DD) and granularity (day/week/month/year)
+# Cached and revalidated with ETags like GET /expenses/<user_id>
 @app.route('/visualize/<int:user_id>', methods=['GET'])
+@require_auth
+@conditional
 def visualize(user_id):
-    expenses = Expense.query.filter_by(user_id=user_id).all()
-    if not expenses:
+    try:
+        start, end, granularity = parse_aggregation_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Group expenses by category (and period) from the rollup table
+    with span('query'):
+        rows = db.session.execute(rollup_totals_query(user_id, start, end, granularity)).all()
+    with span('shape'):
+        chart_data = totals_payload(rows, granularity)
+    if chart_data is None:
         return jsonify({"error": "No expenses found"}), 404
 
-    # Convert expenses to a DataFrame
-    data = {
-        "Date": [expense.date for expense in expenses],
-        "Category": [expense.category for expense in expenses],
-        "Amount": [expense.amount for expense in expenses]
-    }
-    df = pd.DataFrame(data)
-
-    # Group expenses by category and sum the amounts
-    grouped_data = df.groupby("Category")["Amount"].sum().reset_index()
-
-    # Convert the grouped data to a dictionary
-    chart_data = {
-        "categories": grouped_data["Category"].tolist(),
-        "amounts": grouped_data["Amount"].tolist()
-    }
+    with span('serialize'):
+        response = jsonify(chart_data)
+    return response, 200
+
+# Spending time series with cumulative sums, rolling averages and period-over-period changes
+# Optional query params: granularity (day/week/month), start, end (YYYY-MM-DD), category (repeatable)
+# A range holding more periods than analytics.PERIOD_LIMITS allows is a 400
+@app.route('/analytics/<int:user_id>/timeseries', methods=['GET'])
+@require_auth
+@conditional
+def analytics_timeseries(user_id):
+    granularity = request.args.get('granularity', 'month')
+    if granularity not in TIMESERIES_GRANULARITIES:
+        return jsonify({"error": f"'granularity' must be one of: {', '.join(TIMESERIES_GRANULARITIES)}"}), 400
+    try:
+        start = parse_date(request.args['start'], 'start') if request.args.get('start') else None
+        end = parse_date(request.args['end'], 'end') if request.args.get('end') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with span('query'):
+        rows = db.session.connection().execute(daily_totals_query(user_id, start, end,
+                                                                  request.args.getlist('category'))).all()
+    with span('frame'):
+        try:
+            daily = daily_frame(rows, granularity)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    with span('resample'):
+        data = timeseries_payload(daily, granularity)
+    if data is None:
+        return jsonify({"error": "No expenses found"}), 404
 
-    return jsonify(chart_data), 200
+    with span('serialize'):
+        response = jsonify(data)
+    return response, 200
 
 # Delete an expense route
 @app.route('/expenses/<int:expense_id>', methods=['DELETE'])
+@require_auth
 def delete_expense(expense_id):
     expense = Expense.query.get(expense_id)
-    if not expense:
+    # Other users' expenses look the same as missing ones
+    if not expense or expense.user_id != g.user_id:
         return jsonify({"error": "Expense not found"}), 404
 
     db.session.delete(expense)
-    db.session.commit()
+    rollups.record(db.session, expense, sign=-1)
+    seq = bump_versions(db.session, [expense.user_id])[expense.user_id]
+    record_deletes(db.session, expense.user_id, [expense.id], seq)
+    event = change_event(seq, [deleted_change(expense.id, seq)])
+    with span('commit'):
+        db.session.commit()
+    broker.publish(g.user_id, event)
 
     return jsonify({"message": "Expense deleted successfully"}), 200
 
 # Update an expense route
 @app.route('/expenses/<int:expense_id>', methods=['PUT'])
+@require_auth
 def update_expense(expense_id):
     expense = Expense.query.get(expense_id)
-    if not expense:
+    # Other users' expenses look the same as missing ones
+    if not expense or expense.user_id != g.user_id:
         return jsonify({"error": "Expense not found"}), 404
 
     data = request.get_json()
     if not data:
         return jsonify({"error": "No data provided"}), 400
 
-    expense.date = data.get('date', expense.date)
-    expense.category = data.get('category', expense.category)
-    expense.amount = data.get('amount', expense.amount)
-    expense.description = data.get('description', expense.description)
-
-    db.session.commit()
+    # Remember the old bucket so the rollups can move the amount across
+    old = (expense.user_id, expense.category, expense.date, expense.amount)
+
+    try:
+        if 'date' in data:
+            expense.date = parse_date(data['date'])
+        if 'amount' in data:
+            expense.amount = parse_amount(data['amount'])
+        if 'category' in data:
+            expense.category = parse_category(data['category'])
+        if 'description' in data:
+            expense.description = parse_description(data['description'])
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+
+    rollups.record_change(db.session, old, expense)
+    expense.updated_seq = bump_versions(db.session, [expense.user_id])[expense.user_id]
+    event = change_event(expense.updated_seq, [expense_change(expense)])
+    with span('commit'):
+        db.session.commit()
+    broker.publish(g.user_id, event)
 
     return jsonify({"message": "Expense updated successfully"}), 200
 
-# Run the app
+# Run the development server (use serve.py for production)
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    hasher.start()  # Fork the bcrypt workers before the server starts any threads
+    app.run(debug=app.config['DEBUG'])
\ No newline at end of file
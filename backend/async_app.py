@@ -0,0 +1,759 @@
+"""Asyncio variant of the backend API, served by Quart.
+
+Same URLs, payloads, status codes, auth and ETags as app.py, but every
+request is a coroutine on one event loop, so thousands of mostly idle
+connections (dashboards polling, slow mobile clients) cost a socket and a
+little memory each instead of a thread. Database access goes through async
+SQLAlchemy on aiosqlite; bcrypt runs on the password pool and the pandas
+work of bulk validation, analytics and statement imports runs on a thread
+pool, so none of it blocks the loop.
+
+The /admin/profiles routes of profiling.py are not served here. On a
+shared event loop a profile would take in every request in flight.
+
+Usage (from backend/):
+    python async_app.py [--host 127.0.0.1] [--port 5000]
+
+Config, on top of config.py:
+    ASYNC_CPU_WORKERS       threads for pandas/CSV work (default 4)
+    ASYNC_EXPORT_QUEUE      export chunks buffered ahead of a slow client (default 8)
+    ASYNC_EVENT_STREAMS     live update streams open at once (default 1000); they
+                            hold no thread or connection between events
+    ASYNC_MAX_IN_FLIGHT     requests handled at once; the rest wait their turn
+                            (default: the engine's pool_size + max_overflow)
+"""
+import argparse
+import asyncio
+import functools
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from quart import Quart, Response, g, jsonify, make_response, request
+from quart.wrappers.response import DataBody
+from sqlalchemy import create_engine, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from models import User, Expense
+from aggregation import parse_aggregation_args, rollup_totals_query, totals_payload
+from analytics import TIMESERIES_GRANULARITIES, daily_frame, daily_totals_query, timeseries_payload
+from auth import InvalidToken, check_token, parse_bearer, revocation_statements, revocations_since, revoked, sign_token
+from cache import bump_versions, data_version_query, make_etag, response_cache
+from changes import (changes_columns, changes_payload, changes_statements, deleted_change, expense_change,
+                     parse_changes_args, record_deletes)
+from config import get_config
+from events import STREAM_HEADERS, TooManySubscribers, aiter_events, broker, change_event
+from export import EXPORT_FORMATS, export_stream, iter_expense_batches, parquet_available
+from importer import DEFAULT_CATEGORY, import_statement, open_text_stream
+from ingest import insert_expenses, iter_body_records, validate_chunks
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics, span
+from migrate import upgrade
+from passwords import PasswordPoolBusy, hasher
+from pragmas import apply_pragmas
+from queries import expense_filters, expense_row_to_dict, filtered_expenses_statement, page_from_rows, page_statement
+from serialization import (COLUMNS_MIMETYPE, FastJSONProvider, compress_response, compressible, expense_columns,
+                           matching_etag, wants_columns)
+from validation import parse_amount, parse_category, parse_date, parse_description
+import rollups
+
+DEFAULT_CPU_WORKERS = 4
+DEFAULT_EXPORT_QUEUE = 8
+DEFAULT_EVENT_STREAMS = 1000
+
+app = Quart(__name__)
+app.config.from_object(get_config())
+app.json = FastJSONProvider(app)
+# Flask leaves request bodies unbounded; match it so bulk uploads and imports behave the same
+app.config['MAX_CONTENT_LENGTH'] = None
+
+hasher.init_app(app)
+response_cache.init_app(app)
+metrics.init_app(app)
+
+
+def database_urls(uri, instance_path):
+    """Return (sync URL, async URL) for the configured database
+
+    Relative SQLite paths resolve against the instance folder, as they do
+    under Flask-SQLAlchemy, so both apps share one database file.
+    """
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite':
+        return url, url
+    if url.database and url.database != ':memory:' and not os.path.isabs(url.database):
+        os.makedirs(instance_path, exist_ok=True)
+        url = url.set(database=os.path.join(instance_path, url.database))
+    return url, url.set(drivername='sqlite+aiosqlite')
+
+
+sync_url, async_url = database_urls(app.config['SQLALCHEMY_DATABASE_URI'], app.instance_path)
+engine_options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+
+# The sync engine serves the streaming export and statement import, which run in threads
+sync_engine = create_engine(sync_url, **engine_options)
+apply_pragmas(sync_engine, app.config['SQLITE_PRAGMAS'])
+upgrade(sync_engine)
+metrics.instrument(sync_engine)
+
+engine = create_async_engine(async_url, **engine_options)
+apply_pragmas(engine.sync_engine, app.config['SQLITE_PRAGMAS'])
+metrics.instrument(engine.sync_engine)
+Sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+# Requests beyond what the connection pool can serve wait here, first come first served,
+# instead of timing out in the pool's checkout queue
+max_in_flight = app.config.setdefault('ASYNC_MAX_IN_FLIGHT', engine_options.get('pool_size', 5)
+                                      + engine_options.get('max_overflow', 10))
+
+cpu_pool = ThreadPoolExecutor(app.config.setdefault('ASYNC_CPU_WORKERS', DEFAULT_CPU_WORKERS),
+                              thread_name_prefix='finance-cpu')
+
+
+async def run_in_pool(fn, *args, **kwargs):
+    """Run blocking work on the CPU thread pool without stalling the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_pool, functools.partial(fn, *args, **kwargs))
+
+
+@app.before_serving
+async def startup():
+    app.request_slots = asyncio.Semaphore(max_in_flight)
+
+
+@app.before_request
+async def open_session():
+    # Timed from here, so waiting for a request slot counts towards the route
+    metrics.start_request(request.url_rule)
+    await app.request_slots.acquire()
+    g.holds_slot = True
+    # Connections are only checked out when the session first runs a statement
+    g.session = Sessions()
+
+
+@app.after_request
+async def record_request_timer(response):
+    metrics.finish_request(request.method, response.status_code)
+    return response
+
+
+# Registered last, so it runs first and the timings above include it
+@app.after_request
+async def compress(response):
+    # Streamed bodies (export, events) are left alone
+    if compressible(response) and isinstance(response.response, DataBody):
+        body = await response.get_data()
+        await run_in_pool(compress_response, response, body, request.accept_encodings,
+                          app.config['COMPRESS_MIN_BYTES'])
+    return response
+
+
+@app.teardown_request
+async def close_session(exc):
+    metrics.finish_request(request.method, 500)  # Only still running if no response was made
+    session = g.pop('session', None)
+    if session is not None:
+        await session.close()
+    if g.pop('holds_slot', False):
+        app.request_slots.release()
+
+
+@app.after_serving
+async def shutdown():
+    cpu_pool.shutdown(wait=False)
+    await engine.dispose()
+    sync_engine.dispose()
+
+
+async def sync_revocations(session):
+    """auth.sync_revocations for an async session"""
+    if revoked.sync_due(app.config['REVOCATION_SYNC_SECONDS']):
+        revoked.merge((await session.execute(revocations_since(revoked.last_seq))).all())
+
+
+def require_auth(view):
+    """auth.require_auth for coroutine views"""
+    @functools.wraps(view)
+    async def wrapper(*args, **kwargs):
+        token = parse_bearer(request.headers.get('Authorization'))
+        try:
+            if token is None:
+                raise InvalidToken("Missing token")
+            await sync_revocations(g.session)
+            g.user_id, _, _ = check_token(app.config['SECRET_KEY'].encode('utf-8'), token)
+        except InvalidToken as e:
+            return jsonify({"error": f"Authentication required: {e}"}), 401, {"WWW-Authenticate": "Bearer"}
+
+        if 'user_id' in kwargs and kwargs['user_id'] != g.user_id:
+            return jsonify({"error": "Forbidden"}), 403
+        return await view(*args, **kwargs)
+
+    return wrapper
+
+
+def conditional(view):
+    """cache.conditional for coroutine views, sharing the same response cache"""
+    @functools.wraps(view)
+    async def wrapper(user_id, **kwargs):
+        version = (await g.session.execute(data_version_query(user_id))).scalar()
+        if version is None:
+            return await view(user_id, **kwargs)
+
+        etag = make_etag(request.path, request.query_string, version, wants_columns(request.accept_mimetypes))
+        matched = matching_etag(request.if_none_match, etag)
+        if matched:
+            response = Response(status=304)
+            del response.headers['Content-Type']
+            etag = matched
+        else:
+            cached = response_cache.get(etag)
+            if cached is not None:
+                body, mimetype = cached
+                response = Response(body, status=200, mimetype=mimetype)
+            else:
+                response = await make_response(await view(user_id, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response_cache.put(etag, await response.get_data(), response.mimetype)
+
+        response.set_etag(etag)
+        # Let clients keep the body but revalidate it on every use
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Accept')
+        return response
+
+    return wrapper
+
+
+async def iterate_in_thread(make_iterator, maxsize=DEFAULT_EXPORT_QUEUE):
+    """Drive a blocking iterator in a thread, yielding its items on the event loop
+
+    The bounded queue stops the thread from reading ahead of a slow client,
+    and if the client goes away the thread is told to stop at its next item.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize)
+    done = object()
+    cancelled = False
+
+    def produce():
+        try:
+            for item in make_iterator():
+                if cancelled:
+                    break
+                asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+        except BaseException as e:
+            asyncio.run_coroutine_threadsafe(queue.put(e), loop).result()
+        else:
+            asyncio.run_coroutine_threadsafe(queue.put(done), loop).result()
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        cancelled = True
+        while not producer.done():
+            # Unblock a producer waiting on a full queue so it can see the flag
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.sleep(0.01)
+
+
+class AsyncBodyReader(io.RawIOBase):
+    """Blocking file object over the request body, for parsers running in a thread"""
+
+    def __init__(self, chunks, loop):
+        super().__init__()
+        self._chunks = chunks.__aiter__()
+        self._loop = loop
+        self._pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            try:
+                self._pending = asyncio.run_coroutine_threadsafe(self._chunks.__anext__(), self._loop).result()
+            except StopAsyncIteration:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+# Home route
+@app.route('/')
+async def home():
+    return jsonify({"message": "Welcome to the Finance Dashboard!"})
+
+# Request, stage and SQL timings for this process in Prometheus text format (see metrics.py)
+@app.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    if not app.config['METRICS_ENABLED']:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+# Password hashing is saturated; ask the client to retry shortly instead of queueing
+@app.errorhandler(PasswordPoolBusy)
+async def password_pool_busy(e):
+    return jsonify({"error": "Server busy, please retry"}), 503, {"Retry-After": "1"}
+
+# User registration route
+@app.route('/register', methods=['POST'])
+async def register():
+    data = await request.json
+    username = data['username']
+    password = data['password']
+
+    existing_user = await g.session.scalar(select(User).filter_by(username=username).limit(1))
+    if existing_user:
+        return jsonify({'message': 'Username already exists'}), 400
+
+    new_user = User(username=username, password=await hasher.hash_async(password))
+    g.session.add(new_user)
+    await g.session.commit()
+
+    return jsonify({'message': 'User registered successfully'}), 201
+
+# User login route
+@app.route('/login', methods=['POST'])
+async def login():
+    data = await request.get_json()
+    username = data.get('username')
+    password = data.get('password')
+
+    # Find user by username
+    user = await g.session.scalar(select(User).filter_by(username=username).limit(1))
+
+    # Check if user exists and verify password
+    with span('password'):
+        valid = user is not None and await hasher.check_async(password, user.password)
+    if not valid:
+        return jsonify({"error": "Invalid username or password"}), 401
+
+    # Re-hash with the current work factor now that we have the plain password
+    if user.password_needs_rehash():
+        try:
+            user.password = await hasher.hash_async(password)
+            await g.session.commit()
+        except PasswordPoolBusy:
+            pass  # Not worth failing a good login over; it will be retried next time
+
+    token, expires = sign_token(app.config['SECRET_KEY'].encode('utf-8'), user.id, app.config['ACCESS_TOKEN_TTL'])
+    return jsonify({"message": "Login successful", "user_id": user.id, "token": token, "expires": expires}), 200
+
+# Logout route: revokes the bearer token until it would have expired
+@app.route('/logout', methods=['POST'])
+async def logout():
+    token = parse_bearer(request.headers.get('Authorization'))
+    try:
+        if token is None:
+            raise InvalidToken("Missing token")
+        await sync_revocations(g.session)
+        _, expires, token_id = check_token(app.config['SECRET_KEY'].encode('utf-8'), token)
+    except InvalidToken as e:
+        return jsonify({"error": f"Authentication required: {e}"}), 401
+
+    revoked.add(token_id, expires)
+    for stmt in revocation_statements(token_id, expires):
+        await g.session.execute(stmt)
+    await g.session.commit()
+    return jsonify({"message": "Logged out"}), 200
+
+# Add an expense route
+# user_id defaults to the signed-in user and may not name anyone else
+@app.route('/expenses', methods=['POST'])
+@require_auth
+async def add_expense():
+    data = await request.get_json()
+    user_id = data.get('user_id', g.user_id)
+    date = data.get('date')
+    category = data.get('category')
+    amount = data.get('amount')
+    description = data.get('description')
+
+    if not user_id or not date or not category or not amount:
+        return jsonify({"error": "Missing required fields"}), 400
+
+    if str(user_id) != str(g.user_id):
+        return jsonify({"error": "Forbidden"}), 403
+
+    try:
+        date = parse_date(date)
+        category = parse_category(category)
+        amount = parse_amount(amount)
+        description = parse_description(description)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    new_expense = Expense(user_id=g.user_id, date=date, category=category, amount=amount, description=description)
+
+    def write(session):
+        new_expense.updated_seq = bump_versions(session, [new_expense.user_id])[new_expense.user_id]
+        session.add(new_expense)
+        rollups.record(session, new_expense)
+        session.flush()
+        return change_event(new_expense.updated_seq, [expense_change(new_expense)])
+
+    event = await g.session.run_sync(write)
+    with span('commit'):
+        await g.session.commit()
+    broker.publish(g.user_id, event)
+
+    return jsonify({"message": "Expense added successfully"}), 201
+
+# Bulk add expenses from a JSON array or NDJSON body
+# Valid rows are inserted in one transaction; invalid rows (including other users' rows) are reported by position
+# As with POST /expenses, a row's user_id defaults to the signed-in user
+@app.route('/expenses/bulk', methods=['POST'])
+@require_auth
+async def add_expenses_bulk():
+    body = await request.get_data()
+    mimetype, user_id = request.mimetype, g.user_id
+    try:
+        # Validation is pandas work; keep it off the event loop
+        with span('validate'):
+            chunks = await run_in_pool(lambda: list(validate_chunks(iter_body_records(mimetype, body),
+                                                                    user_id=user_id)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    errors = [error for _, chunk_errors in chunks for error in chunk_errors]
+    if not any(len(valid) for valid, _ in chunks) and errors:
+        return jsonify({"inserted": 0, "errors": errors}), 400
+
+    with span('insert'):
+        inserted = await g.session.run_sync(lambda session: sum(insert_expenses(valid, session)
+                                                                for valid, _ in chunks))
+    with span('commit'):
+        await g.session.commit()
+    broker.publish(user_id, change_event((await g.session.execute(data_version_query(user_id))).scalar()))
+    return jsonify({"inserted": inserted, "errors": errors}), 201
+
+# Import a bank statement (CSV or OFX) for a user
+# Send the file as the raw body or as a multipart 'file' field
+# Optional query params: format (csv/ofx), category, date_format, debits_negative
+@app.route('/expenses/<int:user_id>/import', methods=['POST'])
+@require_auth
+async def import_expenses(user_id):
+    upload = (await request.files).get('file') if request.mimetype == 'multipart/form-data' else None
+    stream = upload.stream if upload else io.BufferedReader(AsyncBodyReader(request.body, asyncio.get_running_loop()))
+    filename = (upload.filename or '') if upload else ''
+
+    fmt = request.args.get('format')
+    if not fmt:
+        is_ofx = filename.lower().endswith(('.ofx', '.qfx')) or request.mimetype in ('application/x-ofx', 'application/ofx')
+        fmt = 'ofx' if is_ofx else 'csv'
+
+    options = {
+        'category': request.args.get('category', DEFAULT_CATEGORY),
+        'date_format': request.args.get('date_format'),
+        'debits_negative': request.args.get('debits_negative', '').lower() in ('1', 'true', 'yes'),
+    }
+
+    def run_import():
+        # Parsing and batch writes are blocking, so the whole import runs in a thread on the sync engine
+        with Session(sync_engine) as session:
+            return import_statement(open_text_stream(stream), user_id, fmt, session=session, **options)
+
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(None, run_import)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if result.imported:
+        broker.publish(user_id, change_event((await g.session.execute(data_version_query(user_id))).scalar()))
+    return jsonify(result.to_dict()), 201 if result.imported else 200
+
+# Get expenses for a user, newest first
+# Paginated with limit/before/after cursors; filters: category, start, end, min_amount, max_amount
+# Pass all=true for the old unpaginated response
+# Send Accept: application/vnd.finance.columns+json for one array per field (see serialization.py)
+# Responses carry an ETag; send it back in If-None-Match to get a 304 when nothing changed
+@app.route('/expenses/<int:user_id>', methods=['GET'])
+@require_auth
+@conditional
+async def get_expenses(user_id):
+    columns = wants_columns(request.accept_mimetypes)
+    try:
+        if request.args.get('all', '').lower() in ('1', 'true', 'yes'):
+            with span('query'):
+                expenses = (await g.session.execute(filtered_expenses_statement(user_id, request.args))).all()
+            with span('serialize'):
+                if columns:
+                    response = jsonify(expense_columns(expenses))
+                    response.mimetype = COLUMNS_MIMETYPE
+                else:
+                    response = jsonify({"expenses": [expense_row_to_dict(row) for row in expenses]})
+            return response, 200
+
+        stmt, limit = page_statement(user_id, request.args)
+        with span('query'):
+            rows = (await g.session.execute(stmt)).all()
+        expenses, next_cursor, prev_cursor = page_from_rows(rows, limit, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with span('serialize'):
+        if columns:
+            response = jsonify({**expense_columns(expenses), "next_cursor": next_cursor, "prev_cursor": prev_cursor})
+            response.mimetype = COLUMNS_MIMETYPE
+        else:
+            response = jsonify({
+                "expenses": [expense_row_to_dict(row) for row in expenses],
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor
+            })
+    return response, 200
+
+# Expenses inserted, updated or deleted since a data version, for clients keeping a local copy
+# Query params: since (the 'version' of the previous sync, 0 for everything), after (the 'next' cursor), limit
+# Columnar like the listing when the Accept header asks for it
+@app.route('/expenses/<int:user_id>/changes', methods=['GET'])
+@require_auth
+async def expense_changes(user_id):
+    try:
+        since, after, limit = parse_changes_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    columns = wants_columns(request.accept_mimetypes)
+    with span('query'):
+        # Version first, as in changes.changes_since()
+        version = (await g.session.execute(data_version_query(user_id))).scalar()
+        if version is None:
+            return jsonify({"error": "User not found"}), 404
+        expenses_stmt, tombstones_stmt = changes_statements(user_id, since, after, limit)
+        expenses = (await g.session.execute(expenses_stmt)).all()
+        tombstones = (await g.session.execute(tombstones_stmt)).all() if tombstones_stmt is not None else []
+        changes = (changes_columns if columns else changes_payload)(version, expenses, tombstones, limit)
+
+    with span('serialize'):
+        response = jsonify(changes)
+        if columns:
+            response.mimetype = COLUMNS_MIMETYPE
+    return response, 200
+
+# Live updates for an open dashboard, as server-sent events (see events.py)
+# At most ASYNC_EVENT_STREAMS are open at once; beyond that clients get a 503 and poll the change feed
+@app.route('/events/<int:user_id>', methods=['GET'])
+@require_auth
+async def expense_events(user_id):
+    version = (await g.session.execute(data_version_query(user_id))).scalar()
+    if version is None:
+        return jsonify({"error": "User not found"}), 404
+    try:
+        subscription = broker.subscribe(user_id, app.config.setdefault('ASYNC_EVENT_STREAMS', DEFAULT_EVENT_STREAMS),
+                                        asyncio.Queue)
+    except TooManySubscribers:
+        return jsonify({"error": "Too many live connections, please retry"}), 503, {"Retry-After": "30"}
+
+    key, token = app.config['SECRET_KEY'].encode('utf-8'), parse_bearer(request.headers.get('Authorization'))
+
+    async def read_version():
+        # The request's session is closed once streaming starts; use a short-lived one
+        async with Sessions() as session:
+            await sync_revocations(session)
+            try:
+                check_token(key, token)  # Logged out or expired: end the stream
+            except InvalidToken:
+                return None
+            return (await session.execute(data_version_query(user_id))).scalar()
+
+    async def stream():
+        try:
+            async for chunk in aiter_events(subscription, version, read_version):
+                yield chunk
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = Response(stream(), mimetype='text/event-stream', headers=STREAM_HEADERS)
+    response.timeout = None  # Quart would otherwise cut the stream off after RESPONSE_TIMEOUT
+    return response
+
+# Stream a user's expenses as a file download
+# format: csv (default), ndjson or parquet; accepts the same filters as GET /expenses/<user_id>
+@app.route('/expenses/<int:user_id>/export', methods=['GET'])
+@require_auth
+async def export_expenses(user_id):
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"'format' must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    if fmt == 'parquet' and not parquet_available():
+        return jsonify({"error": "Parquet export requires pyarrow to be installed"}), 501
+
+    try:
+        filters = expense_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    # The streaming cursor and encoders are blocking; run them in a thread that stays
+    # a few chunks ahead of the client
+    chunks = iterate_in_thread(lambda: export_stream(fmt, iter_expense_batches(user_id, filters, engine=sync_engine)),
+                               app.config.setdefault('ASYNC_EXPORT_QUEUE', DEFAULT_EXPORT_QUEUE))
+    return Response(
+        chunks,
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=expenses-{user_id}.{extension}"}
+    )
+
+# Visualization route
+# Optional query params: start, end (YYYY-MM-DD) and granularity (day/week/month/year)
+# Cached and revalidated with ETags like GET /expenses/<user_id>
+@app.route('/visualize/<int:user_id>', methods=['GET'])
+@require_auth
+@conditional
+async def visualize(user_id):
+    try:
+        start, end, granularity = parse_aggregation_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Group expenses by category (and period) from the rollup table
+    with span('query'):
+        rows = (await g.session.execute(rollup_totals_query(user_id, start, end, granularity))).all()
+    with span('shape'):
+        chart_data = totals_payload(rows, granularity)
+    if chart_data is None:
+        return jsonify({"error": "No expenses found"}), 404
+
+    with span('serialize'):
+        response = jsonify(chart_data)
+    return response, 200
+
+# Spending time series with cumulative sums, rolling averages and period-over-period changes
+# Optional query params: granularity (day/week/month), start, end (YYYY-MM-DD), category (repeatable)
+# A range holding more periods than analytics.PERIOD_LIMITS allows is a 400
+@app.route('/analytics/<int:user_id>/timeseries', methods=['GET'])
+@require_auth
+@conditional
+async def analytics_timeseries(user_id):
+    granularity = request.args.get('granularity', 'month')
+    if granularity not in TIMESERIES_GRANULARITIES:
+        return jsonify({"error": f"'granularity' must be one of: {', '.join(TIMESERIES_GRANULARITIES)}"}), 400
+    try:
+        start = parse_date(request.args['start'], 'start') if request.args.get('start') else None
+        end = parse_date(request.args['end'], 'end') if request.args.get('end') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with span('query'):
+        rows = (await g.session.execute(daily_totals_query(user_id, start, end,
+                                                           request.args.getlist('category')))).all()
+    # Resampling and rolling windows are pandas work; keep it off the event loop
+    with span('frame'):
+        try:
+            daily = await run_in_pool(daily_frame, rows, granularity)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    with span('resample'):
+        data = await run_in_pool(timeseries_payload, daily, granularity)
+    if data is None:
+        return jsonify({"error": "No expenses found"}), 404
+
+    with span('serialize'):
+        response = jsonify(data)
+    return response, 200
+
+# Delete an expense route
+@app.route('/expenses/<int:expense_id>', methods=['DELETE'])
+@require_auth
+async def delete_expense(expense_id):
+    expense = await g.session.get(Expense, expense_id)
+    # Other users' expenses look the same as missing ones
+    if not expense or expense.user_id != g.user_id:
+        return jsonify({"error": "Expense not found"}), 404
+
+    await g.session.delete(expense)
+
+    def write(session):
+        rollups.record(session, expense, sign=-1)
+        seq = bump_versions(session, [expense.user_id])[expense.user_id]
+        record_deletes(session, expense.user_id, [expense.id], seq)
+        return change_event(seq, [deleted_change(expense.id, seq)])
+
+    event = await g.session.run_sync(write)
+    with span('commit'):
+        await g.session.commit()
+    broker.publish(g.user_id, event)
+
+    return jsonify({"message": "Expense deleted successfully"}), 200
+
+# Update an expense route
+@app.route('/expenses/<int:expense_id>', methods=['PUT'])
+@require_auth
+async def update_expense(expense_id):
+    expense = await g.session.get(Expense, expense_id)
+    # Other users' expenses look the same as missing ones
+    if not expense or expense.user_id != g.user_id:
+        return jsonify({"error": "Expense not found"}), 404
+
+    data = await request.get_json()
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+
+    # Remember the old bucket so the rollups can move the amount across
+    old = (expense.user_id, expense.category, expense.date, expense.amount)
+
+    try:
+        if 'date' in data:
+            expense.date = parse_date(data['date'])
+        if 'amount' in data:
+            expense.amount = parse_amount(data['amount'])
+        if 'category' in data:
+            expense.category = parse_category(data['category'])
+        if 'description' in data:
+            expense.description = parse_description(data['description'])
+    except ValueError as e:
+        await g.session.rollback()
+        return jsonify({"error": str(e)}), 400
+
+    def write(session):
+        rollups.record_change(session, old, expense)
+        expense.updated_seq = bump_versions(session, [expense.user_id])[expense.user_id]
+        return change_event(expense.updated_seq, [expense_change(expense)])
+
+    event = await g.session.run_sync(write)
+    with span('commit'):
+        await g.session.commit()
+    broker.publish(g.user_id, event)
+
+    return jsonify({"message": "Expense updated successfully"}), 200
+
+
+def main():
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config as HypercornConfig
+
+    parser = argparse.ArgumentParser(description="Run the asyncio variant of the finance backend")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--backlog', type=int, default=2048, help="pending connections the socket queues")
+    parser.add_argument('--keep-alive', type=float, default=75,
+                        help="seconds an idle connection stays open; a busy loop can be slow to read the next request")
+    args = parser.parse_args()
+
+    config = HypercornConfig()
+    config.bind = [f'{args.host}:{args.port}']
+    config.backlog = args.backlog
+    config.keep_alive_timeout = args.keep_alive
+    config.accesslog = None
+    print(f"Serving on http://{args.host}:{args.port} with hypercorn (asyncio)")
+    # Fork the bcrypt workers now: forking once the event loop runs would copy its signal wakeup fd
+    hasher.start()
+    asyncio.run(serve(app, config))
+
+
+# Run on hypercorn (pip install hypercorn); uvloop is not required
+if __name__ == '__main__':
+    main()
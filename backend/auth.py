@@ -0,0 +1,199 @@
+"""Stateless signed access tokens.
+
+/login issues a token of the form "<user_id>.<expires>.<token id>.<signature>",
+where the signature is an HMAC-SHA256 of the first three fields under the
+app's SECRET_KEY. Protected routes verify it in memory, with no database
+lookup. Logged-out tokens go into a per-process revocation set whose
+entries are dropped once the token would have expired anyway.
+
+/logout also writes the token to the revoked_token table. Every process
+polls that table for rows past the last seq it has seen, at most once per
+REVOCATION_SYNC_SECONDS, so a token logged out on one server process
+(gunicorn worker) is rejected by the others within that interval.
+"""
+import base64
+import functools
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+
+from flask import current_app, g, jsonify, request
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+
+from models import db, RevokedToken
+
+DEFAULT_TOKEN_TTL_SECONDS = 12 * 60 * 60
+DEFAULT_REVOCATION_SYNC_SECONDS = 1
+
+
+class InvalidToken(Exception):
+    """Raised for tokens that are malformed, forged, expired or revoked"""
+
+
+def _signature(key, payload):
+    digest = hmac.new(key, payload.encode('ascii'), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+
+class RevocationSet:
+    """Thread-safe set of revoked token ids, each kept until its token's expiry
+
+    last_seq is the newest revoked_token row merged in, for the next poll.
+    """
+
+    def __init__(self):
+        self._expiries = {}
+        self._lock = threading.Lock()
+        self._next_purge = 0
+        self._next_sync = 0
+        self.last_seq = 0
+
+    def add(self, token_id, expires):
+        with self._lock:
+            self._expiries[token_id] = expires
+            self._purge(time.time())
+
+    def merge(self, rows):
+        """Add the (seq, token id, expires) rows of revocations_since()"""
+        with self._lock:
+            for seq, token_id, expires in rows:
+                self._expiries[token_id] = expires
+                self.last_seq = max(self.last_seq, seq)
+            self._purge(time.time())
+
+    def sync_due(self, interval):
+        """True for one caller per interval, which should then poll and merge()"""
+        now = time.monotonic()
+        # Checked without the lock first: almost every request finds it isn't due
+        if now < self._next_sync:
+            return False
+        with self._lock:
+            if now < self._next_sync:
+                return False
+            self._next_sync = now + interval
+            return True
+
+    def __contains__(self, token_id):
+        # Reads of a dict are atomic under the GIL; no lock on the hot path
+        return token_id in self._expiries
+
+    def __len__(self):
+        return len(self._expiries)
+
+    def _purge(self, now):
+        if now < self._next_purge:
+            return
+        for token_id in [t for t, expires in self._expiries.items() if expires <= now]:
+            del self._expiries[token_id]
+        self._next_purge = now + 60
+
+
+revoked = RevocationSet()
+
+
+def revocations_since(seq):
+    """Select the (seq, token id, expires) of revocations after seq, still unexpired"""
+    return (select(RevokedToken.seq, RevokedToken.token_id, RevokedToken.expires)
+            .where(RevokedToken.seq > seq, RevokedToken.expires > int(time.time())))
+
+
+def revocation_statements(token_id, expires):
+    """Statements recording a revocation and purging those whose tokens have expired"""
+    return [
+        insert(RevokedToken).values(token_id=token_id, expires=expires).on_conflict_do_nothing(),
+        delete(RevokedToken).where(RevokedToken.expires <= int(time.time())),
+    ]
+
+
+def _key():
+    return current_app.config['SECRET_KEY'].encode('utf-8')
+
+
+def sign_token(key, user_id, ttl):
+    """Return (token, expiry as a unix timestamp) signed with key (bytes)"""
+    expires = int(time.time()) + ttl
+    payload = f"{user_id}.{expires}.{secrets.token_hex(8)}"
+    return f"{payload}.{_signature(key, payload)}", expires
+
+
+def check_token(key, token):
+    """Return (user_id, expires, token id) for a token signed with key, else raise InvalidToken"""
+    if not token.isascii():
+        raise InvalidToken("Malformed token")
+    payload, _, signature = token.rpartition('.')
+    if not hmac.compare_digest(signature, _signature(key, payload)):
+        raise InvalidToken("Bad signature")
+    try:
+        user_id, expires, token_id = payload.split('.')
+        user_id, expires = int(user_id), int(expires)
+    except ValueError:
+        raise InvalidToken("Malformed token")
+    if expires <= time.time():
+        raise InvalidToken("Token expired")
+    if token_id in revoked:
+        raise InvalidToken("Token revoked")
+    return user_id, expires, token_id
+
+
+def issue_token(user_id, ttl=None):
+    """Return (token, expiry as a unix timestamp) for a user of the current app"""
+    if ttl is None:
+        ttl = current_app.config.get('ACCESS_TOKEN_TTL', DEFAULT_TOKEN_TTL_SECONDS)
+    return sign_token(_key(), user_id, ttl)
+
+
+def sync_revocations(connection, interval):
+    """Merge other processes' logouts into revoked, if this process is due to poll"""
+    if revoked.sync_due(interval):
+        revoked.merge(connection.execute(revocations_since(revoked.last_seq)).all())
+
+
+def verify_token(token):
+    """check_token() with the current app's SECRET_KEY"""
+    sync_revocations(db.session, current_app.config.get('REVOCATION_SYNC_SECONDS', DEFAULT_REVOCATION_SYNC_SECONDS))
+    return check_token(_key(), token)
+
+
+def parse_bearer(header):
+    """The token from an 'Authorization: Bearer ...' header value, or None"""
+    scheme, _, token = (header or '').partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' and token.strip() else None
+
+
+def bearer_token():
+    """The bearer token sent with the current request, or None"""
+    return parse_bearer(request.headers.get('Authorization'))
+
+
+def revoke(token):
+    """Revoke a valid token until it expires"""
+    _, expires, token_id = verify_token(token)
+    revoked.add(token_id, expires)
+    for stmt in revocation_statements(token_id, expires):
+        db.session.execute(stmt)
+    db.session.commit()
+
+
+def require_auth(view):
+    """Reject requests without a valid bearer token and set g.user_id
+
+    A user_id in the route path must belong to the token's user.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = bearer_token()
+        try:
+            if token is None:
+                raise InvalidToken("Missing token")
+            g.user_id, _, _ = verify_token(token)
+        except InvalidToken as e:
+            return jsonify({"error": f"Authentication required: {e}"}), 401, {"WWW-Authenticate": "Bearer"}
+
+        if 'user_id' in kwargs and kwargs['user_id'] != g.user_id:
+            return jsonify({"error": "Forbidden"}), 403
+        return view(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,341 @@
+"""End-to-end latency and throughput of the API routes, saved as JSON for comparing commits.
+
+Builds a seeded synthetic database (or copies one made with synthetic.py),
+then times register, login, add_expense, get_expenses, visualize,
+update_expense and delete_expense. Each runs through the Flask test client
+(in-process, no network) and over real HTTP against serve.py. Every
+operation sends --requests requests (--auth-requests for the two bcrypt
+ones) from --concurrency threads. Reported per operation: p50/p95/p99/mean
+latency in ms, throughput in requests/s and non-2xx responses.
+
+Reads and writes go to user 1, the heaviest user. Reads use random date
+filters, so the response cache can't answer them. update_expense edits
+random existing rows and delete_expense removes the rows add_expense made,
+which leaves the data set the size it started at.
+
+Results go to benchmarks/results/<commit>.json unless --out says otherwise.
+Compare two runs (exit status 1 if any p95 or throughput got more than
+--threshold percent worse):
+
+Usage (from backend/):
+    python benchmarks/bench_api.py run [--rows 100000] [--users 10] [--db bench.db] [--transport client http]
+                                       [--requests 200] [--auth-requests 20] [--concurrency 4] [--out FILE]
+    python benchmarks/bench_api.py compare base.json new.json [--threshold 10]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import secrets
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import requests
+
+from common import BACKEND_DIR, start_server
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+HTTP_PORT = 5095
+PASSWORD = 'bench-password'
+OPERATIONS = ['register', 'login', 'add_expense', 'get_expenses', 'visualize', 'update_expense', 'delete_expense']
+AUTH_OPERATIONS = {'register', 'login'}
+FIRST_DAY, DAYS = date(2016, 1, 1), 3650  # synthetic.py's date range
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+
+def summarize(latencies, errors, wall):
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'p50_ms': round(percentile(ordered, 50), 3),
+        'p95_ms': round(percentile(ordered, 95), 3),
+        'p99_ms': round(percentile(ordered, 99), 3),
+        'mean_ms': round(statistics.fmean(ordered), 3),
+        'throughput_rps': round(len(ordered) / wall, 1),
+    }
+
+
+def random_day(rng):
+    return (FIRST_DAY + timedelta(days=rng.randrange(DAYS))).isoformat()
+
+
+def plan(operation, count, ids, run_id, rng):
+    """The requests of one operation, as (method, path, json body, needs auth) tuples"""
+    if operation == 'register':
+        return [('POST', '/register', {'username': f'bench_{run_id}_{i}', 'password': PASSWORD}, False)
+                for i in range(count)]
+    if operation == 'login':
+        return [('POST', '/login', {'username': f'bench_{run_id}_login', 'password': PASSWORD}, False)] * count
+    if operation == 'add_expense':
+        return [('POST', '/expenses', {'date': random_day(rng), 'category': 'Food', 'amount': rng.randrange(1, 5000),
+                                       'description': f'bench {run_id} {i}'}, True) for i in range(count)]
+    if operation == 'get_expenses':
+        return [('GET', f'/expenses/1?limit=50&end={random_day(rng)}', None, True) for _ in range(count)]
+    if operation == 'visualize':
+        return [('GET', f'/visualize/1?start={random_day(rng)}', None, True) for _ in range(count)]
+    if operation == 'update_expense':
+        return [('PUT', f'/expenses/{rng.choice(ids["existing"])}', {'amount': rng.randrange(1, 5000)}, True)
+                for _ in range(count)]
+    if operation == 'delete_expense':
+        return [('DELETE', f'/expenses/{expense_id}', None, True) for expense_id in ids['added'][:count]]
+    raise ValueError(operation)
+
+
+class ClientTransport:
+    """Flask test client in this process, one client per thread"""
+
+    name = 'client'
+
+    def __init__(self, db_path):
+        from common import load_app
+        self.app, _ = load_app(db_path)
+        self._local = threading.local()
+
+    def send(self, method, path, body, headers):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client.open(path, method=method, json=body, headers=headers).status_code
+
+    def close(self):
+        pass
+
+
+class HttpTransport:
+    """serve.py in a child process, one keep-alive session per thread"""
+
+    name = 'http'
+
+    def __init__(self, db_path, server):
+        self.child, self.base = start_server(['serve.py', '--server', server], HTTP_PORT, db_path)
+        self._local = threading.local()
+
+    def send(self, method, path, body, headers):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session.request(method, self.base + path, json=body, headers=headers, timeout=60).status_code
+
+    def close(self):
+        self.child.terminate()
+        self.child.wait()
+
+
+def run_operation(transport, requests_, token, concurrency):
+    auth = {'Authorization': f'Bearer {token}'}
+    latencies, errors = [], 0
+
+    def send(spec):
+        method, path, body, needs_auth = spec
+        start = time.perf_counter()
+        try:
+            status = transport.send(method, path, body, auth if needs_auth else {})
+        except requests.exceptions.RequestException:
+            status = None
+        return (time.perf_counter() - start) * 1000, status is not None and 200 <= status < 300
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for elapsed, ok in pool.map(send, requests_):
+            latencies.append(elapsed)
+            errors += not ok
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def expense_ids(db_path, description_prefix=None, limit=None):
+    conn = sqlite3.connect(db_path)
+    try:
+        if description_prefix is None:
+            rows = conn.execute("SELECT id FROM expense WHERE user_id = 1 ORDER BY random() LIMIT ?", (limit,))
+        else:
+            rows = conn.execute("SELECT id FROM expense WHERE user_id = 1 AND description LIKE ? ORDER BY id",
+                                (description_prefix + '%',))
+        return [row[0] for row in rows]
+    finally:
+        conn.close()
+
+
+def run_transport(transport, db_path, args):
+    from auth import sign_token
+    rng = random.Random(args.seed)
+    run_id = secrets.token_hex(4)
+    token, _ = sign_token(os.environ['FINANCE_SECRET_KEY'].encode('utf-8'), 1, 3600)
+    ids = {'existing': expense_ids(db_path, limit=10_000), 'added': []}
+    # The account the login operation signs in to
+    transport.send('POST', '/register', {'username': f'bench_{run_id}_login', 'password': PASSWORD}, {})
+
+    results = {}
+    for operation in args.operations:
+        count = args.auth_requests if operation in AUTH_OPERATIONS else args.requests
+        if operation == 'delete_expense':
+            ids['added'] = expense_ids(db_path, f'bench {run_id} ')
+        requests_ = plan(operation, count, ids, run_id, rng)
+        if not requests_:
+            continue
+        results[operation] = summary = run_operation(transport, requests_, token, args.concurrency)
+        print(f"{transport.name:>6} {operation:>15} {summary['requests']:>6} {summary['p50_ms']:>9.2f} "
+              f"{summary['p95_ms']:>9.2f} {summary['p99_ms']:>9.2f} {summary['throughput_rps']:>9.1f} "
+              f"{summary['errors']:>6}", flush=True)
+    return results
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BACKEND_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return commit, dirty
+
+
+def run(args):
+    # Both transports sign and check tokens with the same key
+    os.environ['FINANCE_SECRET_KEY'] = secrets.token_hex(32)
+    os.environ['FINANCE_CONFIG'] = 'production'
+    if args.bcrypt_rounds is not None:
+        os.environ['FINANCE_BCRYPT_LOG_ROUNDS'] = str(args.bcrypt_rounds)
+
+    from synthetic import create
+    workdir = tempfile.mkdtemp(prefix='finance-bench-api-')
+    try:
+        base_db = args.db
+        if base_db is None:
+            base_db = os.path.join(workdir, 'base.db')
+            print(f"Generating {args.rows:,} expenses for {args.users:,} users (seed {args.seed})...", flush=True)
+            create(base_db, args.rows, args.users, args.seed)
+        conn = sqlite3.connect(base_db)
+        rows, users = conn.execute("SELECT count(*), count(DISTINCT user_id) FROM expense").fetchone()
+        user_rows = conn.execute("SELECT count(*) FROM expense WHERE user_id = 1").fetchone()[0]
+        conn.close()
+
+        print(f"{rows:,} expenses, {users:,} users, {user_rows:,} for user 1; concurrency {args.concurrency}; "
+              f"latency in ms")
+        print(f"{'via':>6} {'operation':>15} {'reqs':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>9} {'errors':>6}")
+        results = {}
+        for name in args.transport:
+            # Each transport writes to its own copy, so both start from the same data
+            db_path = os.path.join(workdir, f'{name}.db')
+            shutil.copy(base_db, db_path)
+            transport = ClientTransport(db_path) if name == 'client' else HttpTransport(db_path, args.server)
+            try:
+                results[name] = run_transport(transport, db_path, args)
+            finally:
+                transport.close()
+    finally:
+        shutil.rmtree(workdir)
+
+    commit, dirty = git_commit()
+    from config import get_config
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rows': rows,
+            'users': users,
+            'user_rows': user_rows,
+            'seed': args.seed,
+            'requests': args.requests,
+            'auth_requests': args.auth_requests,
+            'concurrency': args.concurrency,
+            'bcrypt_rounds': get_config().BCRYPT_LOG_ROUNDS,
+            'server': args.server,
+        },
+        'results': results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {out}")
+
+
+def change(old, new):
+    return (new - old) / old * 100 if old else 0.0
+
+
+def compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    for key in ('rows', 'users', 'concurrency', 'requests', 'bcrypt_rounds', 'server'):
+        if base['meta'].get(key) != new['meta'].get(key):
+            print(f"warning: {key} differs ({base['meta'].get(key)} vs {new['meta'].get(key)}); "
+                  f"the runs may not be comparable")
+    print(f"{base['meta']['commit']} -> {new['meta']['commit']}, changes in %; "
+          f"! marks more than {args.threshold:g}% worse")
+    print(f"{'via':>6} {'operation':>15} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>9}")
+
+    regressions = 0
+    for transport, operations in new['results'].items():
+        for operation, now in operations.items():
+            before = base['results'].get(transport, {}).get(operation)
+            if before is None:
+                continue
+            cells = []
+            for key, worse_when_higher in (('p50_ms', True), ('p95_ms', True), ('p99_ms', True),
+                                           ('throughput_rps', False)):
+                delta = change(before[key], now[key])
+                worse = delta > args.threshold if worse_when_higher else -delta > args.threshold
+                # Only p95 and throughput gate; p50 and p99 are for reading
+                if worse and key in ('p95_ms', 'throughput_rps'):
+                    regressions += 1
+                cells.append(f"{delta:+8.1f}{'!' if worse else ' '}")
+            print(f"{transport:>6} {operation:>15} {' '.join(cells)}")
+    if regressions:
+        print(f"{regressions} regression(s)")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="benchmark this checkout and save the results")
+    run_parser.add_argument('--rows', type=int, default=100_000)
+    run_parser.add_argument('--users', type=int, default=10)
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--db', help="copy this database (e.g. from synthetic.py) instead of generating one")
+    run_parser.add_argument('--transport', nargs='+', choices=('client', 'http'), default=['client', 'http'])
+    run_parser.add_argument('--operations', nargs='+', choices=OPERATIONS, default=OPERATIONS)
+    run_parser.add_argument('--requests', type=int, default=200)
+    run_parser.add_argument('--auth-requests', type=int, default=20)
+    run_parser.add_argument('--concurrency', type=int, default=4)
+    run_parser.add_argument('--bcrypt-rounds', type=int, help="default: the app's BCRYPT_LOG_ROUNDS")
+    run_parser.add_argument('--server', default='auto', choices=('auto', 'werkzeug', 'waitress', 'gunicorn'))
+    run_parser.add_argument('--out')
+
+    compare_parser = commands.add_parser('compare', help="compare two saved results")
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=10.0)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Throughput and latency of the sync and async servers as connections grow.
+
+Starts serve.py (the thread-pool servers) and async_app.py (Quart on
+hypercorn) on copies of the same database, then for each concurrency level
+opens that many keep-alive connections and has each one send GET requests
+back to back for --seconds. Every request uses a different min_amount so
+the response cache can't answer, and reports requests/s, latency
+percentiles, failed requests and the server's resident memory.
+
+The client is a minimal HTTP/1.1 client on asyncio, so a single process can
+hold thousands of connections open without threads.
+
+Usage (from backend/):
+    python benchmarks/bench_async.py [--concurrency 10 100 1000] [--seconds 10] [--sync-server auto]
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+import requests
+from sqlalchemy import create_engine
+
+from common import rss_mb, start_server
+from migrate import upgrade
+from passwords import _hash
+from synthetic import populate
+
+SYNC_PORT = 5097
+ASYNC_PORT = 5096
+CREDENTIALS = {'username': 'bench_user_1', 'password': 'password'}
+
+
+def prepare(db_path, rows):
+    engine = create_engine(f'sqlite:///{db_path}')
+    upgrade(engine)
+    engine.dispose()
+    populate(db_path, {1: rows})
+
+    import sqlite3
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE user SET password = ? WHERE id = 1", (_hash(CREDENTIALS['password'], 4),))
+    conn.commit()
+    conn.close()
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    headers = {}
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        headers[name.strip().lower()] = value.strip()
+    if b'content-length' in headers:
+        await reader.readexactly(int(headers[b'content-length']))
+    elif headers.get(b'transfer-encoding') == b'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status, headers.get(b'connection') == b'close'
+
+
+async def connection(port, token, deadline, stats):
+    rng = random.Random()
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        stats['errors'] += 1
+        return
+    try:
+        while time.perf_counter() < deadline:
+            path = f'/expenses/1?limit=20&min_amount={rng.randrange(10_000)}'
+            start = time.perf_counter()
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                         f'Authorization: Bearer {token}\r\n\r\n'.encode())
+            status, closed = await read_response(reader)
+            if status == 200:
+                stats['latencies'].append((time.perf_counter() - start) * 1000)
+            else:
+                stats['errors'] += 1
+            if closed:
+                break
+    except (OSError, asyncio.IncompleteReadError, ValueError):
+        stats['errors'] += 1
+    finally:
+        writer.close()
+
+
+async def load(port, token, concurrency, seconds):
+    stats = {'latencies': [], 'errors': 0}
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(connection(port, token, deadline, stats) for _ in range(concurrency)))
+    return stats
+
+
+def run(name, command, port, db_path, args):
+    child, base = start_server(command, port, db_path, FINANCE_BCRYPT_LOG_ROUNDS='4')
+    try:
+        token = requests.post(base + '/login', json=CREDENTIALS).json()['token']
+        for concurrency in args.concurrency:
+            stats = asyncio.run(load(port, token, concurrency, args.seconds))
+            latencies = stats['latencies'] or [float('nan')]
+            q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            print(f"{name:>6} {concurrency:>6} {len(stats['latencies']) / args.seconds:>8.1f} {q[49]:>8.1f} "
+                  f"{q[98]:>9.1f} {stats['errors']:>7} {rss_mb(child.pid):>8.1f}")
+    finally:
+        child.terminate()
+        child.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--sync-server', default='auto', choices=('auto', 'werkzeug', 'waitress', 'gunicorn'))
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='finance-bench-async-')
+    try:
+        base_db = os.path.join(workdir, 'base.db')
+        prepare(base_db, args.rows)
+        for name in ('sync', 'async'):
+            shutil.copy(base_db, os.path.join(workdir, f'{name}.db'))
+
+        print(f"GET /expenses/<id>?limit=20 with a random min_amount, {args.seconds:g}s per level; "
+              f"latency in ms, RSS in MB")
+        print(f"{'app':>6} {'conns':>6} {'req/s':>8} {'p50':>8} {'p99':>9} {'errors':>7} {'rss':>8}")
+        run('sync', ['serve.py', '--server', args.sync_server], SYNC_PORT,
+            os.path.join(workdir, 'sync.db'), args)
+        run('async', ['async_app.py'], ASYNC_PORT, os.path.join(workdir, 'async.db'), args)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
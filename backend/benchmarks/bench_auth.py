@@ -0,0 +1,66 @@
+"""Per-request cost of bearer-token auth compared with looking the user up in the database.
+
+Usage (from backend/):
+    python benchmarks/bench_auth.py [--iterations 20000]
+"""
+import argparse
+import os
+import time
+
+from common import authorized_client, load_app
+from synthetic import populate
+
+
+def per_call_us(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20_000)
+    args = parser.parse_args()
+
+    app, db_path = load_app()
+    from auth import check_token, issue_token, revocation_statements, revocations_since, revoked, verify_token
+    from models import db, User
+
+    try:
+        populate(db_path, {1: 1_000})
+        n = args.iterations
+        with app.test_request_context():
+            token, expires = issue_token(1)
+
+            def user_lookup():
+                db.session.get(User, 1)
+                db.session.expunge_all()
+
+            key = app.config['SECRET_KEY'].encode('utf-8')
+            print(f"{'check':<40} {'us/call':>8}")
+            print(f"{'check_token (HMAC-SHA256)':<40} {per_call_us(lambda: check_token(key, token), n):>8.2f}")
+            print(f"{'verify_token (+ due revocation polls)':<40} {per_call_us(lambda: verify_token(token), n):>8.2f}")
+            print(f"{'User lookup by primary key':<40} {per_call_us(user_lookup, n // 10):>8.2f}")
+            # Another process's logouts: they reach this one through the table
+            for i in range(100_000):
+                db.session.execute(revocation_statements(f"bench{i:011d}", expires)[0])
+            db.session.commit()
+            start = time.perf_counter()
+            revoked.merge(db.session.execute(revocations_since(revoked.last_seq)).all())
+            print(f"{'poll merging 100k revocations (ms)':<40} {(time.perf_counter() - start) * 1e3:>8.1f}")
+            print(f"{'poll with nothing new':<40} "
+                  f"{per_call_us(lambda: db.session.execute(revocations_since(revoked.last_seq)).all(), n // 10):>8.2f}")
+            print(f"{'verify_token, 100k revoked tokens':<40} {per_call_us(lambda: verify_token(token), n):>8.2f}")
+
+        client = authorized_client(app)
+        anonymous = app.test_client()
+        print(f"{'GET / (no auth)':<40} {per_call_us(lambda: anonymous.get('/'), n // 10):>8.1f}")
+        print(f"{'GET /expenses/1?limit=1 (bearer token)':<40} "
+              f"{per_call_us(lambda: client.get('/expenses/1?limit=1'), n // 10):>8.1f}")
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Throughput of POST /expenses/bulk compared with one POST /expenses per row.
+
+Usage (from backend/):
+    python benchmarks/bench_bulk.py [--sizes 1000 10000 100000] [--single 1000]
+"""
+import argparse
+import json
+import os
+import time
+
+from common import authorized_client, load_app
+from synthetic import clear, generate_expenses, populate
+
+FIELDS = ('user_id', 'date', 'category', 'amount', 'description')
+
+
+def make_rows(count, seed):
+    return [dict(zip(FIELDS, row)) for row in generate_expenses(1, count, seed=seed)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--single', type=int, default=1_000,
+                        help="rows to send through POST /expenses for the baseline (0 to skip)")
+    args = parser.parse_args()
+
+    app, db_path = load_app()
+    client = authorized_client(app)
+
+    print(f"{'mode':>8} {'rows':>8} {'seconds':>9} {'rows/sec':>10}")
+    try:
+        if args.single:
+            clear(db_path)
+            populate(db_path, {1: 0})
+            rows = make_rows(args.single, seed=0)
+            start = time.perf_counter()
+            for row in rows:
+                client.post('/expenses', json=row)
+            elapsed = time.perf_counter() - start
+            print(f"{'single':>8} {args.single:>8} {elapsed:>9.2f} {args.single / elapsed:>10,.0f}")
+
+        for fmt in ('json', 'ndjson'):
+            for size in args.sizes:
+                clear(db_path)
+                populate(db_path, {1: 0})
+                rows = make_rows(size, seed=size)
+                if fmt == 'json':
+                    body, content_type = json.dumps(rows), 'application/json'
+                else:
+                    body = '\n'.join(json.dumps(row) for row in rows)
+                    content_type = 'application/x-ndjson'
+                start = time.perf_counter()
+                response = client.post('/expenses/bulk', data=body, content_type=content_type)
+                elapsed = time.perf_counter() - start
+                assert response.status_code == 201 and response.json['inserted'] == size, response.json
+                print(f"{fmt:>8} {size:>8} {elapsed:>9.2f} {size / elapsed:>10,.0f}")
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
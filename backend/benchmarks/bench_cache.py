@@ -0,0 +1,53 @@
+"""Compare uncached, cached and revalidated (304) reads of the dashboard endpoints.
+
+Usage (from backend/):
+    python benchmarks/bench_cache.py [--rows 100000] [--repeat 20]
+"""
+import argparse
+import os
+
+from common import authorized_client, load_app, time_call
+from synthetic import populate
+
+URLS = [
+    '/expenses/1?limit=200',
+    '/visualize/1',
+    '/visualize/1?granularity=month',
+    '/analytics/1/timeseries',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app, db_path = load_app()
+    from cache import response_cache
+
+    try:
+        populate(db_path, {1: args.rows})
+        client = authorized_client(app)
+
+        def uncached(url):
+            response_cache.clear()
+            client.get(url)
+
+        print(f"{args.rows} expenses")
+        print(f"{'endpoint':<34} {'uncached ms':>12} {'cached ms':>10} {'304 ms':>8} {'KB':>6}")
+        for url in URLS:
+            response = client.get(url)
+            etag = response.headers['ETag']
+            uncached_ms = time_call(lambda: uncached(url), args.repeat)
+            client.get(url)
+            cached_ms = time_call(lambda: client.get(url), args.repeat)
+            not_modified_ms = time_call(lambda: client.get(url, headers={'If-None-Match': etag}), args.repeat)
+            print(f"{url:<34} {uncached_ms:>12.2f} {cached_ms:>10.2f} {not_modified_ms:>8.2f} "
+                  f"{len(response.data) / 1024:>6.0f}")
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
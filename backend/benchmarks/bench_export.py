@@ -0,0 +1,60 @@
+"""Time to first byte, total time and peak memory of /expenses/<id>/export.
+
+Each format runs in a fresh interpreter so peak RSS belongs to that export.
+
+Usage (from backend/):
+    python benchmarks/bench_export.py [--rows 1000000] [--formats csv ndjson parquet]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from common import authorized_client, load_app
+from synthetic import populate
+
+
+def run_child(fmt, rows):
+    app, db_path = load_app()
+    try:
+        populate(db_path, {1: rows})
+        baseline_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        client = authorized_client(app)
+        start = time.perf_counter()
+        response = client.get(f'/expenses/1/export?format={fmt}', buffered=False)
+        first_byte = None
+        size = 0
+        for chunk in response.response:
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            size += len(chunk)
+        total = time.perf_counter() - start
+        response.close()
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{fmt:>8} {rows:>9} {size / 1e6:>8.1f} {first_byte * 1000:>9.1f} {total:>8.2f} "
+              f"{baseline_mb:>10.1f} {peak_mb:>10.1f}")
+    finally:
+        os.remove(db_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--formats', nargs='+', default=['csv', 'ndjson', 'parquet'])
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.rows)
+        return
+
+    print(f"{'format':>8} {'rows':>9} {'MB out':>8} {'TTFB ms':>9} {'total s':>8} "
+          f"{'RSS before':>10} {'RSS peak':>10}")
+    for fmt in args.formats:
+        subprocess.run([sys.executable, __file__, '--child', fmt, '--rows', str(args.rows)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""ORM entity reads vs column-projected rows on the expense read paths.
+
+For each read the old way (select(Expense), one identity-mapped object per
+row, copied into a dict) is timed against the column projections the
+routes now use. Peak Python memory is measured in a separate pass with
+tracemalloc, which would otherwise slow down the timed runs. The session is
+emptied after every call so neither side gets a warm identity map.
+
+Usage (from backend/):
+    python benchmarks/bench_hydration.py [--rows 100000] [--repeat 5]
+"""
+import argparse
+import os
+import tracemalloc
+
+import numpy as np
+from werkzeug.datastructures import MultiDict
+
+from common import load_app, time_call
+from synthetic import populate
+
+PAGE_SIZE = 1000
+
+
+def peak_mb(fn):
+    """Peak memory Python allocated while fn ran, in MB"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (peak - before) / 1e6
+
+
+def cases(user_id):
+    """(name, old ORM read, column-projected read) for each read path"""
+    from sqlalchemy import select
+    from aggregation import category_totals_pandas
+    from changes import MAX_CHANGES_LIMIT, changes_since, expense_change
+    from models import db, Expense
+    from queries import expense_row_to_dict, expense_to_dict, filtered_expenses, paginate_expenses
+
+    newest_first = (Expense.date.desc(), Expense.id.desc())
+    by_user = Expense.user_id == user_id
+
+    def orm_all():
+        return [expense_to_dict(expense) for expense in db.session.scalars(select(Expense).where(by_user)
+                                                                               .order_by(*newest_first))]
+
+    def rows_all():
+        return [expense_row_to_dict(row) for row in filtered_expenses(user_id, MultiDict())]
+
+    def orm_page():
+        stmt = select(Expense).where(by_user).order_by(*newest_first).limit(PAGE_SIZE + 1)
+        return [expense_to_dict(expense) for expense in db.session.scalars(stmt).all()[:PAGE_SIZE]]
+
+    def rows_page():
+        expenses, _, _ = paginate_expenses(user_id, MultiDict({'limit': PAGE_SIZE}))
+        return [expense_row_to_dict(row) for row in expenses]
+
+    def orm_changes():
+        stmt = (select(Expense).where(by_user).order_by(Expense.updated_seq, Expense.id)
+                .limit(MAX_CHANGES_LIMIT + 1))
+        return [expense_change(expense) for expense in db.session.scalars(stmt).all()[:MAX_CHANGES_LIMIT]]
+
+    def rows_changes():
+        return changes_since(db.session, user_id, 0, None, MAX_CHANGES_LIMIT)
+
+    def numpy_totals():
+        # Two columns straight into arrays, grouped with bincount: no objects, no DataFrame
+        rows = db.session.execute(select(Expense.category, Expense.amount).where(by_user)).all()
+        categories, amounts = zip(*rows)
+        names, codes = np.unique(np.array(categories, dtype=object), return_inverse=True)
+        totals = np.bincount(codes, weights=np.fromiter(amounts, dtype='float64', count=len(amounts)))
+        return {"categories": names.tolist(), "amounts": totals.tolist()}
+
+    return [
+        ("all rows (all=true)", orm_all, rows_all),
+        (f"one page of {PAGE_SIZE}", orm_page, rows_page),
+        (f"changes since=0 ({MAX_CHANGES_LIMIT})", orm_changes, rows_changes),
+        ("category totals, raw rows", lambda: category_totals_pandas(user_id), numpy_totals),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000, help="expenses for the measured user")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app, db_path = load_app()
+    from models import db
+
+    try:
+        # The measured user plus a neighbour so the filter has something to skip
+        populate(db_path, {1: args.rows, 2: args.rows // 10})
+        print(f"{args.rows:,} expenses for the measured user")
+        print(f"{'read':<28} {'ORM ms':>9} {'rows ms':>9} {'speedup':>8} {'ORM MB':>8} {'rows MB':>8}")
+        with app.app_context():
+            for name, orm, rows in cases(1):
+                results = []
+                for fn in (orm, rows):
+                    def call(fn=fn):
+                        fn()
+                        db.session.remove()
+                    call()  # Warm up statement caches and SQLite's page cache
+                    results.append((time_call(call, args.repeat), peak_mb(call)))
+                (orm_ms, orm_mb), (rows_ms, rows_mb) = results
+                print(f"{name:<28} {orm_ms:>9.1f} {rows_ms:>9.1f} {orm_ms / rows_ms:>7.1f}x "
+                      f"{orm_mb:>8.1f} {rows_mb:>8.1f}")
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
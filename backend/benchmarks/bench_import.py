@@ -0,0 +1,65 @@
+"""Import speed and peak memory of the streaming statement importer.
+
+Each size runs in a fresh interpreter so peak RSS reflects that import
+alone; flat RSS across sizes shows the file is never held in memory.
+
+Usage (from backend/):
+    python benchmarks/bench_import.py [--sizes 100000 1000000]
+"""
+import argparse
+import csv
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import load_app
+from synthetic import generate_expenses
+
+
+def write_statement(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Date', 'Narration', 'Withdrawal Amt.', 'Category'])
+        for _, day, category, amount, description in generate_expenses(1, rows):
+            writer.writerow([day, description, f"{amount:,.2f}", category])
+
+
+def run_child(rows):
+    statement = tempfile.mktemp(prefix='statement-', suffix='.csv')
+    write_statement(statement, rows)
+    size_mb = os.path.getsize(statement) / 1e6
+    app, db_path = load_app()
+    from importer import import_statement, open_text_stream
+    try:
+        with app.app_context(), open(statement, 'rb') as f:
+            start = time.perf_counter()
+            result = import_statement(open_text_stream(f), user_id=1)
+            elapsed = time.perf_counter() - start
+        assert result.imported == rows, result.to_dict()
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{rows:>10} {size_mb:>9.1f} {elapsed:>9.2f} {rows / elapsed:>10,.0f} {peak_mb:>12.1f}")
+    finally:
+        os.remove(statement)
+        os.remove(db_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return
+
+    print(f"{'rows':>10} {'file MB':>9} {'seconds':>9} {'rows/sec':>10} {'peak RSS MB':>12}")
+    for rows in args.sizes:
+        subprocess.run([sys.executable, __file__, '--child', str(rows)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Latency of GET /expenses while a storm of logins hits the same server.
+
+Starts the app on a threaded development server in a child process, measures
+/expenses latency on its own, then again while --clients threads log in
+back to back (waiting out Retry-After on a 503). Run once with bcrypt inline in the request threads (the old
+behaviour) and once on the password worker pool.
+
+Usage (from backend/):
+    python benchmarks/bench_login_storm.py [--rounds 12] [--clients 16] [--seconds 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from common import load_app
+from synthetic import populate
+
+PORT = 5099
+CREDENTIALS = {'username': 'bench_user_1', 'password': 'password'}
+
+
+def serve(db_path, rounds, inline):
+    os.environ['FINANCE_BCRYPT_LOG_ROUNDS'] = str(rounds)
+    app, _ = load_app(db_path)
+    from passwords import hasher
+    if inline:
+        # Old behaviour: hash in the request thread with no limit
+        hasher._run = lambda fn, *args: fn(*args)
+    with app.app_context():
+        from models import db, User
+        user = User.query.get(1)
+        user.set_password(CREDENTIALS['password'])
+        db.session.commit()
+    app.run(port=PORT, threaded=True, use_reloader=False)
+
+
+def wait_for_server(base):
+    for _ in range(100):
+        try:
+            requests.get(base + '/', timeout=1)
+            return
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def sample_latency(url, seconds, token):
+    """Sequential GETs for the given time; returns latencies in ms"""
+    session = requests.Session()
+    session.headers['Authorization'] = f'Bearer {token}'
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        session.get(url).raise_for_status()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def login_storm(base, clients, stop, outcomes):
+    def client():
+        session = requests.Session()
+        while not stop.is_set():
+            response = session.post(base + '/login', json=CREDENTIALS)
+            outcomes.append(response.status_code)
+            if response.status_code == 503:
+                stop.wait(float(response.headers.get('Retry-After', 1)))
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def percentile(samples, pct):
+    return statistics.quantiles(samples, n=100)[pct - 1] if len(samples) > 1 else samples[0]
+
+
+def run(mode, args, db_path):
+    base = f'http://127.0.0.1:{PORT}'
+    child = subprocess.Popen(
+        [sys.executable, __file__, '--serve', db_path, '--rounds', str(args.rounds)]
+        + (['--inline'] if mode == 'inline' else []),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_server(base)
+        token = requests.post(base + '/login', json=CREDENTIALS).json()['token']
+        url = f'{base}/expenses/1?limit=100'
+        quiet = sample_latency(url, args.seconds, token)
+
+        stop = threading.Event()
+        outcomes = []
+        threads = login_storm(base, args.clients, stop, outcomes)
+        time.sleep(1)
+        storm = sample_latency(url, args.seconds, token)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        logins = sum(1 for status in outcomes if status == 200)
+        shed = sum(1 for status in outcomes if status == 503)
+        for label, samples in (('quiet', quiet), ('storm', storm)):
+            print(f"{mode:>7} {label:>6} {statistics.median(samples):>8.1f} {percentile(samples, 95):>8.1f} "
+                  f"{percentile(samples, 99):>8.1f}" + (f" {logins:>7} {shed:>6}" if label == 'storm' else ''))
+    finally:
+        child.terminate()
+        child.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    parser.add_argument('--inline', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.rounds, args.inline)
+        return
+
+    app, db_path = load_app()
+    try:
+        populate(db_path, {1: 10_000})
+        print(f"bcrypt cost {args.rounds}, {args.clients} login clients; /expenses latency in ms")
+        print(f"{'mode':>7} {'load':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'logins':>7} {'503s':>6}")
+        for mode in ('inline', 'pool'):
+            run(mode, args, db_path)
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
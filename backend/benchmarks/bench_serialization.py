@@ -0,0 +1,89 @@
+"""Response encoding: json vs orjson, rows vs columns, and compressed sizes.
+
+The unpaginated listing (all=true) of one user is encoded with Flask's
+stdlib provider and with FastJSONProvider, in the usual one-object-per-row
+shape and in the columnar one, then decoded again as a client would. Its
+bytes are then compressed at the levels serialization.py uses. Last, the
+whole GET is timed through the app for a plain client and for one asking
+for columns with gzip. JSON is compact, as under the production config.
+
+Usage (from backend/):
+    python benchmarks/bench_serialization.py [--rows 100000] [--repeat 5]
+"""
+import argparse
+import gzip
+import json
+import os
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.datastructures import MultiDict
+
+from common import authorized_client, load_app, time_call
+from synthetic import populate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000, help="expenses for the measured user")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app, db_path = load_app()
+    app.debug = False  # Compact JSON, as in production
+    from queries import expense_row_to_dict, filtered_expenses
+    import serialization
+    from serialization import COLUMNS_MIMETYPE, FastJSONProvider, expense_columns
+
+    try:
+        populate(db_path, {1: args.rows})
+        print(f"{args.rows:,} expenses, orjson {'installed' if serialization.orjson else 'NOT installed'}, "
+              f"brotli {'installed' if serialization.brotli else 'not installed'}")
+        with app.app_context():
+            rows = filtered_expenses(1, MultiDict())
+            shapes = [("rows", {"expenses": [expense_row_to_dict(row) for row in rows]}),
+                      ("columns", expense_columns(rows))]
+            providers = [("json", DefaultJSONProvider(app), json.loads), ("orjson", FastJSONProvider(app), None)]
+            if serialization.orjson:
+                providers[1] = providers[1][:2] + (serialization.orjson.loads,)
+
+            print(f"\n{'encoding':<18} {'encode ms':>10} {'decode ms':>10} {'MB':>7}")
+            bodies = {}
+            for shape, payload in shapes:
+                for name, provider, loads in providers:
+                    body = bodies[shape] = provider.response(payload).get_data()
+                    encode_ms = time_call(lambda: provider.response(payload).get_data(), args.repeat)
+                    decode_ms = time_call(lambda: loads(body), args.repeat) if loads else float('nan')
+                    print(f"{name + ' ' + shape:<18} {encode_ms:>10.1f} {decode_ms:>10.1f} {len(body) / 1e6:>7.2f}")
+
+            compressors = [(f"gzip {level}", lambda body, level=level: gzip.compress(body, level, mtime=0))
+                           for level in (1, serialization.GZIP_LEVEL, 9)]
+            if serialization.brotli:
+                compressors += [(f"br {quality}", lambda body, quality=quality:
+                                 serialization.brotli.compress(body, quality=quality))
+                                for quality in (1, serialization.BROTLI_QUALITY, 11)]
+            print(f"\n{'compression':<18} {'rows ms':>9} {'rows MB':>8} {'cols ms':>9} {'cols MB':>8}")
+            for name, compress in compressors:
+                cells = []
+                for shape in ('rows', 'columns'):
+                    body = bodies[shape]
+                    cells.append((time_call(lambda: compress(body), args.repeat), len(compress(body)) / 1e6))
+                (rows_ms, rows_mb), (cols_ms, cols_mb) = cells
+                print(f"{name:<18} {rows_ms:>9.1f} {rows_mb:>8.2f} {cols_ms:>9.1f} {cols_mb:>8.2f}")
+
+        client = authorized_client(app)
+        variants = [("plain JSON", {}),
+                    ("columns + gzip", {'Accept': COLUMNS_MIMETYPE, 'Accept-Encoding': 'gzip'})]
+        print(f"\n{'GET all=true':<18} {'ms':>9} {'MB sent':>8}")
+        for name, headers in variants:
+            def call(headers=headers):
+                # A fresh query string each time so the response cache doesn't answer
+                call.n = getattr(call, 'n', 0) + 1
+                return client.get(f'/expenses/1?all=true&_={call.n}', headers=headers)
+            size = len(call().get_data())
+            print(f"{name:<18} {time_call(call, args.repeat):>9.1f} {size / 1e6:>8.2f}")
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Latency of /analytics/<user_id>/timeseries for a user with many expenses.
+
+The target is 50 ms per request at every granularity. A daily series may
+cover at most a year (analytics.PERIOD_LIMITS), so days are asked for over
+the year up to the latest expense.
+
+Usage (from backend/):
+    python benchmarks/bench_timeseries.py [--rows 100000] [--repeat 20]
+"""
+import argparse
+import os
+from datetime import date, timedelta
+
+from common import authorized_client, load_app, time_call
+from synthetic import populate
+
+TARGET_MS = 50
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app, db_path = load_app()
+    from analytics import PERIOD_LIMITS, timeseries
+    from cache import response_cache
+    from models import db, ExpenseRollup
+    from sqlalchemy import func, select
+
+    try:
+        populate(db_path, {1: args.rows})
+        client = authorized_client(app)
+        with app.app_context():
+            latest = date.fromisoformat(db.session.scalar(select(func.max(ExpenseRollup.period))
+                                                          .where(ExpenseRollup.period_type == 'day')))
+        year_start = latest - timedelta(days=PERIOD_LIMITS['day'] - 1)
+        print(f"{args.rows} expenses over 10 years, target {TARGET_MS} ms per request at every granularity "
+              f"(day from {year_start})")
+        print(f"{'granularity':>12} {'periods':>8} {'compute ms':>11} {'endpoint ms':>12} {'KB':>7}")
+        for granularity in ('month', 'week', 'day'):
+            start = year_start if granularity == 'day' else None
+            url = f'/analytics/1/timeseries?granularity={granularity}' + (f'&start={start}' if start else '')
+            response = client.get(url)
+            periods, size = len(response.get_json()['periods']), len(response.data)
+            with app.app_context():
+                compute_ms = time_call(lambda: timeseries(1, granularity, start), args.repeat)
+            # Measure the full request, not a response cache hit
+            endpoint_ms = time_call(lambda: (response_cache.clear(), client.get(url)), args.repeat)
+            verdict = '' if endpoint_ms <= TARGET_MS else '  over target'
+            print(f"{granularity:>12} {periods:>8} {compute_ms:>11.1f} {endpoint_ms:>12.1f} {size / 1024:>7.0f}{verdict}")
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""Compare /visualize's rollup reads with GROUP BY over raw rows and the old pandas path.
+
+Usage (from backend/):
+    python benchmarks/bench_visualize.py [--sizes 10000 100000 1000000] [--repeat 5]
+"""
+import argparse
+import os
+
+from common import load_app, time_call
+from synthetic import clear, populate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app, db_path = load_app()
+    from aggregation import category_totals, category_totals_pandas, category_totals_query
+
+    print(f"{'rows':>10} {'rollup ms':>10} {'sql ms':>10} {'pandas ms':>10}")
+    try:
+        for size in args.sizes:
+            clear(db_path)
+            # The measured user plus a neighbour so the filter has something to skip
+            populate(db_path, {1: size, 2: size // 10})
+            with app.app_context():
+                rollup_ms = time_call(lambda: category_totals(1), args.repeat)
+                sql_ms = time_call(lambda: category_totals(1, query=category_totals_query), args.repeat)
+                pandas_ms = time_call(lambda: category_totals_pandas(1), args.repeat)
+            print(f"{size:>10} {rollup_ms:>10.2f} {sql_ms:>10.1f} {pandas_ms:>10.1f}")
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Reader latency while a writer keeps bulk-inserting, with and without WAL.
+
+Starts serve.py once with the development config (SQLite's default rollback
+journal) and once with the production config (WAL and the tuned pragmas),
+each on a fresh database. In both runs one client posts large batches to
+/expenses/bulk back to back while --readers clients page through
+GET /expenses.
+
+Usage (from backend/):
+    python benchmarks/bench_wal.py [--readers 8] [--seconds 15] [--batch 20000] [--server werkzeug]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from sqlalchemy import create_engine
+
+from common import BACKEND_DIR
+from migrate import upgrade
+from passwords import _hash
+from synthetic import generate_expenses, populate
+
+PORT = 5098
+CREDENTIALS = {'username': 'bench_user_1', 'password': 'password'}
+
+
+def start_server(config, db_path, server):
+    env = dict(os.environ, FINANCE_CONFIG=config, FINANCE_DATABASE_URI=f'sqlite:///{db_path}',
+               FINANCE_BCRYPT_LOG_ROUNDS='4')
+    child = subprocess.Popen([sys.executable, 'serve.py', '--port', str(PORT), '--server', server],
+                             cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{PORT}'
+    for _ in range(100):
+        try:
+            requests.get(base + '/', timeout=1)
+            return child, base
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.2)
+    child.kill()
+    raise RuntimeError("server did not start")
+
+
+def writer(base, headers, batch, stop, stats):
+    session = requests.Session()
+    session.headers.update(headers)
+    # The same batch every time; bulk inserts don't dedupe
+    body = '\n'.join(json.dumps(dict(zip(('user_id', 'date', 'category', 'amount', 'description'), row)))
+                     for row in generate_expenses(1, batch, seed=1))
+    while not stop.is_set():
+        response = session.post(base + '/expenses/bulk', data=body,
+                                headers={'Content-Type': 'application/x-ndjson'})
+        stats['writes' if response.status_code == 201 else 'write_errors'] += 1
+
+
+def reader(base, headers, stop, stats):
+    session = requests.Session()
+    session.headers.update(headers)
+    rng = random.Random()
+    while not stop.is_set():
+        # A different filter each time so the response cache can't answer
+        url = f'{base}/expenses/1?limit=100&min_amount={rng.randrange(10_000)}'
+        start = time.perf_counter()
+        response = session.get(url)
+        elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code == 200:
+            stats['latencies'].append(elapsed)
+        else:
+            stats['read_errors'] += 1
+
+
+def run(config, args):
+    fd, db_path = tempfile.mkstemp(prefix=f'finance-bench-{config}-', suffix='.db')
+    os.close(fd)
+    populate_fresh(db_path, args.rows)
+    child, base = start_server(config, db_path, args.server)
+    try:
+        token = requests.post(base + '/login', json=CREDENTIALS).json()['token']
+        headers = {'Authorization': f'Bearer {token}'}
+        stats = {'latencies': [], 'read_errors': 0, 'writes': 0, 'write_errors': 0}
+        stop = threading.Event()
+        threads = [threading.Thread(target=writer, args=(base, headers, args.batch, stop, stats))]
+        threads += [threading.Thread(target=reader, args=(base, headers, stop, stats)) for _ in range(args.readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        child.terminate()
+        child.wait()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    latencies = stats['latencies']
+    q = statistics.quantiles(latencies, n=100)
+    print(f"{config:>12} {len(latencies) / args.seconds:>8.1f} {q[49]:>8.1f} {q[94]:>8.1f} {q[98]:>8.1f} "
+          f"{max(latencies):>8.1f} {stats['read_errors']:>7} {stats['writes']:>7} {stats['write_errors']:>7}")
+
+
+def populate_fresh(db_path, rows):
+    """Create the schema in a new file and fill it with one user's expenses"""
+    engine = create_engine(f'sqlite:///{db_path}')
+    upgrade(engine)
+    engine.dispose()
+    populate(db_path, {1: rows})
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE user SET password = ? WHERE id = 1", (_hash(CREDENTIALS['password'], 4),))
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--batch', type=int, default=20_000)
+    parser.add_argument('--server', default='werkzeug', choices=('werkzeug', 'waitress', 'gunicorn'))
+    args = parser.parse_args()
+
+    print(f"{args.readers} readers, 1 writer posting {args.batch}-row batches; GET /expenses latency in ms")
+    print(f"{'config':>12} {'reads/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} "
+          f"{'errors':>7} {'writes':>7} {'failed':>7}")
+    for config in ('development', 'production'):
+        run(config, args)
+
+
+if __name__ == '__main__':
+    main()
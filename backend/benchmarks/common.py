@@ -0,0 +1,77 @@
+"""Helpers shared by the benchmark scripts."""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def load_app(db_path=None):
+    """Import the Flask app against a scratch database instead of instance/finance.db
+
+    Returns (app, db_path). Must be called before anything imports app.py.
+    """
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(prefix='finance-bench-', suffix='.db')
+        os.close(fd)
+    os.environ['FINANCE_DATABASE_URI'] = f'sqlite:///{db_path}'
+    from app import app
+    return app, db_path
+
+
+def authorized_client(app, user_id=1):
+    """A test client that sends a bearer token for user_id with every request"""
+    from auth import issue_token
+    with app.app_context():
+        token, _ = issue_token(user_id)
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    return client
+
+
+def time_call(fn, repeat=5):
+    """Run fn repeat times and return the median wall time in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def start_server(command, port, db_path, **env):
+    """Run a backend script (e.g. ['serve.py', '--server', 'waitress']) on a database until it answers
+
+    Returns (process, base URL). env adds or overrides environment variables.
+    """
+    env = dict(os.environ, FINANCE_CONFIG='production', FINANCE_DATABASE_URI=f'sqlite:///{db_path}', **env)
+    child = subprocess.Popen([sys.executable, *command, '--port', str(port)], cwd=BACKEND_DIR, env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    for _ in range(150):
+        try:
+            requests.get(base + '/', timeout=1)
+            return child, base
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            time.sleep(0.2)  # Not listening yet, or still starting up
+    child.kill()
+    raise RuntimeError(f"{command[0]} did not start")
+
+
+def rss_mb(pid):
+    """Resident memory of a process in MB (Linux only; NaN elsewhere)"""
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float('nan')
@@ -0,0 +1,184 @@
+"""Seeded synthetic users and expenses for benchmarks.
+
+The same seed always gives the same data. It aims for the shape of real
+spending, not uniform noise:
+
+- Categories are skewed (Food most often, Other least) with lognormal
+  amounts around a per-category median.
+- Activity grows over time, so recent months hold more rows than old ones.
+  Bills cluster in the first days of the month and Food/Entertainment lean
+  towards weekends.
+- Across users, row counts follow a Zipf-like curve. A few heavy users hold
+  much of the data and most have little.
+
+Build a standalone database (10M rows take a few minutes) to reuse across runs:
+    python benchmarks/synthetic.py bench.db --rows 10000000 --users 1000 [--seed 0]
+"""
+import argparse
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine
+
+import common  # noqa: F401  Puts backend/ on sys.path
+from migrate import upgrade
+import rollups
+
+CATEGORIES = ["Food", "Transport", "Entertainment", "Bills", "Shopping", "Other"]
+CATEGORY_WEIGHTS = [0.35, 0.20, 0.10, 0.15, 0.12, 0.08]
+
+# Median amount per category, used as the centre of a lognormal distribution
+CATEGORY_MEDIANS = {
+    "Food": 250.0,
+    "Transport": 120.0,
+    "Entertainment": 600.0,
+    "Bills": 1800.0,
+    "Shopping": 900.0,
+    "Other": 300.0,
+}
+
+MERCHANTS = {
+    "Food": ["Swiggy", "Zomato", "BigBasket", "Cafe Coffee Day", "Local kirana", "Dominos"],
+    "Transport": ["Uber", "Ola", "Metro card", "Indian Oil", "Rapido"],
+    "Entertainment": ["BookMyShow", "Netflix", "Spotify", "PVR", "Steam"],
+    "Bills": ["Electricity", "Airtel", "Rent", "Water", "Gas", "Broadband"],
+    "Shopping": ["Amazon", "Flipkart", "Myntra", "DMart", "Decathlon"],
+    "Other": ["Pharmacy", "Donation", "Haircut", "Gift", "ATM fee"],
+}
+
+WEEKEND_CATEGORIES = {"Food", "Entertainment"}
+
+# Exponent of the per-user row count curve: user k gets a share proportional to 1 / k**USER_SKEW
+USER_SKEW = 1.1
+
+BATCH_SIZE = 50000
+
+
+def generate_expenses(user_id, count, seed=0, start=date(2016, 1, 1), days=3650):
+    """Yield (user_id, date, category, amount, description) tuples; descriptions are unique per user"""
+    rng = random.Random(f"{seed}:{user_id}")
+    categories = rng.choices(CATEGORIES, weights=CATEGORY_WEIGHTS, k=count)
+    for i, category in enumerate(categories):
+        # sqrt of a uniform variable: density rises linearly towards the end of the range
+        day = start + timedelta(days=int(days * math.sqrt(rng.random())))
+        if category == "Bills":
+            day = day.replace(day=1 + rng.randrange(5))
+        elif category in WEEKEND_CATEGORIES and day.weekday() < 5 and rng.random() < 0.4:
+            day += timedelta(days=5 - day.weekday() + rng.randrange(2))  # Move to the weekend
+        amount = round(rng.lognormvariate(0, 0.8) * CATEGORY_MEDIANS[category], 2)
+        yield (user_id, day.isoformat(), category, amount, f"{rng.choice(MERCHANTS[category])} #{i}")
+
+
+def user_row_counts(total_rows, users, seed=0, skew=USER_SKEW):
+    """Split total_rows over user ids 1..users along a Zipf-like curve; user 1 is the heaviest"""
+    weights = [1 / rank ** skew for rank in range(1, users + 1)]
+    scale = total_rows / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    # Hand the rounding remainder to randomly chosen users so the total is exact
+    rng = random.Random(seed)
+    for _ in range(total_rows - sum(counts)):
+        counts[rng.randrange(users)] += 1
+    return {user_id: count for user_id, count in enumerate(counts, start=1)}
+
+
+def populate(db_path, rows_per_user, seed=0, batch_size=BATCH_SIZE, progress=None):
+    """Insert synthetic expenses straight into an existing finance database
+
+    rows_per_user maps user_id -> number of expenses to generate. Each
+    user's data version is bumped and stamped on their new rows, as the
+    write routes would, and their rollups are rebuilt afterwards.
+    progress(rows inserted so far) is called after every batch.
+    """
+    conn = sqlite3.connect(db_path)
+    # A scratch database: a crash mid-populate just means starting again
+    conn.execute("PRAGMA synchronous = OFF")
+    inserted = 0
+    try:
+        for user_id, count in rows_per_user.items():
+            conn.execute(
+                "INSERT OR IGNORE INTO user (id, username, password) VALUES (?, ?, ?)",
+                (user_id, f"bench_user_{user_id}", "x"),
+            )
+            seq = conn.execute("UPDATE user SET data_version = data_version + 1 WHERE id = ? RETURNING data_version",
+                               (user_id,)).fetchone()[0]
+            rows = generate_expenses(user_id, count, seed=seed)
+            while True:
+                chunk = [row + (seq,) for _, row in zip(range(batch_size), rows)]
+                if not chunk:
+                    break
+                conn.executemany(
+                    "INSERT INTO expense (user_id, date, category, amount, description, updated_seq) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    chunk,
+                )
+                inserted += len(chunk)
+                if progress:
+                    progress(inserted)
+        conn.commit()
+    finally:
+        conn.close()
+
+    # Rows inserted behind the app's back need their rollups rebuilt
+    engine = create_engine(f"sqlite:///{db_path}")
+    with engine.begin() as conn:
+        if len(rows_per_user) > 100:
+            rollups.rebuild(conn)
+        else:
+            for user_id in rows_per_user:
+                rollups.rebuild(conn, user_id)
+    engine.dispose()
+
+
+def create(db_path, total_rows, users=1, seed=0, progress=None):
+    """Create a finance database at db_path holding total_rows expenses spread over users"""
+    engine = create_engine(f"sqlite:///{db_path}")
+    upgrade(engine)
+    engine.dispose()
+    counts = user_row_counts(total_rows, users, seed) if users > 1 else {1: total_rows}
+    populate(db_path, counts, seed=seed, progress=progress)
+    return counts
+
+
+def clear(db_path):
+    """Remove all users and expenses from a benchmark database"""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("DELETE FROM expense")
+        conn.execute("DELETE FROM expense_tombstone")
+        conn.execute("DELETE FROM expense_rollup")
+        conn.execute("DELETE FROM user")
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a finance database full of synthetic expenses")
+    parser.add_argument('database')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.exists(args.database):
+        sys.exit(f"{args.database} already exists")
+    start = time.perf_counter()
+
+    def progress(done):
+        if done % 1_000_000 < BATCH_SIZE:
+            print(f"  {done:>12,} rows  {time.perf_counter() - start:6.0f}s", flush=True)
+
+    counts = create(args.database, args.rows, args.users, args.seed, progress)
+    heaviest = max(counts.values())
+    print(f"{args.rows:,} expenses for {args.users:,} users (heaviest has {heaviest:,}) "
+          f"in {time.perf_counter() - start:.0f}s -> {args.database}")
+
+
+if __name__ == '__main__':
+    main()
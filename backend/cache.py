@@ -0,0 +1,145 @@
+"""Conditional GETs and an in-process response cache for per-user reads.
+
+Every user has a data_version counter that the write paths bump in the same
+transaction as the change. Cached read routes derive a strong ETag from the
+request URL and that version, so a client revalidating with If-None-Match
+gets a 304 after a single primary-key lookup, and repeat requests from other
+clients are served from a byte-bounded LRU of serialised bodies. The
+columnar shape of a response has its own ETag, and compressed bodies carry
+it with a suffix (see serialization.py).
+"""
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response, make_response, request
+from sqlalchemy import select, update
+
+from models import db, User
+from serialization import COLUMNS_MIMETYPE, matching_etag, wants_columns
+
+RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+_user = User.__table__
+
+
+def bump_versions(executor, user_ids):
+    """Invalidate cached reads for these users; call inside the writing transaction
+
+    Returns {user_id: new data_version}. Writes stamp it on the rows they
+    change, for the change feed (see changes.py).
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    rows = executor.execute(update(_user)
+                            .where(_user.c.id.in_(user_ids))
+                            .values(data_version=_user.c.data_version + 1)
+                            .returning(_user.c.id, _user.c.data_version))
+    return dict(rows.all())
+
+
+def data_version_query(user_id):
+    """SELECT a user's data version (no row for an unknown user)"""
+    return select(_user.c.data_version).where(_user.c.id == user_id)
+
+
+def data_version(user_id):
+    """Return the user's current data version, or None for an unknown user"""
+    return db.session.execute(data_version_query(user_id)).scalar()
+
+
+def make_etag(path, query_string, version, columns=False):
+    """Strong validator for one representation of a user's data at a version"""
+    variant = b'#' + COLUMNS_MIMETYPE.encode() if columns else b''
+    digest = hashlib.sha1(path.encode() + b'?' + query_string + variant).hexdigest()[:16]
+    return f"{version}-{digest}"
+
+
+class ResponseCache:
+    """Thread-safe LRU of (body, mimetype) keyed by ETag, bounded by total body size"""
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_bytes = app.config.setdefault('RESPONSE_CACHE_MAX_BYTES', self.max_bytes)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, mimetype):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[0])
+            self._entries[key] = (body, mimetype)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+response_cache = ResponseCache()
+
+
+def conditional(view):
+    """Serve a user_id route with an ETag, 304s and the response cache
+
+    Only 200 responses are cached. The version is read before the view runs,
+    so a write landing in between can only tag new data with an old version,
+    which no client will ask for again once it has seen the new one. Plain
+    JSON and the columnar shape are cached and tagged separately.
+    """
+    @functools.wraps(view)
+    def wrapper(user_id, **kwargs):
+        version = data_version(user_id)
+        if version is None:
+            return view(user_id, **kwargs)
+
+        etag = make_etag(request.path, request.query_string, version, wants_columns(request.accept_mimetypes))
+        matched = matching_etag(request.if_none_match, etag)
+        if matched:
+            response = Response(status=304)
+            etag = matched
+        else:
+            cached = response_cache.get(etag)
+            if cached is not None:
+                body, mimetype = cached
+                response = Response(body, status=200, mimetype=mimetype)
+            else:
+                response = make_response(view(user_id, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response_cache.put(etag, response.get_data(), response.mimetype)
+
+        response.set_etag(etag)
+        # Let clients keep the body but revalidate it on every use
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Accept')
+        return response
+
+    return wrapper
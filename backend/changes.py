@@ -0,0 +1,154 @@
+"""Per-user change feed, so clients with a local copy only download what changed.
+
+Every expense write bumps the user's data_version (cache.bump_versions) and
+stamps the rows it inserts or updates with the new version in
+expense.updated_seq. A delete leaves a row in expense_tombstone carrying
+the version of the delete. GET /expenses/<user_id>/changes?since=N returns
+both, ordered by (seq, id):
+
+    {"version": 42,
+     "changes": [{"id": 7, "date": "2024-05-01", ..., "seq": 41},
+                 {"id": 3, "deleted": true, "seq": 42}],
+     "next": null}
+
+Apply the changes in order, then sync from `version` next time. A page
+holds at most `limit` entries. When `next` is set, ask again with
+after=<next> and the same since. A write that lands while a client pages
+gets a seq above the cursor, so a later page picks it up. Clients that
+ask for the columnar shape (see serialization.py) get the same page as
+parallel arrays from changes_columns().
+
+since=0 means "I have nothing": every expense, including rows written
+before the feed existed (updated_seq 0), and no tombstones.
+"""
+import base64
+import binascii
+
+from sqlalchemy import select, tuple_
+
+from models import Expense, ExpenseTombstone
+from cache import data_version_query
+from queries import EXPENSE_COLUMNS, EXPENSE_FIELDS, expense_to_dict
+
+DEFAULT_CHANGES_LIMIT = 1000
+MAX_CHANGES_LIMIT = 5000
+
+_tombstone = ExpenseTombstone.__table__
+
+# The feed reads plain rows, like the listings in queries.py
+CHANGE_FIELDS = EXPENSE_FIELDS + ('seq',)
+CHANGE_COLUMNS = EXPENSE_COLUMNS + (Expense.updated_seq.label('seq'),)
+
+
+def record_deletes(executor, user_id, expense_ids, seq):
+    """Leave tombstones for deleted expenses; call in the deleting transaction"""
+    if expense_ids:
+        executor.execute(_tombstone.insert(),
+                         [{'user_id': user_id, 'expense_id': expense_id, 'seq': seq} for expense_id in expense_ids])
+
+
+def expense_change(expense):
+    """Feed entry for an inserted or updated Expense object"""
+    return dict(expense_to_dict(expense), seq=expense.updated_seq)
+
+
+def expense_row_change(row):
+    """Feed entry for a CHANGE_COLUMNS row"""
+    return dict(zip(CHANGE_FIELDS, row))
+
+
+def deleted_change(expense_id, seq):
+    """Feed entry for a deleted expense"""
+    return {"id": expense_id, "deleted": True, "seq": seq}
+
+
+def encode_cursor(seq, expense_id):
+    return base64.urlsafe_b64encode(f"{seq}:{expense_id}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        seq, expense_id = raw.split(':')
+        return int(seq), int(expense_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("'after' is not a valid cursor")
+
+
+def parse_changes_args(args):
+    """Return (since, after, limit) from the query string"""
+    try:
+        since = int(args.get('since', 0))
+    except ValueError:
+        raise ValueError("'since' must be an integer")
+    if since < 0:
+        raise ValueError("'since' must not be negative")
+    try:
+        limit = int(args.get('limit', DEFAULT_CHANGES_LIMIT))
+    except ValueError:
+        raise ValueError("'limit' must be an integer")
+    if not 1 <= limit <= MAX_CHANGES_LIMIT:
+        raise ValueError(f"'limit' must be between 1 and {MAX_CHANGES_LIMIT}")
+    after = decode_cursor(args['after']) if args.get('after') else None
+    return since, after, limit
+
+
+def changes_statements(user_id, since, after, limit):
+    """Return (expenses select, tombstones select or None), each fetching up to limit + 1 rows"""
+    seq_key = tuple_(Expense.updated_seq, Expense.id)
+    expenses = select(*CHANGE_COLUMNS).where(Expense.user_id == user_id)
+    if since:
+        expenses = expenses.where(Expense.updated_seq > since)
+    if after:
+        expenses = expenses.where(seq_key > after)
+    expenses = expenses.order_by(Expense.updated_seq, Expense.id).limit(limit + 1)
+
+    if not since:
+        return expenses, None
+    tombstone_key = tuple_(_tombstone.c.seq, _tombstone.c.expense_id)
+    tombstones = select(_tombstone.c.seq, _tombstone.c.expense_id).where(_tombstone.c.user_id == user_id,
+                                                                         _tombstone.c.seq > since)
+    if after:
+        tombstones = tombstones.where(tombstone_key > after)
+    return expenses, tombstones.order_by(_tombstone.c.seq, _tombstone.c.expense_id).limit(limit + 1)
+
+
+def _merge(expenses, tombstones, limit):
+    """Return ([((seq, id), row or None for a deletion)] for one page, next cursor)"""
+    entries = [((row.seq, row.id), row) for row in expenses]
+    entries += [((row.seq, row.expense_id), None) for row in tombstones]
+    entries.sort(key=lambda entry: entry[0])
+    next_cursor = encode_cursor(*entries[limit - 1][0]) if len(entries) > limit else None
+    return entries[:limit], next_cursor
+
+
+def changes_payload(version, expenses, tombstones, limit):
+    """Merge the rows of changes_statements() into one page of the feed"""
+    entries, next_cursor = _merge(expenses, tombstones, limit)
+    changes = [deleted_change(expense_id, seq) if row is None else expense_row_change(row)
+               for (seq, expense_id), row in entries]
+    return {"version": version, "changes": changes, "next": next_cursor}
+
+
+def changes_columns(version, expenses, tombstones, limit):
+    """changes_payload() in the columnar shape (see serialization.py)"""
+    entries, next_cursor = _merge(expenses, tombstones, limit)
+    rows = [(expense_id, None, None, None, None, seq) if row is None else row
+            for (seq, expense_id), row in entries]
+    ids, dates, categories, amounts, descriptions, seqs = (list(column) for column in zip(*rows)) if rows else ([],) * 6
+    return {"version": version, "ids": ids, "seqs": seqs, "deleted": [row is None for _, row in entries],
+            "dates": dates, "categories": categories, "amounts": amounts, "descriptions": descriptions,
+            "next": next_cursor}
+
+
+def changes_since(session, user_id, since, after, limit, columns=False):
+    """One page of the user's change feed (columnar if asked), or None for an unknown user"""
+    # Read the version first: a write committing before the rows are read then only
+    # shows up twice (here and in the next sync), never not at all
+    version = session.execute(data_version_query(user_id)).scalar()
+    if version is None:
+        return None
+    expenses_stmt, tombstones_stmt = changes_statements(user_id, since, after, limit)
+    expenses = session.execute(expenses_stmt).all()
+    tombstones = session.execute(tombstones_stmt).all() if tombstones_stmt is not None else []
+    return (changes_columns if columns else changes_payload)(version, expenses, tombstones, limit)
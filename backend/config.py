@@ -0,0 +1,98 @@
+"""Configuration objects for the backend.
+
+app.py loads the class named by FINANCE_CONFIG (development by default):
+
+    FINANCE_CONFIG=production python serve.py
+
+Individual values can still be overridden through the FINANCE_* environment
+variables read below.
+"""
+import os
+import secrets
+
+
+class Config:
+    # Database file will be created in the instance directory
+    SQLALCHEMY_DATABASE_URI = os.environ.get('FINANCE_DATABASE_URI', 'sqlite:///finance.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+
+    # Applied to every new SQLite connection (see pragmas.py)
+    SQLITE_PRAGMAS = {
+        'busy_timeout': 5000,
+    }
+
+    # bcrypt work factor for new password hashes; older hashes are upgraded on login
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('FINANCE_BCRYPT_LOG_ROUNDS', 12))
+
+    # Key for signing access tokens; without FINANCE_SECRET_KEY a random one is used,
+    # so tokens stop working when the server restarts
+    SECRET_KEY = os.environ.get('FINANCE_SECRET_KEY') or secrets.token_hex(32)
+    ACCESS_TOKEN_TTL = int(os.environ.get('FINANCE_ACCESS_TOKEN_TTL', 12 * 60 * 60))
+    # How often each process polls for tokens other processes have logged out (see auth.py);
+    # a logged-out token can still pass on another process for up to this long
+    REVOCATION_SYNC_SECONDS = float(os.environ.get('FINANCE_REVOCATION_SYNC_SECONDS', 1))
+
+    # Live update streams (GET /events/<user_id>) open at once per process. Each one holds
+    # a server thread, so keep this well below the thread count; async_app.py allows more
+    EVENT_STREAMS = int(os.environ.get('FINANCE_EVENT_STREAMS', 4))
+
+    # Per-route request, stage and SQL timings served at GET /metrics (see metrics.py);
+    # FINANCE_METRICS=0 turns them off. Statements slower than SLOW_QUERY_MS are logged
+    METRICS_ENABLED = os.environ.get('FINANCE_METRICS', '1') != '0'
+    SLOW_QUERY_MS = int(os.environ.get('FINANCE_SLOW_QUERY_MS', 100))
+
+    # Request profiling (see profiling.py) is on while FINANCE_PROFILING_TOKEN is set. Requests
+    # sending it in X-Profile-Token are profiled, as are PROFILE_SAMPLE_RATE of the requests to
+    # the endpoints in FINANCE_PROFILE_ROUTES (comma-separated, e.g. visualize,login)
+    PROFILING_TOKEN = os.environ.get('FINANCE_PROFILING_TOKEN') or None
+    PROFILE_ROUTES = [name for name in os.environ.get('FINANCE_PROFILE_ROUTES', '').split(',') if name]
+    PROFILE_SAMPLE_RATE = float(os.environ.get('FINANCE_PROFILE_SAMPLE_RATE', 1.0))
+    PROFILE_MODE = os.environ.get('FINANCE_PROFILE_MODE', 'sample')
+
+    # JSON and text responses of at least this many bytes are gzip/brotli-compressed for
+    # clients that accept it (see serialization.py); 0 turns compression off
+    COMPRESS_MIN_BYTES = int(os.environ.get('FINANCE_COMPRESS_MIN_BYTES', 1024))
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+
+
+class ProductionConfig(Config):
+    DEBUG = False
+
+    # One pooled connection per server thread, with headroom for bursts
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('FINANCE_DB_POOL_SIZE', 8)),
+        'max_overflow': 16,
+        'pool_timeout': 10,
+        'pool_recycle': 3600,
+        'connect_args': {'check_same_thread': False},
+    }
+
+    # WAL lets readers carry on while a write transaction is open, and
+    # synchronous=NORMAL is durable across application crashes in WAL mode
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 10000,
+        'cache_size': -64000,       # KiB, i.e. 64 MB of page cache per connection
+        'mmap_size': 268435456,     # 256 MB of the file memory-mapped for reads
+        'temp_store': 'MEMORY',
+    }
+
+
+CONFIGS = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
+
+
+def get_config(name=None):
+    """Return the config class for a name, defaulting to FINANCE_CONFIG"""
+    name = name or os.environ.get('FINANCE_CONFIG', 'development')
+    try:
+        return CONFIGS[name]
+    except KeyError:
+        raise ValueError(f"FINANCE_CONFIG must be one of: {', '.join(CONFIGS)}")
@@ -0,0 +1,151 @@
+"""Live change notifications for open dashboards, as server-sent events.
+
+GET /events/<user_id> keeps the response open and writes one event per
+expense write:
+
+    id: 42
+    event: change
+    data: {"version": 42, "changes": [{"id": 7, "date": "2024-05-01", ..., "seq": 42}]}
+
+`changes` has the same entries as the change feed (see changes.py). Bulk
+inserts and statement imports leave it out; fetch the feed for those. A
+`version` event with just {"version": N} is sent when the stream opens and
+every HEARTBEAT_SECONDS after that. A client whose cached version is behind
+it has missed something and should sync from the feed.
+
+The write routes publish after they commit, through the module's broker.
+Each subscriber has a bounded queue. A subscriber whose queue fills up
+(a client not reading) is disconnected rather than allowed to hold memory
+or slow down the writers. It reconnects, gets the version event and syncs.
+
+The broker is per process. Under several gunicorn workers a dashboard only
+hears about writes handled by its own worker directly. It picks up the rest
+from the heartbeat's version.
+"""
+import asyncio
+import json
+import queue
+import threading
+
+EVENT_QUEUE_SIZE = 64
+HEARTBEAT_SECONDS = 15
+
+
+class TooManySubscribers(Exception):
+    """Raised when the process already streams to its limit of subscribers"""
+
+
+class Subscription:
+    """One open stream: the user it follows and its queue of pending events"""
+
+    __slots__ = ('user_id', 'queue', 'overflowed')
+
+    def __init__(self, user_id, events):
+        self.user_id = user_id
+        self.queue = events
+        self.overflowed = False  # Set when an event didn't fit; the stream should close
+
+    def offer(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except (queue.Full, asyncio.QueueFull):
+            self.overflowed = True
+
+
+class EventBroker:
+    """In-process fan-out of change events to each user's open streams"""
+
+    def __init__(self, queue_size=EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscriptions = {}  # user_id -> set of Subscription
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id, limit, queue_factory=queue.Queue):
+        """Register a stream; queue_factory is queue.Queue for threads, asyncio.Queue on an event loop"""
+        with self._lock:
+            if self._count() >= limit:
+                raise TooManySubscribers()
+            subscription = Subscription(user_id, queue_factory(self.queue_size))
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id, event):
+        """Queue event for every stream of user_id without blocking; returns how many got it"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.offer(event)
+        return len(subscriptions)
+
+    def subscriber_count(self):
+        with self._lock:
+            return self._count()
+
+    def _count(self):
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+# The instance the routes share
+broker = EventBroker()
+
+
+def change_event(version, changes=None):
+    """Event for a committed write; changes is a list of change feed entries, if known"""
+    event = {"event": "change", "version": version}
+    if changes is not None:
+        event["changes"] = changes
+    return event
+
+
+def version_event(version):
+    return {"event": "version", "version": version}
+
+
+def format_event(event):
+    """One event in text/event-stream framing"""
+    data = {key: value for key, value in event.items() if key != "event"}
+    return f"id: {event['version']}\nevent: {event['event']}\ndata: {json.dumps(data)}\n\n"
+
+
+def iter_events(subscription, version, read_version, heartbeat=HEARTBEAT_SECONDS):
+    """Yield a thread-served stream's text: the version, then events as published
+
+    read_version() returns the user's current version for the heartbeat, or
+    None to end the stream (e.g. the token was revoked).
+    """
+    yield format_event(version_event(version))
+    while not subscription.overflowed:
+        try:
+            event = subscription.queue.get(timeout=heartbeat)
+        except queue.Empty:
+            version = read_version()
+            if version is None:
+                return
+            event = version_event(version)
+        yield format_event(event)
+
+
+async def aiter_events(subscription, version, read_version, heartbeat=HEARTBEAT_SECONDS):
+    """iter_events() for an asyncio.Queue subscription; read_version is a coroutine function"""
+    yield format_event(version_event(version))
+    while not subscription.overflowed:
+        try:
+            event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+        except asyncio.TimeoutError:
+            version = await read_version()
+            if version is None:
+                return
+            event = version_event(version)
+        yield format_event(event)
+
+
+# Sent with every stream: no proxy buffering or caching, as the events must arrive as they happen
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
@@ -0,0 +1,344 @@
+"""Streaming import of bank statements (CSV or OFX) into the expense table.
+
+Statements are read row by row from a file-like object and written in
+batches, so memory stays flat however large the file is. Every imported row
+carries an import_hash; rows whose hash the user already has (looked up
+through the (user_id, import_hash) index) are skipped, which makes
+re-importing an overlapping statement safe. Repeats of an identical row are
+numbered through OccurrenceCounter, which keeps its counts on disk rather
+than in a dict that would grow with the file.
+
+Usage (from backend/):
+    python importer.py statement.csv --user-id 1 [--format ofx] [--category Other]
+"""
+import argparse
+import csv
+import hashlib
+import io
+import re
+import sqlite3
+import sys
+from contextlib import closing
+from datetime import datetime
+
+from sqlalchemy import bindparam, select
+
+from cache import bump_versions
+from models import db, Expense
+from validation import MAX_CATEGORY_LENGTH, MAX_DESCRIPTION_LENGTH, parse_category
+import rollups
+
+IMPORT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+DEFAULT_CATEGORY = "Other"
+
+# Tried in order when no explicit date format is given
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%m/%d/%Y',
+                '%d %b %Y', '%d-%b-%Y', '%d %B %Y', '%Y%m%d']
+
+# Lower-cased CSV headers recognised for each field
+COLUMN_ALIASES = {
+    'date': ['date', 'transaction date', 'txn date', 'posted date', 'posting date',
+             'value date', 'booking date'],
+    'amount': ['amount', 'debit', 'debit amount', 'withdrawal', 'withdrawal amt.',
+               'withdrawal amount', 'transaction amount', 'value'],
+    'description': ['description', 'narration', 'details', 'memo', 'payee', 'name',
+                    'particulars', 'transaction details'],
+    'category': ['category'],
+    'reference': ['id', 'reference', 'ref', 'ref no', 'reference number', 'transaction id',
+                  'chq./ref.no.', 'cheque no', 'fitid'],
+}
+
+_NON_NUMERIC = re.compile(r'[^0-9.\-]')
+_OFX_FIELD = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+
+class ImportResult:
+    """Counters for one import run; only the first few errors are kept"""
+
+    def __init__(self):
+        self.imported = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.errors = []
+        self.error_count = 0
+
+    def error(self, row, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def to_dict(self):
+        return {
+            "imported": self.imported,
+            "duplicates": self.duplicates,
+            "skipped": self.skipped,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def parse_statement_date(value, date_format=None):
+    value = value.strip()
+    for fmt in ([date_format] if date_format else DATE_FORMATS):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date {value!r}")
+
+
+def parse_statement_amount(value):
+    """Parse '1,234.50', '₹ 99' or '(12.00)' into a float; None if blank"""
+    value = value.strip()
+    if not value:
+        return None
+    negative = value.startswith('(') and value.endswith(')')
+    try:
+        number = float(_NON_NUMERIC.sub('', value))
+    except ValueError:
+        raise ValueError(f"Unrecognised amount {value!r}")
+    return -number if negative else number
+
+
+def map_columns(header, mapping=None):
+    """Return {field: column index} for a CSV header row
+
+    mapping can name the column to use for any field explicitly.
+    """
+    lowered = [name.strip().lower() for name in header]
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        wanted = [mapping[field].strip().lower()] if mapping and field in mapping else aliases
+        for alias in wanted:
+            if alias in lowered:
+                columns[field] = lowered.index(alias)
+                break
+    missing = {'date', 'amount'} - columns.keys()
+    if missing:
+        raise ValueError(f"Statement has no {' or '.join(sorted(missing))} column")
+    return columns
+
+
+def iter_csv_transactions(stream, mapping=None):
+    """Yield (row number, fields dict) from a CSV statement; bad rows yield ValueError"""
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = map_columns(header, mapping)
+    for row_number, row in enumerate(reader, start=1):
+        if not any(cell.strip() for cell in row):
+            continue
+        try:
+            yield row_number, {field: row[index] for field, index in columns.items()}
+        except IndexError:
+            yield row_number, ValueError("Row has fewer columns than the header")
+
+
+def iter_ofx_transactions(stream):
+    """Yield (row number, fields dict) for each <STMTTRN> block of an OFX statement
+
+    Handles both SGML (unclosed tags) and XML OFX without reading the file whole.
+    """
+    block = None
+    row_number = 0
+    for line in stream:
+        upper = line.upper()
+        if '<STMTTRN>' in upper:
+            block = []
+        if block is not None:
+            block.append(line)
+        if '</STMTTRN>' in upper and block is not None:
+            row_number += 1
+            fields = {tag.upper(): value.strip() for tag, value in _OFX_FIELD.findall(''.join(block))}
+            block = None
+            posted = fields.get('DTPOSTED', '')[:8]
+            yield row_number, {
+                'date': f"{posted[:4]}-{posted[4:6]}-{posted[6:8]}",
+                'amount': fields.get('TRNAMT', ''),
+                'description': fields.get('NAME') or fields.get('MEMO', ''),
+                'reference': fields.get('FITID', ''),
+            }
+
+
+def _import_hash(user_id, expense, reference, occurrence):
+    if reference:
+        key = f"{user_id}|ref|{reference}"
+    else:
+        key = (f"{user_id}|{expense['date'].isoformat()}|{expense['amount']:.2f}"
+               f"|{expense['description'] or ''}|{occurrence}")
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class OccurrenceCounter:
+    """Numbers the repeats of each key across a whole statement, in flat memory
+
+    The counts live in a private on-disk SQLite database (deleted on close)
+    with its small default page cache, so a statement with millions of
+    distinct rows doesn't grow the process the way a dict of them would.
+    """
+
+    # Keys per lookup, well under SQLite's bound-parameter limit
+    CHUNK = 500
+
+    def __init__(self):
+        self._db = sqlite3.connect('')
+        self._db.execute("CREATE TABLE occurrence (key TEXT PRIMARY KEY, count INTEGER NOT NULL) WITHOUT ROWID")
+
+    def number(self, keys):
+        """Return the running count of each key in order, carrying on from earlier calls"""
+        distinct = list(dict.fromkeys(keys))
+        counts = {}
+        for i in range(0, len(distinct), self.CHUNK):
+            chunk = distinct[i:i + self.CHUNK]
+            counts.update(self._db.execute(
+                f"SELECT key, count FROM occurrence WHERE key IN ({','.join('?' * len(chunk))})", chunk))
+        numbers = []
+        for key in keys:
+            counts[key] = counts.get(key, 0) + 1
+            numbers.append(counts[key])
+        self._db.executemany("INSERT OR REPLACE INTO occurrence VALUES (?, ?)", counts.items())
+        return numbers
+
+    def close(self):
+        self._db.close()
+
+
+def _hash_batch(user_id, pending, occurrences):
+    """Give each pending (expense, reference) its import_hash and return the expenses
+
+    Identical rows on the same day are told apart by their position among
+    that day's copies. They are counted over the whole file, so an unsorted
+    statement numbers them the same as a sorted one.
+    """
+    keys = [f"{expense['date'].isoformat()}|{expense['amount']!r}|{expense['description'] or ''}"
+            for expense, _ in pending]
+    for (expense, reference), occurrence in zip(pending, occurrences.number(keys)):
+        expense['import_hash'] = _import_hash(user_id, expense, reference, occurrence)
+    return [expense for expense, _ in pending]
+
+
+def existing_hashes_query(user_id):
+    """SELECT the user's import hashes among the 'hashes' parameter"""
+    return (select(Expense.import_hash)
+            .where(Expense.user_id == user_id, Expense.import_hash.in_(bindparam('hashes', expanding=True))))
+
+
+def _write_batch(user_id, batch, result, session):
+    """Insert the rows of a batch whose hashes the user doesn't already have"""
+    hashes = [row['import_hash'] for row in batch]
+    existing = set(session.execute(existing_hashes_query(user_id), {'hashes': hashes}).scalars())
+
+    fresh = []
+    for row in batch:
+        if row['import_hash'] in existing:
+            result.duplicates += 1
+        else:
+            existing.add(row['import_hash'])
+            fresh.append(row)
+    if fresh:
+        # No user row (importing from the command line for a bare id): no version to stamp
+        seq = bump_versions(session, [user_id]).get(user_id, 0)
+        session.execute(Expense.__table__.insert(), [dict(row, updated_seq=seq) for row in fresh])
+        rollups.record_rows(session, ((row['user_id'], row['category'], row['date'], row['amount'])
+                                      for row in fresh))
+    session.commit()
+    result.imported += len(fresh)
+
+
+def import_statement(stream, user_id, fmt='csv', category=DEFAULT_CATEGORY, date_format=None,
+                     debits_negative=False, mapping=None, batch_size=IMPORT_BATCH_SIZE, session=None):
+    """Import a text-mode statement stream for a user, committing every batch
+
+    Amounts are stored as positive spends. Rows with a blank amount (the
+    deposit rows of a debit/credit statement) are skipped; with
+    debits_negative (always on for OFX) only negative amounts are imported.
+    """
+    if fmt == 'ofx':
+        transactions = iter_ofx_transactions(stream)
+        debits_negative = True
+    elif fmt == 'csv':
+        transactions = iter_csv_transactions(stream, mapping)
+    else:
+        raise ValueError("'format' must be csv or ofx")
+
+    category = parse_category(category)
+    session = session or db.session
+    result = ImportResult()
+    batch = []
+    with closing(OccurrenceCounter()) as occurrences:
+        for row_number, fields in transactions:
+            if isinstance(fields, ValueError):
+                result.error(row_number, str(fields))
+                continue
+            try:
+                amount = parse_statement_amount(fields['amount'])
+                if amount is None or amount == 0:
+                    result.skipped += 1
+                    continue
+                if debits_negative and amount > 0:
+                    result.skipped += 1
+                    continue
+                expense = {
+                    'user_id': user_id,
+                    'date': parse_statement_date(fields['date'], date_format),
+                    'category': (fields.get('category') or '').strip()[:MAX_CATEGORY_LENGTH] or category,
+                    'amount': abs(amount),
+                    'description': (fields.get('description') or '').strip()[:MAX_DESCRIPTION_LENGTH] or None,
+                }
+            except ValueError as e:
+                result.error(row_number, str(e))
+                continue
+
+            batch.append((expense, fields.get('reference', '').strip()))
+
+            if len(batch) >= batch_size:
+                _write_batch(user_id, _hash_batch(user_id, batch, occurrences), result, session)
+                batch = []
+        if batch:
+            _write_batch(user_id, _hash_batch(user_id, batch, occurrences), result, session)
+    return result
+
+
+def open_text_stream(binary_stream):
+    """Wrap a binary upload for csv/OFX parsing, tolerating a UTF-8 BOM"""
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', errors='replace', newline='')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a bank statement into the finance database")
+    parser.add_argument('statement', help="path to a .csv or .ofx/.qfx file")
+    parser.add_argument('--user-id', type=int, required=True)
+    parser.add_argument('--format', choices=['csv', 'ofx'],
+                        help="defaults to the file extension (.ofx/.qfx are OFX)")
+    parser.add_argument('--category', default=DEFAULT_CATEGORY,
+                        help="category for rows without one (default: %(default)s)")
+    parser.add_argument('--date-format', help="strptime format, e.g. %%d/%%m/%%Y")
+    parser.add_argument('--debits-negative', action='store_true',
+                        help="signed amount column: import negative amounts only")
+    parser.add_argument('--map', action='append', default=[], metavar='FIELD=COLUMN',
+                        help="use COLUMN for FIELD (date, amount, description, category, reference)")
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format or ('ofx' if args.statement.lower().endswith(('.ofx', '.qfx')) else 'csv')
+    mapping = dict(item.split('=', 1) for item in args.map)
+
+    from app import app
+    with app.app_context(), open(args.statement, 'rb') as f:
+        try:
+            result = import_statement(open_text_stream(f), args.user_id, fmt, args.category,
+                                      args.date_format, args.debits_negative, mapping, args.batch_size)
+        except ValueError as e:
+            sys.exit(str(e))
+
+    summary = result.to_dict()
+    print(f"Imported {summary['imported']}, duplicates {summary['duplicates']}, "
+          f"skipped {summary['skipped']}, errors {summary['error_count']}")
+    for error in summary['errors']:
+        print(f"  row {error['row']}: {error['error']}")
+
+
+if __name__ == '__main__':
+    main()
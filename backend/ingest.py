@@ -0,0 +1,181 @@
+"""Batched expense ingestion for POST /expenses/bulk.
+
+Rows are validated a chunk at a time with vectorised pandas checks and the
+valid ones are written with a single Core executemany per chunk, all inside
+one transaction. Invalid rows are reported back by position instead of
+failing the whole request.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from cache import bump_versions
+from models import db, Expense
+from validation import MAX_CATEGORY_LENGTH, MAX_DESCRIPTION_LENGTH
+import rollups
+
+BULK_BATCH_SIZE = 5000
+FIELDS = ['user_id', 'date', 'category', 'amount', 'description']
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonlines')
+
+
+def iter_lines(stream, block_size=64 * 1024):
+    """Yield lines from a binary stream, reading it in large blocks"""
+    pending = b''
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        lines = (pending + block).split(b'\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def iter_bulk_records(req):
+    """Yield (row number, record) pairs from a JSON array or NDJSON request body
+
+    Lines of an NDJSON body that are not valid JSON are yielded as ValueError
+    instances so they can be reported as row errors.
+    """
+    if req.mimetype in NDJSON_TYPES:
+        return iter_ndjson_records(iter_lines(req.stream))
+    return _enumerate_array(req.get_json(silent=True))
+
+
+def iter_body_records(mimetype, body):
+    """iter_bulk_records() for a request body that has already been read into bytes"""
+    if mimetype in NDJSON_TYPES:
+        return iter_ndjson_records(body.split(b'\n'))
+    try:
+        data = json.loads(body) if mimetype == 'application/json' else None
+    except ValueError:
+        data = None
+    return _enumerate_array(data)
+
+
+def iter_ndjson_records(lines):
+    row = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield row, json.loads(line)
+        except ValueError:
+            yield row, ValueError("Invalid JSON")
+        row += 1
+
+
+def _enumerate_array(data):
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of expenses or an NDJSON body")
+    return enumerate(data)
+
+
+def validate_rows(rows, records, user_id=None):
+    """Split one chunk into (valid DataFrame, errors)
+
+    rows holds the payload position of each record; errors is a list of
+    {"row": n, "error": message} dicts. If user_id is given, rows without a
+    user_id are that user's, as in POST /expenses, and rows for any other
+    user are rejected.
+    """
+    errors = []
+    keep = [isinstance(record, dict) for record in records]
+    for row, record, ok in zip(rows, records, keep):
+        if not ok:
+            message = str(record) if isinstance(record, ValueError) else "Expense must be a JSON object"
+            errors.append({"row": row, "error": message})
+
+    records = [record for record, ok in zip(records, keep) if ok]
+    if user_id is not None:
+        records = [record if 'user_id' in record else dict(record, user_id=user_id) for record in records]
+    df = pd.DataFrame.from_records(records, columns=FIELDS)
+    df.index = [row for row, ok in zip(rows, keep) if ok]
+    if df.empty:
+        return df, errors
+
+    user_ids = pd.to_numeric(df['user_id'], errors='coerce')
+    # to_numeric reads true/false as 1/0; parse_amount refuses booleans, so do the same
+    amounts = pd.to_numeric(df['amount'].where(~df['amount'].map(lambda v: isinstance(v, bool))), errors='coerce')
+    dates = pd.to_datetime(df['date'], format='%Y-%m-%d', errors='coerce')
+    # object dtype keeps .str usable when no row has a string category
+    categories = df['category'].where(df['category'].map(lambda v: isinstance(v, str))).astype(object)
+    categories = categories.str.strip()
+    descriptions = df['description'].astype(object).where(df['description'].notna(), None)
+    description_strings = descriptions.map(lambda v: isinstance(v, str))
+
+    # Same required-field rule as POST /expenses: missing, empty or zero values are rejected
+    missing = (df['user_id'].isna() | df['date'].isna() | categories.isna()
+               | (categories == '') | df['amount'].isna() | (amounts == 0))
+    checks = [
+        (missing, "Missing required fields"),
+        (user_ids.isna() | (user_ids % 1 != 0), "'user_id' must be an integer"),
+        (amounts.isna(), "'amount' must be a number"),
+        (~np.isfinite(amounts), "'amount' must be a finite number"),
+        (dates.isna(), "'date' must be a date in YYYY-MM-DD format"),
+        (categories.str.len() > MAX_CATEGORY_LENGTH, f"'category' must be at most {MAX_CATEGORY_LENGTH} characters"),
+        (descriptions.notna() & ~description_strings, "'description' must be a string"),
+        (descriptions.where(description_strings).str.len() > MAX_DESCRIPTION_LENGTH,
+         f"'description' must be at most {MAX_DESCRIPTION_LENGTH} characters"),
+    ]
+    if user_id is not None:
+        checks.append((user_ids != user_id, "'user_id' does not match the signed-in user"))
+
+    invalid = pd.Series('', index=df.index)
+    for mask, message in checks:
+        invalid = invalid.mask((invalid == '') & mask.fillna(True), message)
+    bad = invalid != ''
+    errors.extend({"row": int(row), "error": message} for row, message in invalid[bad].items())
+    errors.sort(key=lambda error: error["row"])
+
+    valid = pd.DataFrame({
+        'user_id': user_ids[~bad].astype('int64'),
+        'date': dates[~bad].dt.date,
+        'category': categories[~bad],
+        'amount': amounts[~bad].astype('float64'),
+        'description': descriptions[~bad],
+    })
+    return valid, errors
+
+
+def insert_expenses(valid, session=None):
+    """executemany one validated chunk into the expense table, returning the row count"""
+    if valid.empty:
+        return 0
+    session = session or db.session
+    versions = bump_versions(session, valid['user_id'].unique().tolist())
+    # Ids without a user row have no version to stamp
+    seqs = valid['user_id'].map(versions).fillna(0).astype('int64')
+    session.execute(Expense.__table__.insert(), valid.assign(updated_seq=seqs).to_dict('records'))
+    rollups.record_rows(session, valid[['user_id', 'category', 'date', 'amount']].itertuples(index=False))
+    return len(valid)
+
+
+def validate_chunks(records, batch_size=BULK_BATCH_SIZE, user_id=None):
+    """Yield (valid DataFrame, errors) for each chunk of (row number, record) pairs"""
+    rows, chunk = [], []
+    for row, record in records:
+        rows.append(row)
+        chunk.append(record)
+        if len(chunk) >= batch_size:
+            yield validate_rows(rows, chunk, user_id)
+            rows, chunk = [], []
+    if chunk:
+        yield validate_rows(rows, chunk, user_id)
+
+
+def ingest(records, batch_size=BULK_BATCH_SIZE, user_id=None):
+    """Validate and insert (row number, record) pairs in chunks
+
+    Everything is written in the caller's transaction; returns (inserted, errors).
+    """
+    inserted = 0
+    errors = []
+    for valid, chunk_errors in validate_chunks(records, batch_size, user_id):
+        errors.extend(chunk_errors)
+        inserted += insert_expenses(valid)
+    return inserted, errors
@@ -0,0 +1,154 @@
+"""Schema upgrades for existing finance databases.
+
+create_all() only creates missing tables, so databases created by older
+versions of the app are brought up to date here. Each step is idempotent and
+the applied level is tracked in SQLite's PRAGMA user_version.
+
+Usage (from backend/):
+    python migrate.py [path/to/finance.db]
+"""
+import argparse
+import os
+import sys
+
+from sqlalchemy import create_engine, inspect, text
+
+from models import db, Expense, RevokedToken, User
+import rollups
+
+
+def _typed_expense_date(conn):
+    """Rebuild the expense table so `date` is a DATE column"""
+    columns = {column['name']: column for column in inspect(conn).get_columns('expense')}
+    if str(columns['date']['type']).upper() == 'DATE':
+        return
+
+    bad_rows = conn.execute(text(
+        "SELECT id, date FROM expense WHERE date(date) IS NULL OR date(date) != date"
+    )).all()
+    if bad_rows:
+        sample = ', '.join(f"{row.id}={row.date!r}" for row in bad_rows[:10])
+        raise RuntimeError(f"Cannot convert expense dates to YYYY-MM-DD: {sample}")
+
+    conn.execute(text("ALTER TABLE expense RENAME TO expense_old"))
+    Expense.__table__.create(conn)
+    conn.execute(text(
+        "INSERT INTO expense (id, user_id, date, category, amount, description) "
+        "SELECT id, user_id, date, category, amount, description FROM expense_old"
+    ))
+    conn.execute(text("DROP TABLE expense_old"))
+
+
+def _add_column(conn, column):
+    """ALTER TABLE ADD COLUMN for a model column missing from an existing table"""
+    table = column.table.name
+    existing = {c['name'] for c in inspect(conn).get_columns(table)}
+    if column.name in existing:
+        return
+    column_type = column.type.compile(conn.dialect)
+    # SQLite can only add a NOT NULL column if it has a default for existing rows
+    if column.server_default is not None:
+        column_type += f" NOT NULL DEFAULT {column.server_default.arg}"
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column.name} {column_type}"))
+
+
+def _expense_indexes(conn):
+    """Create the composite indexes on existing expense tables
+
+    Indexes on columns a later step adds are left to that step.
+    """
+    existing = {column['name'] for column in inspect(conn).get_columns('expense')}
+    for index in Expense.__table__.indexes:
+        if all(column.name in existing for column in index.columns):
+            index.create(conn, checkfirst=True)
+
+
+def _expense_import_hash(conn):
+    """Add the importer's dedupe hash and its index"""
+    _add_column(conn, Expense.__table__.c.import_hash)
+    _expense_indexes(conn)
+
+
+def _backfill_rollups(conn):
+    """Populate expense_rollup for expenses written before rollups existed"""
+    rollups.rebuild(conn)
+
+
+def _user_data_version(conn):
+    """Add the per-user version counter behind the read caches"""
+    _add_column(conn, User.__table__.c.data_version)
+
+
+def _expense_change_log(conn):
+    """Add the change feed's per-row sequence and its index (tombstones come from create_all)"""
+    _add_column(conn, Expense.__table__.c.updated_seq)
+    _expense_indexes(conn)
+    # since=0 means "send everything", so a user who has expenses must not still be at version 0
+    conn.execute(text(
+        "UPDATE user SET data_version = 1 "
+        "WHERE data_version = 0 AND EXISTS (SELECT 1 FROM expense WHERE expense.user_id = user.id)"
+    ))
+
+
+def _revoked_token_seq(conn):
+    """Rebuild revoked_token with the seq column processes poll it by"""
+    if 'seq' in {column['name'] for column in inspect(conn).get_columns('revoked_token')}:
+        return
+    conn.execute(text("ALTER TABLE revoked_token RENAME TO revoked_token_old"))
+    RevokedToken.__table__.create(conn)
+    conn.execute(text("INSERT INTO revoked_token (token_id, expires) SELECT token_id, expires FROM revoked_token_old"))
+    conn.execute(text("DROP TABLE revoked_token_old"))
+
+
+# Ordered upgrade steps; PRAGMA user_version records how many have run
+MIGRATIONS = [
+    _typed_expense_date,
+    _expense_indexes,
+    _expense_import_hash,
+    _backfill_rollups,
+    _user_data_version,
+    _expense_change_log,
+    _revoked_token_seq,
+]
+
+
+def upgrade(engine):
+    """Create missing tables and apply pending migrations in one transaction
+
+    Returns the number of migration steps run.
+    """
+    with engine.connect() as conn:
+        # pysqlite doesn't open a transaction before DDL, so begin one explicitly
+        # to make a failed step roll back the table rebuilds before it
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            db.metadata.create_all(conn)
+            version = conn.execute(text("PRAGMA user_version")).scalar()
+            pending = MIGRATIONS[version:]
+            for step in pending:
+                step(conn)
+            if pending:
+                conn.execute(text(f"PRAGMA user_version = {len(MIGRATIONS)}"))
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+    return len(pending)
+
+
+def main():
+    default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'finance.db')
+    parser = argparse.ArgumentParser(description="Upgrade a finance database to the current schema")
+    parser.add_argument('database', nargs='?', default=default_path)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.database):
+        sys.exit(f"No database at {args.database}")
+
+    engine = create_engine(f"sqlite:///{args.database}")
+    steps = upgrade(engine)
+    print(f"{args.database}: applied {steps} migration(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+from flask_sqlalchemy import SQLAlchemy
+
+from passwords import hasher
+
+# Database extension, bound to the app in app.py
+db = SQLAlchemy()
+
+# Define the User model
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(50), unique=True, nullable=False)
+    password = db.Column(db.String(128), nullable=False)  # Increased size for hashed passwords
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Bumped on every expense write, drives ETags (see cache.py)
+
+    # Method to set password securely (hashed on the password worker pool)
+    def set_password(self, password):
+        self.password = hasher.hash(password)
+
+    # Method to check password validity
+    def check_password(self, password):
+        return hasher.check(password, self.password)
+
+    # True if the stored hash predates the current BCRYPT_LOG_ROUNDS
+    def password_needs_rehash(self):
+        return hasher.needs_rehash(self.password)
+
+# Define the Expense model
+class Expense(db.Model):
+    # Hot read paths filter by user and then by date range or category
+    __table_args__ = (
+        db.Index('ix_expense_user_date', 'user_id', 'date'),
+        db.Index('ix_expense_user_category', 'user_id', 'category'),
+        db.Index('ix_expense_user_import_hash', 'user_id', 'import_hash'),
+        db.Index('ix_expense_user_seq', 'user_id', 'updated_seq', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)  # Stored by SQLite as YYYY-MM-DD text
+    category = db.Column(db.String(50), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    description = db.Column(db.String(200))
+    import_hash = db.Column(db.String(40))  # Set by the statement importer to skip re-imported rows
+    updated_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # User's data_version at the last insert/update, for the change feed (see changes.py)
+
+# Deleted expenses, so the change feed can report deletions
+class ExpenseTombstone(db.Model):
+    __tablename__ = 'expense_tombstone'
+
+    user_id = db.Column(db.Integer, primary_key=True)
+    seq = db.Column(db.Integer, primary_key=True)  # User's data_version of the delete
+    expense_id = db.Column(db.Integer, primary_key=True)
+
+# Logged-out access tokens, shared by every server process (see auth.py)
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_token'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    seq = db.Column(db.Integer, primary_key=True)  # Never reused, so processes poll for rows past the last they saw
+    token_id = db.Column(db.String(16), nullable=False, unique=True)
+    expires = db.Column(db.Integer, nullable=False)  # The token's own expiry; the row is useless after it
+
+# Running totals per user, category and period, kept in step with the expense
+# table by the write routes (see rollups.py)
+class ExpenseRollup(db.Model):
+    __tablename__ = 'expense_rollup'
+
+    user_id = db.Column(db.Integer, primary_key=True)
+    period_type = db.Column(db.String(5), primary_key=True)  # 'all', 'month' or 'day'
+    period = db.Column(db.String(10), primary_key=True)  # '' for 'all', YYYY-MM or YYYY-MM-DD
+    category = db.Column(db.String(50), primary_key=True)
+    total = db.Column(db.Float, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
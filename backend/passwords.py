@@ -0,0 +1,151 @@
+"""bcrypt hashing on a bounded pool of worker processes.
+
+Hashing a password costs hundreds of milliseconds of CPU. Running it inline
+pins a request worker for that long and, under a burst of logins, starves
+every other request of CPU. Here hashes are computed in a small process pool
+whose workers run at a lower scheduling priority, and a cap on in-flight
+jobs makes /register and /login answer 503 instead of queueing without bound.
+
+The server entry points (serve.py, and the __main__ blocks of app.py and
+async_app.py) call start() before the server starts any threads, and every
+worker is forked then. Forking later, from a request thread, could copy a
+lock another thread holds into the child, which would then deadlock on it.
+Importing the apps forks nothing, so CLI tools, tests and benchmarks that
+never hash a password never pay for the pool; those that do fork it on the
+first hash.
+
+Config (read in init_app):
+    BCRYPT_LOG_ROUNDS       work factor for new hashes (default 12)
+    PASSWORD_POOL_WORKERS   worker processes (default: CPU count)
+    PASSWORD_MAX_PENDING    running + queued jobs before PasswordPoolBusy (default: 4 per worker)
+    PASSWORD_WORKER_NICE    niceness added to the workers (default 10)
+"""
+import asyncio
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+DEFAULT_LOG_ROUNDS = 12
+DEFAULT_WORKER_NICE = 10
+JOB_TIMEOUT_SECONDS = 30
+
+_COST = re.compile(r'^\$2[abxy]?\$(\d\d)\$')
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when too many hash jobs are already running or queued"""
+
+
+def _watch_parent(parent_pid):
+    # Forked workers inherit the server's listening sockets, so they must not
+    # outlive it if it is killed without shutting the pool down
+    while os.getppid() == parent_pid:
+        time.sleep(1)
+    os._exit(0)
+
+
+def _init_worker(niceness):
+    if niceness and hasattr(os, 'nice'):
+        os.nice(niceness)
+    threading.Thread(target=_watch_parent, args=(os.getppid(),), daemon=True).start()
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def hash_cost(hashed):
+    """Return the work factor encoded in a bcrypt hash, or None if it isn't one"""
+    match = _COST.match(hashed or '')
+    return int(match.group(1)) if match else None
+
+
+class PasswordHasher:
+    """Submit bcrypt work to a process pool, refusing work beyond max_pending"""
+
+    def __init__(self):
+        self.log_rounds = DEFAULT_LOG_ROUNDS
+        self.workers = os.cpu_count() or 1
+        self.max_pending = 4 * self.workers
+        self.niceness = DEFAULT_WORKER_NICE
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def init_app(self, app):
+        self.log_rounds = app.config.setdefault('BCRYPT_LOG_ROUNDS', DEFAULT_LOG_ROUNDS)
+        self.workers = app.config.setdefault('PASSWORD_POOL_WORKERS', os.cpu_count() or 1)
+        self.max_pending = app.config.setdefault('PASSWORD_MAX_PENDING', 4 * self.workers)
+        self.niceness = app.config.setdefault('PASSWORD_WORKER_NICE', DEFAULT_WORKER_NICE)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def start(self):
+        """Start the worker processes; call before the server starts any threads"""
+        self._executor()
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # Forked workers only ever run bcrypt, and fork avoids re-importing the app in each one
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=context,
+                                                 initializer=_init_worker, initargs=(self.niceness,))
+                # A fork-based pool starts all its workers on the first job, so fork them now
+                self._pool.submit(int).result()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolBusy("Too many password operations in progress")
+        try:
+            return self._executor().submit(fn, *args).result(timeout=JOB_TIMEOUT_SECONDS)
+        finally:
+            self._slots.release()
+
+    async def _run_async(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolBusy("Too many password operations in progress")
+        try:
+            future = asyncio.wrap_future(self._executor().submit(fn, *args))
+            return await asyncio.wait_for(future, JOB_TIMEOUT_SECONDS)
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Hash a password at the configured work factor"""
+        return self._run(_hash, password, self.log_rounds)
+
+    def check(self, password, hashed):
+        """Verify a password against a stored hash"""
+        return self._run(_check, password, hashed)
+
+    async def hash_async(self, password):
+        """hash() for event-loop code: awaits the pool without blocking a thread"""
+        return await self._run_async(_hash, password, self.log_rounds)
+
+    async def check_async(self, password, hashed):
+        """check() for event-loop code"""
+        return await self._run_async(_check, password, hashed)
+
+    def needs_rehash(self, hashed):
+        """True if a stored hash was made with a different work factor than configured"""
+        return hash_cost(hashed) != self.log_rounds
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+hasher = PasswordHasher()
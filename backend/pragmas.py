@@ -0,0 +1,28 @@
+"""Per-connection SQLite settings.
+
+Most pragmas (synchronous, busy_timeout, cache_size, mmap_size, ...) only
+last for the connection that sets them, so they are applied from a connect
+event on the engine rather than once at startup.
+"""
+from sqlalchemy import event
+
+
+def apply_pragmas(engine, pragmas):
+    """Run PRAGMA name = value for each item on every new connection of a SQLite engine"""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+    statements = [f"PRAGMA {name} = {value}" for name, value in pragmas.items()]
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+def current_pragmas(connection, names):
+    """Read back pragma values from a SQLAlchemy connection, e.g. for a health check"""
+    return {name: connection.exec_driver_sql(f"PRAGMA {name}").scalar() for name in names}
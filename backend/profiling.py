@@ -0,0 +1,298 @@
+"""Opt-in request profiling for app.py, readable as flamegraph input.
+
+Setting FINANCE_PROFILING_TOKEN turns profiling on. A request is profiled when
+
+- it carries `X-Profile-Token: <token>` (with `X-Profile-Mode: sample` or
+  `cprofile` to override the default mode), or
+- its endpoint is in PROFILE_ROUTES (e.g. visualize,login) and it wins a
+  PROFILE_SAMPLE_RATE draw.
+
+Profiled responses carry X-Profile-Id. The last PROFILE_HISTORY profiles
+are kept in memory and served, with the same token, from:
+
+    GET /admin/profiles                         summaries, newest first
+    GET /admin/profiles/<id>                    collapsed stacks ('a;b;c 1234' lines)
+    GET /admin/profiles/<id>?format=pstats      cProfile's table (cprofile mode only)
+    GET /admin/profiles/collapsed?endpoint=...  all kept profiles merged
+    GET|PUT /admin/profiles/settings            routes, sample_rate and mode, live
+
+Collapsed stacks are weighted in microseconds and load straight into
+flamegraph.pl, speedscope or inferno.
+
+Modes:
+    sample    A background thread records the request thread's stack every
+              PROFILE_INTERVAL_MS. The request itself runs at full speed.
+    cprofile  Every call is traced, which slows the request down several
+              times. The stacks are rebuilt from cProfile's caller/callee
+              totals, so they are approximate where a function is reached
+              by several paths. One cProfile runs at a time per process;
+              requests that arrive meanwhile are sampled instead.
+
+Settings are per process. The async app isn't covered: on one event loop
+a profile would mix in every other request in flight.
+"""
+import cProfile
+import functools
+import hmac
+import io
+import itertools
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from flask import jsonify, request
+
+PROFILE_MODES = ('sample', 'cprofile')
+PROFILE_HISTORY = 20
+PROFILE_INTERVAL_MS = 5
+
+# Paths through the cProfile call graph worth less than this are dropped
+MIN_CPROFILE_US = 10
+
+
+def _label(filename, lineno, name):
+    if filename == '~':
+        return name  # A builtin, e.g. "<method 'execute' of 'sqlite3.Cursor' objects>"
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+def format_collapsed(stacks):
+    """'frame;frame;frame weight' lines, heaviest first"""
+    return ''.join(f"{stack} {weight}\n" for stack, weight in stacks.most_common() if weight > 0)
+
+
+def cprofile_stacks(stats, min_us=MIN_CPROFILE_US):
+    """Approximate collapsed stacks (microseconds) from a cProfile stats dict
+
+    Each function's time is split between its callers in proportion to the
+    time cProfile saw each caller spend in it.
+    """
+    callees = defaultdict(list)
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees[caller].append((func, edge[3]))
+    stacks = Counter()
+
+    def walk(func, share, path, seen):
+        _, _, own, total, _ = stats[func]
+        path = path + (_label(*func),)
+        stacks[';'.join(path)] += round(own * share * 1e6)
+        for callee, edge_total in callees[func]:
+            if callee in seen or edge_total * share * 1e6 < min_us:
+                continue  # Recursion, or too little time to show up on a graph
+            walk(callee, share * edge_total / (stats[callee][3] or 1), path, seen | {callee})
+
+    for func, entry in stats.items():
+        if not entry[4]:
+            walk(func, 1.0, (), frozenset([func]))
+    return stacks
+
+
+class Profile:
+    """One profiled request"""
+
+    def __init__(self, profile_id, mode, endpoint, method, path):
+        self.id = profile_id
+        self.mode = mode
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.status = None
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.samples = 0
+        self.last_sample = self.started
+        self.stacks = Counter()
+        self.profiler = None  # cProfile.Profile in cprofile mode
+
+    def collapsed(self):
+        if self.profiler is not None and not self.stacks:
+            self.stacks = cprofile_stacks(self.profiler.stats)
+        return self.stacks
+
+    def pstats_text(self, limit=60):
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "endpoint": self.endpoint,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": round(self.started_at, 3),
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            "samples": self.samples if self.mode == 'sample' else None,
+        }
+
+
+class Profiler:
+    """Starts and stops request profiles and keeps the recent ones"""
+
+    def __init__(self):
+        self.token = None
+        self.routes = set()
+        self.sample_rate = 1.0
+        self.mode = 'sample'
+        self.interval = PROFILE_INTERVAL_MS / 1000
+        self.history = deque(maxlen=PROFILE_HISTORY)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._sampling = {}  # thread ident -> Profile being sampled
+        self._wake = threading.Condition(self._lock)
+        self._sampler = None
+        self._cprofile_busy = threading.Lock()
+        self._labels = {}  # code object -> frame label
+
+    @property
+    def enabled(self):
+        return bool(self.token)
+
+    def init_app(self, app):
+        self.token = app.config.setdefault('PROFILING_TOKEN', None)
+        self.routes = set(app.config.setdefault('PROFILE_ROUTES', []))
+        self.sample_rate = app.config.setdefault('PROFILE_SAMPLE_RATE', 1.0)
+        self.mode = app.config.setdefault('PROFILE_MODE', 'sample')
+        if self.mode not in PROFILE_MODES:
+            raise ValueError(f"PROFILE_MODE must be one of: {', '.join(PROFILE_MODES)}")
+        self.interval = app.config.setdefault('PROFILE_INTERVAL_MS', PROFILE_INTERVAL_MS) / 1000
+        self.history = deque(maxlen=app.config.setdefault('PROFILE_HISTORY', PROFILE_HISTORY))
+
+    def authorized(self, token):
+        return self.enabled and token is not None and hmac.compare_digest(token.encode(), self.token.encode())
+
+    def settings(self):
+        return {"routes": sorted(self.routes), "sample_rate": self.sample_rate, "mode": self.mode}
+
+    def update_settings(self, data):
+        """Apply a partial settings dict; raises ValueError on bad values without changing anything"""
+        if not isinstance(data, dict):
+            raise ValueError("Send a JSON object of settings")
+        routes = data.get('routes', self.routes)
+        sample_rate = data.get('sample_rate', self.sample_rate)
+        mode = data.get('mode', self.mode)
+        if not isinstance(routes, (list, set)) or not all(isinstance(route, str) for route in routes):
+            raise ValueError("'routes' must be a list of endpoint names")
+        if isinstance(sample_rate, bool) or not isinstance(sample_rate, (int, float)) or not 0 <= sample_rate <= 1:
+            raise ValueError("'sample_rate' must be a number from 0 to 1")
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"'mode' must be one of: {', '.join(PROFILE_MODES)}")
+        self.routes, self.sample_rate, self.mode = set(routes), sample_rate, mode
+        return self.settings()
+
+    # Profiling a request
+
+    def start(self, endpoint, method, path, headers):
+        """Start profiling the current request if it asks to be or its endpoint is selected"""
+        if not self.enabled:
+            return None
+        if self.authorized(headers.get('X-Profile-Token')):
+            mode = headers.get('X-Profile-Mode', self.mode)
+            if mode not in PROFILE_MODES:
+                mode = self.mode
+        elif endpoint in self.routes and random.random() < self.sample_rate:
+            mode = self.mode
+        else:
+            return None
+
+        if mode == 'cprofile' and not self._cprofile_busy.acquire(blocking=False):
+            mode = 'sample'
+        profile = Profile(next(self._ids), mode, endpoint, method, path)
+        if mode == 'cprofile':
+            profile.profiler = cProfile.Profile()
+            profile.profiler.enable()
+        else:
+            with self._lock:
+                self._sampling[threading.get_ident()] = profile
+                self._start_sampler()
+                self._wake.notify()
+        return profile
+
+    def finish(self, profile, status):
+        """Stop a profile from start() and add it to the history"""
+        if profile.profiler is not None:
+            profile.profiler.disable()
+            profile.profiler.create_stats()
+            self._cprofile_busy.release()
+        else:
+            with self._lock:
+                self._sampling.pop(threading.get_ident(), None)
+        profile.duration = time.perf_counter() - profile.started
+        profile.status = status
+        with self._lock:
+            self.history.append(profile)
+
+    # Reading profiles
+
+    def profiles(self):
+        with self._lock:
+            return list(reversed(self.history))
+
+    def get(self, profile_id):
+        return next((profile for profile in self.profiles() if profile.id == profile_id), None)
+
+    def merged(self, endpoint=None):
+        """Collapsed stacks of every kept profile (of one endpoint), added together"""
+        stacks = Counter()
+        for profile in self.profiles():
+            if endpoint is None or profile.endpoint == endpoint:
+                stacks.update(profile.collapsed())
+        return stacks
+
+    # Sampling
+
+    def _start_sampler(self):
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample_loop, name='finance-profiler', daemon=True)
+            self._sampler.start()
+
+    def _sample_loop(self):
+        while True:
+            with self._lock:
+                while not self._sampling:
+                    self._wake.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            with self._lock:
+                for ident, profile in self._sampling.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        profile.stacks[self._stack(frame)] += round((now - profile.last_sample) * 1e6)
+                        profile.samples += 1
+                    profile.last_sample = now
+
+    def _stack(self, frame):
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _label(code.co_filename, code.co_firstlineno, code.co_name)
+            labels.append(label)
+            frame = frame.f_back
+        return ';'.join(reversed(labels))
+
+
+profiler = Profiler()
+
+
+def require_profiling_token(view):
+    """Only serve the view to requests carrying the profiling token; 404 while profiling is off"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not profiler.enabled:
+            return jsonify({"error": "Profiling is disabled"}), 404
+        if not profiler.authorized(request.headers.get('X-Profile-Token')):
+            return jsonify({"error": "Forbidden"}), 403
+        return view(*args, **kwargs)
+
+    return wrapper
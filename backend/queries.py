@@ -0,0 +1,146 @@
+"""Filtering and keyset pagination for expense listings.
+
+Expenses are listed newest first, ordered by (date, id) descending, which
+the (user_id, date) index can serve without a sort. Cursors are opaque
+strings encoding the (date, id) of a boundary row:
+
+    before=<cursor>  rows older than the cursor (the next page)
+    after=<cursor>   rows newer than the cursor (the previous page)
+
+Listings select plain columns (EXPENSE_COLUMNS) rather than Expense
+entities, so rows come back as tuples without building ORM objects or
+touching the session's identity map, and dates stay the ISO text SQLite
+stores. expense_row_to_dict() turns a row into its JSON object.
+"""
+import base64
+import binascii
+
+from sqlalchemy import String, select, tuple_, type_coerce
+
+from models import db, Expense
+from validation import parse_date
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+EXPENSE_FIELDS = ('id', 'date', 'category', 'amount', 'description')
+# Dates are read as the stored 'YYYY-MM-DD' text: parsing them into date objects only to
+# format them back for JSON is the slowest part of building a row
+EXPENSE_COLUMNS = (Expense.id, type_coerce(Expense.date, String).label('date'), Expense.category, Expense.amount,
+                   Expense.description)
+
+
+def encode_cursor(expense):
+    """Cursor for an expense or row; its date may be a date or ISO text"""
+    raw = f"{expense.date}:{expense.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, field):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        day, expense_id = raw.split(':')
+        return parse_date(day), int(expense_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f"'{field}' is not a valid cursor")
+
+
+def _parse_amount(args, field):
+    try:
+        return float(args[field])
+    except ValueError:
+        raise ValueError(f"'{field}' must be a number")
+
+
+def expense_filters(args):
+    """Translate category/start/end/min_amount/max_amount args into WHERE clauses"""
+    filters = []
+    categories = args.getlist('category')
+    if categories:
+        filters.append(Expense.category.in_(categories))
+    if args.get('start'):
+        filters.append(Expense.date >= parse_date(args['start'], 'start'))
+    if args.get('end'):
+        filters.append(Expense.date <= parse_date(args['end'], 'end'))
+    if args.get('min_amount'):
+        filters.append(Expense.amount >= _parse_amount(args, 'min_amount'))
+    if args.get('max_amount'):
+        filters.append(Expense.amount <= _parse_amount(args, 'max_amount'))
+    return filters
+
+
+def parse_limit(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("'limit' must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def filtered_expenses(user_id, args):
+    """Rows (EXPENSE_COLUMNS) of a user's expenses matching the filters, newest first"""
+    return db.session.execute(filtered_expenses_statement(user_id, args)).all()
+
+
+def filtered_expenses_statement(user_id, args):
+    """The select() behind filtered_expenses(), for sessions outside Flask"""
+    return (select(*EXPENSE_COLUMNS)
+            .where(Expense.user_id == user_id, *expense_filters(args))
+            .order_by(Expense.date.desc(), Expense.id.desc()))
+
+
+def page_statement(user_id, args):
+    """Return (select, limit) fetching one page plus a row to detect the next page"""
+    if args.get('before') and args.get('after'):
+        raise ValueError("Use either 'before' or 'after', not both")
+    limit = parse_limit(args)
+    key = tuple_(Expense.date, Expense.id)
+    stmt = select(*EXPENSE_COLUMNS).where(Expense.user_id == user_id, *expense_filters(args))
+
+    if args.get('after'):
+        # Walk towards newer rows; page_from_rows flips them back to newest-first order
+        stmt = stmt.where(key > decode_cursor(args['after'], 'after'))
+        return stmt.order_by(Expense.date.asc(), Expense.id.asc()).limit(limit + 1), limit
+
+    if args.get('before'):
+        stmt = stmt.where(key < decode_cursor(args['before'], 'before'))
+    return stmt.order_by(Expense.date.desc(), Expense.id.desc()).limit(limit + 1), limit
+
+
+def page_from_rows(rows, limit, args):
+    """Return (expenses, next_cursor, prev_cursor) from the rows of page_statement()"""
+    if args.get('after'):
+        has_newer = len(rows) > limit
+        page = rows[:limit][::-1]
+        next_cursor = encode_cursor(page[-1]) if page else args['after']
+        prev_cursor = encode_cursor(page[0]) if has_newer else None
+        return page, next_cursor, prev_cursor
+
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(rows) > limit else None
+    prev_cursor = encode_cursor(page[0]) if page and args.get('before') else None
+    return page, next_cursor, prev_cursor
+
+
+def paginate_expenses(user_id, args):
+    """Return (expenses, next_cursor, prev_cursor) for one page of results"""
+    stmt, limit = page_statement(user_id, args)
+    return page_from_rows(db.session.execute(stmt).all(), limit, args)
+
+
+def expense_row_to_dict(row):
+    """Serialize an EXPENSE_COLUMNS row for JSON responses"""
+    return dict(zip(EXPENSE_FIELDS, row))
+
+
+def expense_to_dict(expense):
+    """Serialize an Expense object for JSON responses"""
+    return {
+        "id": expense.id,
+        "date": expense.date.isoformat(),
+        "category": expense.category,
+        "amount": expense.amount,
+        "description": expense.description
+    }
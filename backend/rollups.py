@@ -0,0 +1,166 @@
+"""Incrementally maintained spending rollups.
+
+Every expense contributes to three rows of expense_rollup: the user's
+all-time total for its category, its month and its day. The write routes
+call record()/record_rows() inside the same transaction as the expense
+change, so dashboard reads only ever touch O(categories x periods) rows.
+
+rebuild() recomputes the rollups from the raw expenses and check() diffs the
+stored values against a rebuild, which is also available from the command
+line:
+
+    python rollups.py --check [--user-id 1] [--repair]
+"""
+import argparse
+import math
+import sys
+
+from sqlalchemy import delete, func, literal, select
+from sqlalchemy.dialects.sqlite import insert
+
+from models import Expense, ExpenseRollup
+
+# Tolerance when comparing float totals accumulated in different orders
+TOTAL_REL_TOLERANCE = 1e-9
+TOTAL_ABS_TOLERANCE = 1e-6
+
+_rollup = ExpenseRollup.__table__
+
+
+def _buckets(day):
+    return [('all', ''), ('month', day.strftime('%Y-%m')), ('day', day.isoformat())]
+
+
+def _upsert(executor, deltas):
+    """Add {(user_id, period_type, period, category): [total, count]} onto the stored rows"""
+    if not deltas:
+        return
+    params = [
+        {'user_id': user_id, 'period_type': period_type, 'period': period,
+         'category': category, 'total': total, 'count': count}
+        for (user_id, period_type, period, category), (total, count) in deltas.items()
+    ]
+    stmt = insert(_rollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_rollup.c.user_id, _rollup.c.period_type, _rollup.c.period, _rollup.c.category],
+        set_={'total': _rollup.c.total + stmt.excluded.total,
+              'count': _rollup.c.count + stmt.excluded.count},
+    )
+    executor.execute(stmt, params)
+
+    if any(count < 0 for _, count in deltas.values()):
+        # Buckets emptied by deletes or moves are dropped rather than left at zero
+        user_ids = {key[0] for key in deltas}
+        executor.execute(delete(_rollup).where(_rollup.c.user_id.in_(user_ids), _rollup.c.count <= 0))
+
+
+def _add_deltas(deltas, rows, sign):
+    for user_id, category, day, amount in rows:
+        for period_type, period in _buckets(day):
+            bucket = deltas.setdefault((user_id, period_type, period, category), [0.0, 0])
+            bucket[0] += sign * amount
+            bucket[1] += sign
+
+
+def record_rows(executor, rows, sign=1):
+    """Apply (user_id, category, date, amount) rows; sign=-1 removes them"""
+    deltas = {}
+    _add_deltas(deltas, rows, sign)
+    _upsert(executor, deltas)
+
+
+def record(executor, expense, sign=1):
+    """Apply one Expense (or anything with the same attributes)"""
+    record_rows(executor, [(expense.user_id, expense.category, expense.date, expense.amount)], sign)
+
+
+def record_change(executor, old, new):
+    """Move an updated expense between buckets; old is a (user_id, category, date, amount) tuple"""
+    current = (new.user_id, new.category, new.date, new.amount)
+    if old == current:
+        return
+    deltas = {}
+    _add_deltas(deltas, [old], -1)
+    _add_deltas(deltas, [current], 1)
+    _upsert(executor, deltas)
+
+
+def _expected_queries(user_id=None):
+    """SELECTs producing rollup rows straight from the expense table"""
+    periods = [
+        ('all', literal('')),
+        ('month', func.strftime('%Y-%m', Expense.date)),
+        ('day', func.strftime('%Y-%m-%d', Expense.date)),
+    ]
+    for period_type, period in periods:
+        stmt = select(Expense.user_id, literal(period_type), period, Expense.category,
+                      func.sum(Expense.amount), func.count())
+        if user_id is not None:
+            stmt = stmt.where(Expense.user_id == user_id)
+        yield stmt.group_by(Expense.user_id, period, Expense.category)
+
+
+def rebuild(executor, user_id=None):
+    """Recompute rollups from raw expenses for one user (or everyone)"""
+    stmt = delete(_rollup)
+    if user_id is not None:
+        stmt = stmt.where(_rollup.c.user_id == user_id)
+    executor.execute(stmt)
+    columns = ['user_id', 'period_type', 'period', 'category', 'total', 'count']
+    for query in _expected_queries(user_id):
+        executor.execute(_rollup.insert().from_select(columns, query))
+
+
+def check(executor, user_id=None):
+    """Diff stored rollups against the raw expenses
+
+    Returns a list of (key, expected (total, count), stored (total, count))
+    for every bucket that disagrees; missing buckets show as None.
+    """
+    expected = {}
+    for query in _expected_queries(user_id):
+        for row in executor.execute(query):
+            expected[tuple(row[:4])] = (row[4], row[5])
+
+    stmt = select(_rollup)
+    if user_id is not None:
+        stmt = stmt.where(_rollup.c.user_id == user_id)
+    stored = {(row.user_id, row.period_type, row.period, row.category): (row.total, row.count)
+              for row in executor.execute(stmt)}
+
+    mismatches = []
+    for key in sorted(expected.keys() | stored.keys()):
+        want, have = expected.get(key), stored.get(key)
+        if (want is None or have is None or want[1] != have[1]
+                or not math.isclose(want[0], have[0], rel_tol=TOTAL_REL_TOLERANCE, abs_tol=TOTAL_ABS_TOLERANCE)):
+            mismatches.append((key, want, have))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check or rebuild the expense rollup tables")
+    parser.add_argument('--check', action='store_true', help="report buckets that differ from the raw expenses")
+    parser.add_argument('--repair', action='store_true', help="rebuild the rollups from the raw expenses")
+    parser.add_argument('--user-id', type=int)
+    args = parser.parse_args()
+    if not args.check and not args.repair:
+        parser.error("nothing to do: pass --check and/or --repair")
+
+    from app import app
+    from models import db
+    with app.app_context():
+        if args.check:
+            mismatches = check(db.session, args.user_id)
+            for key, want, have in mismatches[:50]:
+                print(f"{key}: expected {want}, stored {have}")
+            print(f"{len(mismatches)} mismatched bucket(s)")
+        if args.repair:
+            rebuild(db.session, args.user_id)
+            db.session.commit()
+            print("Rollups rebuilt")
+        if args.check and mismatches and not args.repair:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
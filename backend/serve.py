@@ -0,0 +1,94 @@
+"""Production launcher for the backend.
+
+Serves the app with the production config on the best server available:
+gunicorn (several worker processes, each with a thread pool), then waitress
+(one process, a thread pool), then Werkzeug's threaded server with the
+debugger off.
+
+Usage (from backend/):
+    python serve.py [--host 127.0.0.1] [--port 5000] [--workers 4] [--threads 8] [--server auto]
+"""
+import argparse
+import os
+import secrets
+import sys
+
+SERVERS = ('auto', 'gunicorn', 'waitress', 'werkzeug')
+
+
+def available(module):
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def load_app():
+    """Import the app and fork its bcrypt workers before the server starts any threads"""
+    from app import app
+    from passwords import hasher
+    hasher.start()
+    return app
+
+
+def serve_gunicorn(host, port, workers, threads):
+    from gunicorn.app.base import BaseApplication
+
+    class FinanceApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{host}:{port}')
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('accesslog', '-')
+
+        def load(self):
+            # Imported in each worker so every process gets its own engine and pool
+            return load_app()
+
+    FinanceApplication().run()
+
+
+def serve_waitress(host, port, threads):
+    from waitress import serve
+    serve(load_app(), host=host, port=port, threads=threads)
+
+
+def serve_werkzeug(host, port):
+    app = load_app()
+    app.run(host=host, port=port, threaded=True, debug=False, use_reloader=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the finance backend with the production config")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help="worker processes (gunicorn only)")
+    parser.add_argument('--threads', type=int, default=8, help="request threads per worker")
+    parser.add_argument('--server', choices=SERVERS, default='auto')
+    args = parser.parse_args()
+
+    os.environ.setdefault('FINANCE_CONFIG', 'production')
+    # Every worker process must sign and check tokens with the same key
+    os.environ.setdefault('FINANCE_SECRET_KEY', secrets.token_hex(32))
+    os.environ.setdefault('FINANCE_DB_POOL_SIZE', str(args.threads))
+
+    server = args.server
+    if server == 'auto':
+        server = next((name for name in ('gunicorn', 'waitress') if available(name)), 'werkzeug')
+    elif server != 'werkzeug' and not available(server):
+        sys.exit(f"{server} is not installed (pip install {server})")
+
+    print(f"Serving on http://{args.host}:{args.port} with {server}")
+    if server == 'gunicorn':
+        serve_gunicorn(args.host, args.port, args.workers, args.threads)
+    elif server == 'waitress':
+        serve_waitress(args.host, args.port, args.threads)
+    else:
+        serve_werkzeug(args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
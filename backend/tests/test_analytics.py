@@ -0,0 +1,55 @@
+"""Time series built from daily rollup rows."""
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import PERIOD_LIMITS, daily_frame, timeseries_payload  # noqa: E402
+
+
+def rows_for(days):
+    """daily_totals_query rows for one 'Food' expense of 10 on each given day"""
+    return [('Food', ','.join(day.isoformat() for day in days), ','.join('10.0' for _ in days))]
+
+
+def test_weeks_are_labelled_by_their_monday():
+    # 2024-01-03 is a Wednesday and 2024-01-08 the next Monday
+    daily = daily_frame(rows_for([date(2024, 1, 3), date(2024, 1, 8)]))
+    payload = timeseries_payload(daily, 'week')
+    assert payload['periods'] == ['2024-01-01', '2024-01-08']
+    assert payload['total']['totals'] == [10.0, 10.0]
+    assert payload['total']['change_pct'] == [None, 0.0]
+
+
+def test_month_rolling_average_covers_the_trailing_days():
+    daily = daily_frame(rows_for([date(2024, 1, 31), date(2024, 2, 1), date(2024, 2, 29)]))
+    payload = timeseries_payload(daily, 'month')
+    assert payload['periods'] == ['2024-01', '2024-02']
+    # Read off on 29 February: all three spends fall within the last 30 days
+    assert payload['categories']['Food']['rolling_30d'] == [10.0, 1.0]
+    assert payload['categories']['Food']['cumulative'] == [10.0, 30.0]
+
+
+def test_frame_spans_only_the_days_with_rows():
+    daily = daily_frame(rows_for([date(2024, 1, 3), date(2024, 1, 5)]))
+    assert list(daily.index.strftime('%Y-%m-%d')) == ['2024-01-03', '2024-01-04', '2024-01-05']
+
+
+@pytest.mark.parametrize('granularity', ['day', 'week', 'month'])
+def test_ranges_over_the_period_limit_are_refused(granularity):
+    # Two rows far apart must not allocate a grid for every day between them
+    with pytest.raises(ValueError, match='at most'):
+        daily_frame(rows_for([date(1, 1, 1), date(9999, 12, 31)]), granularity)
+
+
+def test_daily_series_up_to_the_limit_is_whole():
+    limit = PERIOD_LIMITS['day']
+    days = [date(2020, 1, 1) + timedelta(days=i) for i in range(limit)]
+    payload = timeseries_payload(daily_frame(rows_for(days), 'day'), 'day')
+    assert len(payload['periods']) == limit
+    assert payload['total']['cumulative'][-1] == 10.0 * limit
+    with pytest.raises(ValueError):
+        daily_frame(rows_for(days + [days[-1] + timedelta(days=1)]), 'day')
@@ -0,0 +1,36 @@
+"""Token revocation: the in-process set and the polls that keep it in step."""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth import InvalidToken, RevocationSet, check_token, revoked, sign_token  # noqa: E402
+
+KEY = b'test key'
+
+
+def test_polls_are_due_once_per_interval():
+    revocations = RevocationSet()
+    assert revocations.sync_due(60)
+    assert not revocations.sync_due(60)
+
+
+def test_merge_tracks_the_newest_seq_and_skips_expired_rows():
+    revocations = RevocationSet()
+    now = int(time.time())
+    revocations.merge([(3, 'a', now + 60), (7, 'b', now + 60), (5, 'gone', now - 1)])
+    assert revocations.last_seq == 7
+    assert 'a' in revocations and 'gone' not in revocations
+
+
+def test_token_revoked_in_another_process_is_rejected():
+    token, expires = sign_token(KEY, 1, 60)
+    token_id = token.split('.')[2]
+    check_token(KEY, token)
+    # As a poll of revoked_token would bring in another process's logout
+    revoked.merge([(1, token_id, expires)])
+    with pytest.raises(InvalidToken, match='revoked'):
+        check_token(KEY, token)
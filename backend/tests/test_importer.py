@@ -0,0 +1,53 @@
+"""Statement import: duplicate detection by import_hash.
+
+Run from backend/:
+    python -m pytest tests
+"""
+import io
+import os
+import sys
+from contextlib import closing
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from importer import IMPORT_BATCH_SIZE, OccurrenceCounter, import_statement  # noqa: E402
+from migrate import upgrade  # noqa: E402
+from models import Expense  # noqa: E402
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    upgrade(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def run_import(session, text, batch_size=IMPORT_BATCH_SIZE):
+    return import_statement(io.StringIO(text), 1, session=session, batch_size=batch_size)
+
+
+@pytest.mark.parametrize('batch_size', [1, IMPORT_BATCH_SIZE])
+def test_unsorted_statement_keeps_repeated_rows(session, batch_size):
+    statement = "date,amount,description\n2024-01-01,5,coffee\n2024-01-02,7,lunch\n2024-01-01,5,coffee\n"
+    result = run_import(session, statement, batch_size)
+    assert (result.imported, result.duplicates) == (3, 0)
+    assert len(session.scalars(select(Expense)).all()) == 3
+
+
+def test_reimport_in_another_order_adds_nothing(session):
+    run_import(session, "date,amount,description\n2024-01-01,5,coffee\n2024-01-01,5,coffee\n2024-01-02,7,lunch\n")
+    result = run_import(session, "date,amount,description\n2024-01-01,5,coffee\n2024-01-02,7,lunch\n"
+                                 "2024-01-01,5,coffee\n2024-01-01,5,coffee\n")
+    assert (result.imported, result.duplicates) == (1, 3)
+
+
+def test_occurrences_carry_on_across_batches():
+    with closing(OccurrenceCounter()) as occurrences:
+        assert occurrences.number(['a', 'b', 'a']) == [1, 1, 2]
+        assert occurrences.number(['a', 'c']) == [3, 1]
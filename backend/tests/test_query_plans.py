@@ -0,0 +1,89 @@
+"""Query-plan regression check for the hot read queries.
+
+Each statement comes from the builder its route calls and is run through
+EXPLAIN QUERY PLAN against a scratch database built from the current
+models. It must search its expected index, never SCAN a table, and never
+sort its ORDER BY in a temporary b-tree.
+"""
+import os
+import sys
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+from werkzeug.datastructures import MultiDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregation import rollup_totals_query  # noqa: E402
+from analytics import daily_totals_query  # noqa: E402
+from changes import changes_statements  # noqa: E402
+from importer import existing_hashes_query  # noqa: E402
+from migrate import upgrade  # noqa: E402
+from queries import encode_cursor, filtered_expenses_statement, page_statement  # noqa: E402
+
+CURSOR = encode_cursor(SimpleNamespace(date=date(2024, 6, 1), id=500))
+
+# (name, statement, expected index) for every query that must stay indexed
+HOT_QUERIES = [
+    ('get_expenses',
+     page_statement(1, MultiDict())[0],
+     'ix_expense_user_date'),
+    ('get_expenses_before_cursor',
+     page_statement(1, MultiDict({'before': CURSOR}))[0],
+     'ix_expense_user_date'),
+    ('get_expenses_after_cursor',
+     page_statement(1, MultiDict({'after': CURSOR}))[0],
+     'ix_expense_user_date'),
+    ('get_expenses_by_category',
+     page_statement(1, MultiDict([('category', 'Food'), ('category', 'Bills')]))[0],
+     'ix_expense_user_date'),
+    ('get_expenses_all',
+     filtered_expenses_statement(1, MultiDict({'start': '2024-01-01', 'end': '2024-12-31'})),
+     'ix_expense_user_date'),
+    ('visualize',
+     rollup_totals_query(1),
+     'sqlite_autoindex_expense_rollup_1'),
+    ('visualize_date_range',
+     rollup_totals_query(1, date(2024, 1, 1), date(2024, 12, 31)),
+     'sqlite_autoindex_expense_rollup_1'),
+    ('visualize_by_month',
+     rollup_totals_query(1, granularity='month'),
+     'sqlite_autoindex_expense_rollup_1'),
+    ('timeseries',
+     daily_totals_query(1, date(2024, 1, 1), date(2024, 12, 31)),
+     'sqlite_autoindex_expense_rollup_1'),
+    ('import_dedupe',
+     existing_hashes_query(1).params(hashes=['a', 'b']),
+     'ix_expense_user_import_hash'),
+    ('changes',
+     changes_statements(1, 40, (41, 500), 1000)[0],
+     'ix_expense_user_seq'),
+    ('changes_tombstones',
+     changes_statements(1, 40, (41, 500), 1000)[1],
+     'sqlite_autoindex_expense_tombstone_1'),
+]
+
+
+@pytest.fixture(scope='module')
+def connection():
+    engine = create_engine('sqlite://')
+    upgrade(engine)
+    with engine.connect() as connection:
+        yield connection
+    engine.dispose()
+
+
+def explain(connection, stmt):
+    """Return the EXPLAIN QUERY PLAN detail lines for a statement"""
+    compiled = stmt.compile(connection, compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+
+
+@pytest.mark.parametrize('stmt, index', [query[1:] for query in HOT_QUERIES], ids=[query[0] for query in HOT_QUERIES])
+def test_hot_query_uses_its_index(connection, stmt, index):
+    plan = explain(connection, stmt)
+    assert not [line for line in plan if line.startswith('SCAN')], plan
+    assert any(f'INDEX {index} ' in f'{line} ' for line in plan), plan
+    assert not any('TEMP B-TREE FOR ORDER BY' in line for line in plan), plan
@@ -0,0 +1,62 @@
+"""Amount and category rules, for single writes and bulk rows alike."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import validate_rows  # noqa: E402
+from validation import parse_amount, parse_category, parse_description  # noqa: E402
+
+
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf', '1e400', float('nan'), float('inf')])
+def test_parse_amount_rejects_non_finite(value):
+    with pytest.raises(ValueError, match='finite'):
+        parse_amount(value)
+
+
+@pytest.mark.parametrize('value', [None, '', '   ', ['Food'], 5, 'x' * 51])
+def test_parse_category_rejects(value):
+    with pytest.raises(ValueError):
+        parse_category(value)
+
+
+def test_parse_category_strips():
+    assert parse_category('  Food ') == 'Food'
+    assert parse_category('x' * 50) == 'x' * 50
+
+
+@pytest.mark.parametrize('value', [5, ['note'], 'x' * 201])
+def test_parse_description_rejects(value):
+    with pytest.raises(ValueError):
+        parse_description(value)
+
+
+def test_parse_description_allows_none():
+    assert parse_description(None) is None
+    assert parse_description('lunch') == 'lunch'
+
+
+def test_bulk_rows_follow_the_same_rules():
+    records = [{'user_id': 1, 'date': '2024-01-01', 'category': 'Food', 'amount': amount}
+               for amount in (5, 'inf', 1e400, 'nan', True)]
+    records.append({'user_id': 1, 'date': '2024-01-01', 'category': 'x' * 51, 'amount': 5})
+    records.append({'user_id': 1, 'date': '2024-01-01', 'category': 'Food', 'amount': 5, 'description': 5})
+    records.append({'user_id': 1, 'date': '2024-01-01', 'category': 'Food', 'amount': 5, 'description': 'lunch'})
+    valid, errors = validate_rows(list(range(len(records))), records)
+    assert list(valid.index) == [0, 7]
+    assert [error['row'] for error in errors] == [1, 2, 3, 4, 5, 6]
+    assert errors[3]['error'] == "'amount' must be a number"
+    assert errors[5]['error'] == "'description' must be a string"
+    assert list(valid['description']) == [None, 'lunch']
+
+
+def test_bulk_rows_default_to_the_signed_in_user():
+    records = [{'date': '2024-01-01', 'category': 'Food', 'amount': 5},
+               {'user_id': 2, 'date': '2024-01-01', 'category': 'Food', 'amount': 5},
+               {'user_id': None, 'date': '2024-01-01', 'category': 'Food', 'amount': 5}]
+    valid, errors = validate_rows([0, 1, 2], records, user_id=1)
+    assert list(valid['user_id']) == [1]
+    assert errors == [{'row': 1, 'error': "'user_id' does not match the signed-in user"},
+                      {'row': 2, 'error': 'Missing required fields'}]
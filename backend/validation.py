@@ -0,0 +1,55 @@
+"""Parsing helpers shared by the routes for client-supplied values.
+
+ingest.py checks bulk rows against the same rules, vectorised.
+"""
+import math
+from datetime import date, datetime
+
+# Expense.category is a String(50) and Expense.description a String(200)
+MAX_CATEGORY_LENGTH = 50
+MAX_DESCRIPTION_LENGTH = 200
+
+
+def parse_date(value, field='date'):
+    """Parse a YYYY-MM-DD string into a date, raising ValueError with a client-facing message"""
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f"'{field}' must be a date in YYYY-MM-DD format")
+
+
+def parse_amount(value, field='amount'):
+    """Parse a numeric amount (number or numeric string) into a finite float"""
+    if isinstance(value, bool):
+        raise ValueError(f"'{field}' must be a number")
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{field}' must be a number")
+    # float() takes 'nan', 'inf' and '1e400', none of which can be summed into the rollups
+    if not math.isfinite(amount):
+        raise ValueError(f"'{field}' must be a finite number")
+    return amount
+
+
+def parse_category(value, field='category'):
+    """Strip a category name, which must be a non-empty string of at most MAX_CATEGORY_LENGTH characters"""
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"'{field}' must be a non-empty string")
+    value = value.strip()
+    if len(value) > MAX_CATEGORY_LENGTH:
+        raise ValueError(f"'{field}' must be at most {MAX_CATEGORY_LENGTH} characters")
+    return value
+
+
+def parse_description(value, field='description'):
+    """Check an optional description: None, or a string of at most MAX_DESCRIPTION_LENGTH characters"""
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"'{field}' must be a string")
+    if len(value) > MAX_DESCRIPTION_LENGTH:
+        raise ValueError(f"'{field}' must be at most {MAX_DESCRIPTION_LENGTH} characters")
+    return value
@@ -0,0 +1,128 @@
+"""Insights chart refresh latency: rebuilding the figures vs updating them in place.
+
+For 6 and 60 categories, times one refresh of both charts (until the canvases
+have repainted) in three cases: the same data again, one category's amount
+edited, and every amount changed. "rebuild" is what the dashboard used to do
+on every refresh: clear the figures, re-plot, tight_layout and draw.
+"update" is charts.py. Runs offscreen, no backend needed.
+
+Usage (from frontend/):
+    python benchmarks/bench_charts.py [--categories 6 60] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+FRONTEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if FRONTEND_DIR not in sys.path:
+    sys.path.insert(0, FRONTEND_DIR)
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+from PyQt5.QtWidgets import QApplication
+
+from charts import CARD_BG, COLORS, DARK_BG, BarChart, PieChart
+
+
+def make_canvas():
+    canvas = FigureCanvas(Figure(figsize=(5, 5)))
+    canvas.figure.patch.set_facecolor(CARD_BG)
+    canvas.resize(500, 500)
+    canvas.show()
+    return canvas
+
+
+def rebuild(pie_canvas, bar_canvas, categories, amounts):
+    """The previous refresh: new axes and artists every time, then a full draw"""
+    pie_canvas.figure.clear()
+    ax_pie = pie_canvas.figure.add_subplot(111)
+    wedges, _, autotexts = ax_pie.pie(amounts, autopct='%1.1f%%', startangle=90,
+                                      colors=COLORS[:len(categories)],
+                                      wedgeprops={'width': 0.6, 'edgecolor': DARK_BG, 'linewidth': 1})
+    for autotext in autotexts:
+        autotext.set_fontweight('bold')
+    ax_pie.legend(wedges, categories, title="Categories", loc="center left", bbox_to_anchor=(0.9, 0, 0.5, 1))
+    ax_pie.set_title("Expense Distribution", fontsize=14)
+    pie_canvas.figure.tight_layout()
+    pie_canvas.draw()
+
+    bar_canvas.figure.clear()
+    ax_bar = bar_canvas.figure.add_subplot(111)
+    bars = ax_bar.bar(categories, amounts, color=COLORS[:len(categories)], width=0.6, edgecolor=DARK_BG,
+                      linewidth=1)
+    for bar in bars:
+        height = bar.get_height()
+        ax_bar.text(bar.get_x() + bar.get_width() / 2., height + 5, f'₹{int(height):,}', ha='center',
+                    va='bottom')
+    ax_bar.set_title("Expense by Category", fontsize=14)
+    ax_bar.set_xlabel("Category")
+    ax_bar.set_ylabel("Amount (₹)")
+    ax_bar.grid(axis='y', linestyle='--', alpha=0.3)
+    bar_canvas.figure.tight_layout()
+    bar_canvas.draw()
+
+
+def refresh_ms(app, refresh, datasets):
+    """Median milliseconds from refresh(data) until pending paints have run"""
+    samples = []
+    for categories, amounts in datasets:
+        start = time.perf_counter()
+        refresh(categories, amounts)
+        app.processEvents()  # Runs draw_idle's deferred draw and the repaint
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def scenarios(count, repeat):
+    rng = random.Random(count)
+    categories = [f"Category {i}" for i in range(count)]
+    base = [round(rng.uniform(500, 5000), 2) for _ in categories]
+
+    def edited(i):
+        amounts = list(base)
+        amounts[i % count] += 25 * (i + 1)
+        return categories, amounts
+
+    return {
+        'same data': [(categories, base)] * repeat,
+        'one amount edited': [edited(i) for i in range(repeat)],
+        'all amounts changed': [(categories, [round(rng.uniform(500, 5000), 2) for _ in categories])
+                                for _ in range(repeat)],
+    }, (categories, base)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--categories', type=int, nargs='+', default=[6, 60])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    print(f"{'categories':>10} {'case':>20} {'rebuild ms':>11} {'update ms':>10} {'full draws':>11} {'blits':>6}")
+    for count in args.categories:
+        cases, initial = scenarios(count, args.repeat)
+
+        old_pie, old_bar = make_canvas(), make_canvas()
+        pie, bar = PieChart(make_canvas()), BarChart(make_canvas())
+
+        def update(categories, amounts):
+            pie.update(categories, amounts)
+            bar.update(categories, amounts)
+
+        for name, datasets in cases.items():
+            rebuild(old_pie, old_bar, *initial)
+            update(*initial)
+            app.processEvents()
+            draws, blits = pie.full_draws + bar.full_draws, pie.blits + bar.blits
+            rebuild_ms = refresh_ms(app, lambda c, a: rebuild(old_pie, old_bar, c, a), datasets)
+            update_ms = refresh_ms(app, update, datasets)
+            print(f"{count:>10} {name:>20} {rebuild_ms:>11.1f} {update_ms:>10.1f} "
+                  f"{pie.full_draws + bar.full_draws - draws:>11} {pie.blits + bar.blits - blits:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""Insights tab charts that update in place.
+
+Each chart builds its axes once and keeps its artists (wedges, bars, value
+labels) between refreshes. A refresh with the same categories only moves
+wedge angles and bar heights and rewrites the labels, and a refresh with
+the same data does nothing at all.
+
+The data artists are animated, so a full draw leaves them out. After every
+full draw the rendered background (axes, ticks, legend, title) is saved and
+the data artists are drawn on top. A later update that doesn't change the
+layout restores that background, draws just the data artists and blits.
+Updates that do change the layout (new categories, a new y-axis range)
+re-run tight_layout and ask for a full draw with draw_idle.
+"""
+import math
+
+from matplotlib.patches import Wedge
+
+# Dark green aesthetic color palette
+DARK_BG = "#0F171A"
+PANEL_BG = "#1A2E32"
+CARD_BG = "#243B40"
+LIGHT_TEXT = "#E7F6F2"
+MID_TEXT = "#A5C9CA"
+HIGHLIGHT = "#7FFFD4"
+
+# Chart colors - shades of green and teal, repeated when there are more categories
+COLORS = ['#3EB489', '#2E8B57', '#20B2AA', '#008080', '#5F9EA0', '#40E0D0']
+
+
+class _Chart:
+    """One axes on a canvas, redrawn by blitting unless its layout changed"""
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.figure = canvas.figure
+        self.ax = self.figure.add_subplot(111)
+        self.ax.set_facecolor(CARD_BG)
+        self.categories = []
+        self.artists = []  # Animated data artists, drawn over the saved background
+        self.full_draws = 0
+        self.blits = 0
+        self._data_key = None
+        self._background = None
+        canvas.mpl_connect('draw_event', self._on_draw)
+
+    def update(self, categories, amounts):
+        """Show new data; returns False when it is what's already shown"""
+        key = hash((tuple(categories), tuple(amounts)))
+        if key == self._data_key:
+            return False
+        self._data_key = key
+
+        categories = list(categories)
+        amounts = [float(amount) for amount in amounts]
+        if self._apply(categories, amounts) or self._background is None:
+            self._background = None
+            self.figure.tight_layout()
+            self.canvas.draw_idle()
+        else:
+            self.canvas.restore_region(self._background)
+            self._draw_artists()
+            self.canvas.blit(self.figure.bbox)
+            self.blits += 1
+        return True
+
+    def _apply(self, categories, amounts):
+        """Move the artists to the new data; return True if the layout changed"""
+        raise NotImplementedError
+
+    def _replace_artists(self, artists):
+        for artist in self.artists:
+            artist.remove()
+        for artist in artists:
+            artist.set_animated(True)
+        self.artists = artists
+
+    def _on_draw(self, event):
+        # A full draw skipped the animated artists: keep what's behind them, then draw them
+        self.full_draws += 1
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            self.ax.draw_artist(artist)
+
+
+class PieChart(_Chart):
+    """Donut chart of each category's share, with a legend"""
+
+    def __init__(self, canvas):
+        super().__init__(canvas)
+        self.wedges = []
+        self.percentages = []
+        self.ax.set(aspect='equal', frame_on=False, xticks=[], yticks=[], xlim=(-1.25, 1.25), ylim=(-1.25, 1.25))
+        self.ax.set_title("Expense Distribution", color=HIGHLIGHT, fontsize=14)
+
+    def _apply(self, categories, amounts):
+        changed = categories != self.categories
+        if changed:
+            self.categories = categories
+            self.wedges = [
+                self.ax.add_patch(Wedge((0, 0), 1, 90, 90, width=0.6, facecolor=COLORS[i % len(COLORS)],
+                                        edgecolor=DARK_BG, linewidth=1))
+                for i in range(len(categories))
+            ]
+            self.percentages = [
+                self.ax.text(0, 0, '', ha='center', va='center', color=LIGHT_TEXT, fontweight='bold')
+                for _ in categories
+            ]
+            self._replace_artists(self.wedges + self.percentages)
+            self._update_legend()
+
+        # Counterclockwise from 12 o'clock, like ax.pie(startangle=90)
+        total = sum(amounts)
+        theta = 90.0
+        for wedge, percentage, amount in zip(self.wedges, self.percentages, amounts):
+            share = amount / total if total else 0.0
+            wedge.set_theta1(theta)
+            wedge.set_theta2(theta + 360 * share)
+            middle = math.radians(theta + 180 * share)
+            percentage.set_position((0.6 * math.cos(middle), 0.6 * math.sin(middle)))
+            percentage.set_text(f'{100 * share:.1f}%')
+            theta += 360 * share
+        return changed
+
+    def _update_legend(self):
+        if self.ax.get_legend() is not None:
+            self.ax.get_legend().remove()
+        if not self.categories:
+            return
+        legend = self.ax.legend(self.wedges, self.categories, title="Categories", loc="center left",
+                                bbox_to_anchor=(0.9, 0, 0.5, 1))
+        # The legend copies the wedges' properties, animated included; it belongs to the background
+        for handle in legend.legend_handles:
+            handle.set_animated(False)
+        legend.get_title().set_color(LIGHT_TEXT)
+        for text in legend.get_texts():
+            text.set_color(MID_TEXT)
+
+
+class BarChart(_Chart):
+    """Bar per category with its amount written above it"""
+
+    def __init__(self, canvas):
+        super().__init__(canvas)
+        self.bars = []
+        self.values = []
+        ax = self.ax
+        ax.set_title("Expense by Category", color=HIGHLIGHT, fontsize=14)
+        ax.set_xlabel("Category", color=MID_TEXT)
+        ax.set_ylabel("Amount (₹)", color=MID_TEXT)
+        ax.tick_params(colors=MID_TEXT)
+        ax.grid(axis='y', linestyle='--', alpha=0.3, color=PANEL_BG)
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        ax.spines['bottom'].set_color(PANEL_BG)
+        ax.spines['left'].set_color(PANEL_BG)
+        ax.set_ylim(0, 1)
+
+    def _apply(self, categories, amounts):
+        changed = categories != self.categories
+        if changed:
+            self.categories = categories
+            positions = range(len(categories))
+            self.bars = list(self.ax.bar(positions, [0] * len(categories), width=0.6,
+                                         color=[COLORS[i % len(COLORS)] for i in positions],
+                                         edgecolor=DARK_BG, linewidth=1))
+            self.values = [self.ax.text(i, 0, '', ha='center', va='bottom', color=HIGHLIGHT) for i in positions]
+            self._replace_artists(self.bars + self.values)
+            self.ax.set_xticks(positions, categories)
+            self.ax.set_xlim(-0.5, max(len(categories), 1) - 0.5)
+
+        for bar, value, amount in zip(self.bars, self.values, amounts):
+            bar.set_height(amount)
+            value.set_y(amount + 5)
+            value.set_text(f'₹{int(amount):,}')
+
+        # Keep the y range while the tallest bar still fits comfortably, so small edits can blit
+        tallest = max(amounts, default=0) + 5
+        top = self.ax.get_ylim()[1]
+        if not top / 1.6 <= tallest <= top / 1.05:
+            self.ax.set_ylim(0, max(tallest * 1.2, 1))
+            changed = True
+        return changed
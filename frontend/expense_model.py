@@ -0,0 +1,233 @@
+"""Table model for the expense list.
+
+Expenses are kept column by column in typed arrays (ids, day ordinals,
+amounts, category codes) plus one list of descriptions, instead of a dict or
+a QListWidgetItem per row. Cells are formatted only when the view asks for
+them, which is only for the rows on screen.
+
+Older pages are fetched lazily: when the view scrolls to the bottom, Qt
+calls fetchMore(), which emits fetch_requested with the cursor for the
+dashboard to request. The page arrives through append_page().
+
+Rows with a negative id are expenses still waiting to be uploaded; they are
+drawn in italics.
+
+ExpenseProxyModel sorts by having the source model reorder its arrays with
+one sorted() call, and filters with a precomputed row mask. Qt's own
+QSortFilterProxyModel sort calls back into Python for every comparison and
+takes seconds for 50k rows. Neither sorting nor filtering re-fetches
+anything.
+"""
+from array import array
+from datetime import date
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, QSortFilterProxyModel, Qt, pyqtSignal
+from PyQt5.QtGui import QFont
+
+COLUMNS = ["Date", "Category", "Amount", "Description"]
+DATE, CATEGORY, AMOUNT, DESCRIPTION = range(len(COLUMNS))
+
+
+class ExpenseTableModel(QAbstractTableModel):
+    """Columnar, lazily paged expense rows in the order the backend sent them (or sorted)"""
+
+    # Emitted with the cursor of the next (older) page when the view wants more rows
+    fetch_requested = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.next_cursor = None
+        self.sort_column = -1  # -1 keeps the backend's newest-first order
+        self.sort_order = Qt.AscendingOrder
+        self._fetching = False
+        self._pending_font = QFont()
+        self._pending_font.setItalic(True)
+        self._clear()
+
+    def _clear(self):
+        self.ids = array('q')
+        self.days = array('l')          # date.toordinal()
+        self.amounts = array('d')
+        self.category_codes = array('H')
+        self.descriptions = []
+        self.category_names = []        # code -> name
+        self._category_codes = {}       # name -> code
+
+    # Loading
+
+    def reset(self, expenses, next_cursor):
+        """Replace the rows with a fresh first page"""
+        self.beginResetModel()
+        self._clear()
+        self._extend(expenses)
+        self.next_cursor = next_cursor
+        self._fetching = False
+        self.endResetModel()
+        self._resort()
+
+    def append_page(self, expenses, next_cursor):
+        """Add an older page at the end (re-sorting if a sort is active)"""
+        self._fetching = False
+        self.next_cursor = next_cursor
+        if expenses:
+            first = len(self.ids)
+            self.beginInsertRows(QModelIndex(), first, first + len(expenses) - 1)
+            self._extend(expenses)
+            self.endInsertRows()
+            self._resort()
+
+    def abort_fetch(self):
+        """Forget a requested page that will never arrive, so fetchMore can ask again"""
+        self._fetching = False
+
+    def _extend(self, expenses):
+        codes = self._category_codes
+        for exp in expenses:
+            category = exp["category"]
+            code = codes.get(category)
+            if code is None:
+                code = codes[category] = len(self.category_names)
+                self.category_names.append(category)
+            self.ids.append(exp["id"])
+            self.days.append(date.fromisoformat(exp["date"]).toordinal())
+            self.amounts.append(float(exp["amount"]))
+            self.category_codes.append(code)
+            self.descriptions.append(exp["description"])
+
+    # Lazy paging
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.next_cursor is not None and not self._fetching
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self._fetching = True
+            self.fetch_requested.emit(self.next_cursor)
+
+    # Qt model interface
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.ids)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            return self.display_text(row, column)
+        if role == Qt.TextAlignmentRole and column == AMOUNT:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        if role == Qt.FontRole and self.ids[row] < 0:
+            return self._pending_font
+        if role == Qt.ToolTipRole:
+            if self.ids[row] < 0:
+                return "Waiting to upload"
+            if column == DESCRIPTION:
+                return self.descriptions[row]
+        return None
+
+    def display_text(self, row, column):
+        if column == DATE:
+            return date.fromordinal(self.days[row]).isoformat()
+        if column == CATEGORY:
+            return self.category_names[self.category_codes[row]]
+        if column == AMOUNT:
+            return f"₹{self.amounts[row]:,.2f}"
+        return self.descriptions[row] or ""
+
+    # Sorting and filtering support for ExpenseProxyModel
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column, self.sort_order = column, order
+        self._resort()
+
+    def _sort_key(self, column):
+        if column == DATE:
+            days, ids = self.days, self.ids
+            return lambda row: (days[row], ids[row])
+        if column == CATEGORY:
+            names, codes = self.category_names, self.category_codes
+            return lambda row: names[codes[row]].lower()
+        if column == AMOUNT:
+            return self.amounts.__getitem__
+        descriptions = self.descriptions
+        return lambda row: (descriptions[row] or "").lower()
+
+    def _resort(self):
+        if self.sort_column < 0 or len(self.ids) < 2:
+            return
+        order = sorted(range(len(self.ids)), key=self._sort_key(self.sort_column),
+                       reverse=self.sort_order == Qt.DescendingOrder)
+
+        self.layoutAboutToBeChanged.emit()
+        self.ids = array('q', (self.ids[row] for row in order))
+        self.days = array('l', (self.days[row] for row in order))
+        self.amounts = array('d', (self.amounts[row] for row in order))
+        self.category_codes = array('H', (self.category_codes[row] for row in order))
+        self.descriptions = [self.descriptions[row] for row in order]
+
+        # Keep the selection and current row on the same expenses
+        new_row = [0] * len(order)
+        for new, old in enumerate(order):
+            new_row[old] = new
+        persistent = self.persistentIndexList()
+        self.changePersistentIndexList(persistent, [self.index(new_row[index.row()], index.column())
+                                                    for index in persistent])
+        self.layoutChanged.emit()
+
+    def filter_mask(self, text):
+        """bytearray with 1 for every row whose date, category, amount or description contains text"""
+        needle = text.lower()
+        category_hits = [needle in name.lower() for name in self.category_names]
+        return bytearray(
+            category_hits[code]
+            or needle in (description or "").lower()
+            or needle in f"{amount:,.2f}"
+            or needle in date.fromordinal(day).isoformat()
+            for code, description, amount, day
+            in zip(self.category_codes, self.descriptions, self.amounts, self.days)
+        )
+
+
+class ExpenseProxyModel(QSortFilterProxyModel):
+    """Sort and filter an ExpenseTableModel without per-row Python callbacks from Qt's sort"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._text = ""
+        self._mask = None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Reorder the source instead of letting Qt sort the proxy row by row
+        self.sourceModel().sort(column, order)
+
+    def set_filter_text(self, text):
+        self._text = text.strip()
+        self._refresh_mask()
+        self.invalidate()
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        # Rows arriving or moving make the mask stale; these run after the proxy's own
+        # handlers, so filter again once it is rebuilt
+        for signal in (model.modelReset, model.rowsInserted, model.layoutChanged):
+            signal.connect(self._source_changed)
+
+    def _source_changed(self, *args):
+        if self._text:
+            self._refresh_mask()
+            self.invalidate()
+
+    def _refresh_mask(self):
+        self._mask = self.sourceModel().filter_mask(self._text) if self._text else None
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return self._mask is None or (source_row < len(self._mask) and bool(self._mask[source_row]))
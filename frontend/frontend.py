@@ -1,10 +1,9 @@
 import sys
-import requests
 import matplotlib.pyplot as plt
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QMessageBox, 
-    QLineEdit, QTextEdit, QListWidget, QTabWidget, QHBoxLayout, QGridLayout,
-    QComboBox, QDateEdit, QFrame, QSplitter, QSizePolicy
+    QLineEdit, QTextEdit, QTableView, QHeaderView, QTabWidget, QHBoxLayout, QGridLayout,
+    QComboBox, QDateEdit, QFrame, QSplitter, QSizePolicy, QAbstractItemView
 )
 from PyQt5.QtGui import QFont, QPalette, QColor, QIcon
 from PyQt5.QtCore import Qt, QDate
@@ -12,6 +11,13 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 import matplotlib as mpl
 
+from charts import BarChart, PieChart
+from expense_model import ExpenseTableModel, ExpenseProxyModel
+from live import LiveUpdates
+from local_cache import LocalCache, default_path
+from network import NetworkClient
+from sync import ExpenseSync
+
 # Set matplotlib style for dark theme
 plt.style.use('dark_background')
 mpl.rcParams['axes.edgecolor'] = '#2C3639'
@@ -28,13 +34,24 @@ LIGHT_TEXT = "#E7F6F2"
 MID_TEXT = "#A5C9CA"
 HIGHLIGHT = "#7FFFD4"
 
-# Chart colors - shades of green and teal
-COLORS = ['#3EB489', '#2E8B57', '#20B2AA', '#008080', '#5F9EA0', '#40E0D0']
+# Number of expenses read per page from the local cache as the table scrolls
+EXPENSE_PAGE_SIZE = 200
+# (connect, read) seconds for the logout sent as the dashboard closes
+LOGOUT_TIMEOUT = (1, 2)
 
 class FinanceDashboard(QWidget):
-    def __init__(self, user_id):
+    def __init__(self, user_id, token=None):
         super().__init__()
         self.user_id = user_id
+        self.token = token  # Bearer token from /login, sent with every API call
+        # Requests run in the background and report back through callbacks
+        self.network = NetworkClient(parent=self)
+        self.network.headers.update(self.auth_headers())
+        # Expenses and chart data are kept on disk, so the window fills in before the backend answers
+        self.cache = LocalCache(default_path(self.network.http.base_url))
+        self.expense_sync = ExpenseSync(self.network, self.cache, user_id, parent=self)
+        # Changes made elsewhere (another window, an import) are pushed to us as they happen
+        self.live = LiveUpdates(user_id, self.network.headers, self.network.http.base_url, parent=self)
         self.categories = ["Food", "Transport", "Entertainment", "Bills", "Shopping", "Other"]
         self.initUI()
 
@@ -67,7 +84,7 @@ class FinanceDashboard(QWidget):
                 background-color: {ACCENT_GREEN}; 
                 color: {DARK_BG};
             }}
-            QLineEdit, QTextEdit, QListWidget, QComboBox, QDateEdit {{ 
+            QLineEdit, QTextEdit, QComboBox, QDateEdit {{ 
                 background-color: {PANEL_BG}; 
                 border: 1px solid {CARD_BG}; 
                 border-radius: 4px; 
@@ -94,21 +111,28 @@ class FinanceDashboard(QWidget):
                 color: {HIGHLIGHT}; 
                 border-bottom: 2px solid {ACCENT_GREEN};
             }}
-            QListWidget {{ 
+            QTableView {{ 
                 background-color: {PANEL_BG}; 
                 alternate-background-color: {CARD_BG};
                 border-radius: 4px;
-                padding: 5px;
                 border: 1px solid {CARD_BG};
+                gridline-color: {CARD_BG};
+                color: {LIGHT_TEXT};
             }}
-            QListWidget::item {{ 
-                padding: 10px; 
-                border-bottom: 1px solid {CARD_BG};
+            QTableView::item {{ 
+                padding: 0 8px; 
             }}
-            QListWidget::item:selected {{ 
+            QTableView::item:selected {{ 
                 background-color: {ACCENT_GREEN}; 
                 color: {DARK_BG};
             }}
+            QHeaderView::section {{ 
+                background-color: {CARD_BG}; 
+                color: {MID_TEXT}; 
+                padding: 6px; 
+                border: none;
+                font-weight: bold;
+            }}
             QFrame#card {{
                 background-color: {CARD_BG};
                 border-radius: 8px;
@@ -188,6 +212,17 @@ class FinanceDashboard(QWidget):
         # Connect tab switch event
         self.tabs.currentChanged.connect(self.refreshVisualizationTab)
 
+        # Paint from the local cache straight away, then catch up with the backend
+        self.expense_sync.expenses_changed.connect(self.show_cached_expenses)
+        self.expense_sync.expenses_changed.connect(self.refresh_visible_charts)
+        self.live.event_received.connect(self.expense_sync.apply_event)
+        self.expense_sync.status_changed.connect(self.sync_status.setText)
+        self.expense_sync.rejected.connect(self.on_expense_rejected)
+        self.show_cached_expenses()
+        self.show_cached_charts()
+        self.view_expenses()
+        self.live.start()
+
     def initExpenseTab(self):
         """Setup the Expenses Tab with dark green aesthetic"""
         tab_layout = QVBoxLayout()
@@ -302,11 +337,39 @@ class FinanceDashboard(QWidget):
         list_header_layout.addWidget(self.view_expenses_btn)
         
         list_layout.addLayout(list_header_layout)
-        
-        # Expense List with better formatting
-        self.expense_list = QListWidget(self)
-        self.expense_list.setAlternatingRowColors(True)
-        list_layout.addWidget(self.expense_list)
+
+        # Offline / last synced / waiting uploads
+        self.sync_status = QLabel("", self)
+        self.sync_status.setStyleSheet(f"color: {MID_TEXT};")
+        list_layout.addWidget(self.sync_status)
+        
+        # Filter the loaded expenses locally, without asking the backend again
+        self.expense_filter = QLineEdit(self)
+        self.expense_filter.setPlaceholderText("Filter by date, category, amount or description")
+        list_layout.addWidget(self.expense_filter)
+
+        # Expense table: only the visible rows are drawn, and older pages are
+        # fetched when the view is scrolled to the bottom
+        self.expense_model = ExpenseTableModel(self)
+        self.expense_model.fetch_requested.connect(self.fetch_expense_page)
+        self.expense_proxy = ExpenseProxyModel(self)
+        self.expense_proxy.setSourceModel(self.expense_model)
+        self.expense_filter.textChanged.connect(self.expense_proxy.set_filter_text)
+
+        self.expense_table = QTableView(self)
+        self.expense_table.setModel(self.expense_proxy)
+        self.expense_table.setAlternatingRowColors(True)
+        self.expense_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.expense_table.setWordWrap(False)
+        self.expense_table.verticalHeader().hide()
+        # Fixed row height, so Qt never measures rows to lay out the scroll bar
+        self.expense_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.expense_table.verticalHeader().setDefaultSectionSize(32)
+        self.expense_table.horizontalHeader().setStretchLastSection(True)
+        # Start in the backend's newest-first order until a header is clicked
+        self.expense_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.expense_table.setSortingEnabled(True)
+        list_layout.addWidget(self.expense_table)
         
         right_layout.addWidget(list_card)
         
@@ -317,9 +380,6 @@ class FinanceDashboard(QWidget):
         
         tab_layout.addWidget(expense_splitter)
         self.expense_tab.setLayout(tab_layout)
-        
-        # Initialize with existing expenses
-        self.view_expenses()
 
     def initVisualizationTab(self):
         """Setup the Visualization Tab with dark green aesthetic"""
@@ -361,6 +421,7 @@ class FinanceDashboard(QWidget):
         self.pie_canvas = FigureCanvas(Figure(figsize=(5, 5)))
         self.pie_canvas.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.pie_canvas.figure.patch.set_facecolor(CARD_BG)
+        self.pie_chart = PieChart(self.pie_canvas)
         pie_layout.addWidget(self.pie_canvas)
         
         charts_splitter.addWidget(pie_card)
@@ -378,6 +439,7 @@ class FinanceDashboard(QWidget):
         self.bar_canvas = FigureCanvas(Figure(figsize=(5, 5)))
         self.bar_canvas.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.bar_canvas.figure.patch.set_facecolor(CARD_BG)
+        self.bar_chart = BarChart(self.bar_canvas)
         bar_layout.addWidget(self.bar_canvas)
         
         charts_splitter.addWidget(bar_card)
@@ -387,17 +449,24 @@ class FinanceDashboard(QWidget):
         self.visualization_tab.setLayout(tab_layout)
 
     def refreshVisualizationTab(self):
-        """Refresh visualizations when switching to the visualization tab"""
+        """Refresh the tab being switched to and drop the requests of the one left behind"""
         if self.tabs.currentIndex() == 1:  # Check if Visualization tab is active
             self.refresh_visualizations()
+        else:
+            self.network.cancel("charts")
+            self.view_expenses()  # Cheap when nothing changed: the changes feed comes back empty
 
     def refresh_visualizations(self):
         """Update both charts with the latest data"""
         self.fetch_and_update_charts()
 
+    def refresh_visible_charts(self):
+        """Keep the Insights tab current while it is open; it refreshes anyway when switched to"""
+        if self.tabs.currentIndex() == 1:
+            self.fetch_and_update_charts()
+
     def add_expense(self):
-        """Send new expense data to backend & clear inputs after submission"""
-        url = "http://127.0.0.1:5000/expenses"
+        """Queue the new expense for the backend & clear the inputs"""
         data = {
             "user_id": self.user_id,
             "date": self.date_input.date().toString("yyyy-MM-dd"),
@@ -416,136 +485,70 @@ class FinanceDashboard(QWidget):
             QMessageBox.warning(self, "Warning", "Amount must be a valid number")
             return
 
-        try:
-            response = requests.post(url, json=data)
-
-            if response.status_code == 201:
-                self.amount_input.clear()
-                self.date_input.setDate(QDate.currentDate())
-                self.description_input.clear()
-                self.view_expenses()
-                QMessageBox.information(self, "Success", "Expense added successfully")
-            else:
-                QMessageBox.warning(self, "Error", f"Failed to add expense: {response.text}")
-        except requests.exceptions.RequestException as e:
-            QMessageBox.critical(self, "Connection Error", "Could not connect to the server. Please check if the backend is running.")
+        # Shown and saved locally at once; uploaded in the background, even after a restart
+        self.expense_sync.add(data)
+        self.amount_input.clear()
+        self.date_input.setDate(QDate.currentDate())
+        self.description_input.clear()
+
+    def on_expense_rejected(self, message):
+        QMessageBox.warning(self, "Error", f"Failed to add expense: {message}")
+
+    def auth_headers(self):
+        """Authorization header for the signed-in user"""
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
+    def closeEvent(self, event):
+        """Revoke the access token when the dashboard closes, without holding up the window"""
+        self.hide()
+        self.live.stop()
+        self.network.shutdown()
+        self.cache.close()
+        if self.token:
+            # Nobody waits for the reply; the token still expires on its own if this fails
+            self.network.post("/logout", timeout=LOGOUT_TIMEOUT)
+        super().closeEvent(event)
 
     def view_expenses(self):
-        """Fetch and display expenses from backend with improved formatting"""
-        try:
-            url = f"http://127.0.0.1:5000/expenses/{self.user_id}"
-            response = requests.get(url)
-
-            if response.status_code == 200:
-                self.expense_list.clear()
-                expenses = response.json()["expenses"]
-                
-                # Sort expenses by date (newest first)
-                expenses.sort(key=lambda x: x['date'], reverse=True)
-                
-                for exp in expenses:
-                    # Format the amount with commas for thousands
-                    formatted_amount = f"₹{float(exp['amount']):,.2f}"
-                    
-                    # Create a more visually appealing list item
-                    self.expense_list.addItem(
-                        f"{exp['date']} | {exp['category']} | {formatted_amount}\n"
-                        f"Description: {exp['description']}"
-                    )
-            else:
-                QMessageBox.warning(self, "Error", "Failed to fetch expenses")
-        except requests.exceptions.RequestException:
-            QMessageBox.critical(self, "Connection Error", "Could not connect to the server. Please check if the backend is running.")
+        """Bring the local cache up to date; the table reloads if anything changed"""
+        self.expense_sync.sync()
+
+    def show_cached_expenses(self):
+        """Show the newest page of cached expenses, with queued ones on top"""
+        self.expense_model.reset(*self.cache.expense_page(self.user_id, limit=EXPENSE_PAGE_SIZE))
+
+    def fetch_expense_page(self, cursor):
+        """Append the next page of older cached expenses as the table scrolls"""
+        self.expense_model.append_page(*self.cache.expense_page(self.user_id, cursor, EXPENSE_PAGE_SIZE))
+
+    def show_cached_charts(self):
+        """Draw the last chart data saved, and revalidate it on the next request"""
+        etag, data = self.cache.payload(self.user_id, "visualize")
+        if data is not None:
+            self.network.remember(f"/visualize/{self.user_id}", etag, data)
+            self.pie_chart.update(data["categories"], data["amounts"])
+            self.bar_chart.update(data["categories"], data["amounts"])
 
     def fetch_and_update_charts(self):
-        """Fetch expense data and update both charts with dark green styling"""
-        try:
-            url = f"http://127.0.0.1:5000/visualize/{self.user_id}"
-            response = requests.get(url)
-
-            if response.status_code == 200:
-                data = response.json()
-                categories = data["categories"]
-                amounts = data["amounts"]
-
-                # Update Pie Chart with green aesthetic
-                self.pie_canvas.figure.clear()
-                ax_pie = self.pie_canvas.figure.add_subplot(111)
-                ax_pie.set_facecolor(CARD_BG)
-                
-                wedges, texts, autotexts = ax_pie.pie(
-                    amounts, 
-                    labels=None,  # We'll add a legend instead
-                    autopct='%1.1f%%', 
-                    startangle=90, 
-                    colors=COLORS[:len(categories)],
-                    wedgeprops={'width': 0.6, 'edgecolor': DARK_BG, 'linewidth': 1}
-                )
-                
-                # Make percentage text visible on dark background
-                for autotext in autotexts:
-                    autotext.set_color(LIGHT_TEXT)
-                    autotext.set_fontweight('bold')
-                
-                # Add a legend with green styling
-                legend = ax_pie.legend(
-                    wedges, 
-                    categories,
-                    title="Categories",
-                    loc="center left",
-                    bbox_to_anchor=(0.9, 0, 0.5, 1)
-                )
-                legend.get_title().set_color(LIGHT_TEXT)
-                for text in legend.get_texts():
-                    text.set_color(MID_TEXT)
-                
-                ax_pie.set_title("Expense Distribution", color=HIGHLIGHT, fontsize=14)
-                self.pie_canvas.figure.tight_layout()
-                self.pie_canvas.draw()
-
-                # Update Bar Chart with green aesthetic
-                self.bar_canvas.figure.clear()
-                ax_bar = self.bar_canvas.figure.add_subplot(111)
-                ax_bar.set_facecolor(CARD_BG)
-                
-                bars = ax_bar.bar(
-                    categories, 
-                    amounts, 
-                    color=COLORS[:len(categories)],
-                    width=0.6,
-                    edgecolor=DARK_BG,
-                    linewidth=1
-                )
-                
-                # Add value labels on top of bars
-                for bar in bars:
-                    height = bar.get_height()
-                    ax_bar.text(
-                        bar.get_x() + bar.get_width()/2.,
-                        height + 5,
-                        f'₹{int(height):,}',
-                        ha='center', 
-                        va='bottom',
-                        color=HIGHLIGHT
-                    )
-                
-                # Style the bar chart with green theme
-                ax_bar.set_title("Expense by Category", color=HIGHLIGHT, fontsize=14)
-                ax_bar.set_xlabel("Category", color=MID_TEXT)
-                ax_bar.set_ylabel("Amount (₹)", color=MID_TEXT)
-                ax_bar.tick_params(colors=MID_TEXT)
-                ax_bar.grid(axis='y', linestyle='--', alpha=0.3, color=PANEL_BG)
-                ax_bar.spines['top'].set_visible(False)
-                ax_bar.spines['right'].set_visible(False)
-                ax_bar.spines['bottom'].set_color(PANEL_BG)
-                ax_bar.spines['left'].set_color(PANEL_BG)
-                
-                self.bar_canvas.figure.tight_layout()
-                self.bar_canvas.draw()
-            else:
-                QMessageBox.warning(self, "Error", "Failed to fetch visualization data")
-        except requests.exceptions.RequestException:
-            QMessageBox.critical(self, "Connection Error", "Could not connect to the server. Please check if the backend is running.")
+        """Request the chart data; update_charts draws it when it arrives"""
+        self.network.get(f"/visualize/{self.user_id}", self.update_charts, tag="charts", conditional=True)
+
+    def update_charts(self, reply):
+        """Update both charts with dark green styling"""
+        if reply.error and self.pie_chart.categories:
+            return  # Offline: keep showing the saved charts; the status line says so
+        if reply.error:
+            QMessageBox.critical(self, "Connection Error", reply.error)
+            return
+        if reply.status != 200:
+            QMessageBox.warning(self, "Error", "Failed to fetch visualization data")
+            return
+        if not reply.changed:
+            return  # Charts already show this data
+        self.cache.save_payload(self.user_id, "visualize", reply.etag, reply.data)
+        # The charts keep their artists and only redraw what the new data moved
+        self.pie_chart.update(reply.data["categories"], reply.data["amounts"])
+        self.bar_chart.update(reply.data["categories"], reply.data["amounts"])
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
@@ -0,0 +1,131 @@
+"""The HTTP client shared by the login window and the dashboard.
+
+One requests.Session for the whole app: connections to the backend are kept
+alive and reused from a pool instead of being opened per call. The base URL
+comes from FINANCE_API_URL. Failed connection attempts, and idempotent
+requests answered 502/503/504, are retried with exponential backoff,
+honouring Retry-After. Responses may be gzip-compressed, or brotli if the
+brotli package is installed, and decode_json() uses orjson when it is.
+Every call's latency is recorded per endpoint.
+
+The Qt windows don't call this directly; they go through network.py, which
+runs it on worker threads. tests/test_http_client.py checks connection
+reuse and retries against a local stub server.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # Optional: pip install orjson
+    orjson = None
+
+API_URL = os.environ.get('FINANCE_API_URL', 'http://127.0.0.1:5000')
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 15
+POOL_SIZE = 8
+RETRIES = 3
+BACKOFF_FACTOR = 0.25
+LATENCY_SAMPLES = 512
+
+# /expenses/42/export -> /expenses/{id}/export, so metrics group by endpoint
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+class EndpointStats:
+    """Call count, failures and recent latencies for one endpoint"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def summary(self):
+        ordered = sorted(self.latencies)
+
+        def percentile(p):
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 1) if ordered else None
+
+        return {'count': self.count, 'errors': self.errors,
+                'p50_ms': percentile(0.5), 'p95_ms': percentile(0.95), 'max_ms': percentile(1.0)}
+
+
+class HttpClient:
+    """Pooled, retrying requests.Session bound to the backend's base URL"""
+
+    def __init__(self, base_url=API_URL, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), pool_size=POOL_SIZE,
+                 retries=RETRIES, backoff_factor=BACKOFF_FACTOR):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(502, 503, 504),
+                      respect_retry_after_header=True, raise_on_status=False)
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        # Every encoding urllib3 can decode here: gzip and deflate, plus br with brotli installed
+        self.session.headers['Accept-Encoding'] = DEFAULT_ACCEPT_ENCODING
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, path, timeout=None, **kwargs):
+        """Send a request to base_url + path; raises requests exceptions like requests.request"""
+        endpoint = f"{method} {_ID_SEGMENT.sub('/{id}', path)}"
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=timeout or self.timeout,
+                                            **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            self._record(endpoint, time.perf_counter() - start, failed)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def _record(self, endpoint, elapsed, failed):
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = EndpointStats()
+            stats.count += 1
+            stats.errors += failed
+            stats.latencies.append(elapsed)
+
+    def metrics(self):
+        """{'GET /expenses/{id}': {'count', 'errors', 'p50_ms', 'p95_ms', 'max_ms'}, ...}"""
+        with self._lock:
+            return {endpoint: stats.summary() for endpoint, stats in sorted(self._stats.items())}
+
+    def connections_opened(self):
+        """TCP connections opened so far; far fewer than requests when keep-alive works"""
+        pools = self.adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def close(self):
+        self.session.close()
+
+
+def decode_json(content):
+    """Parse a JSON response body (bytes); raises ValueError if it isn't JSON"""
+    if orjson is not None:
+        return orjson.loads(content)  # orjson.JSONDecodeError is a ValueError
+    return json.loads(content)
+
+
+# The instance the windows share
+client = HttpClient()
+
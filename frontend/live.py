@@ -0,0 +1,118 @@
+"""Live updates pushed by the backend, so an open dashboard needn't poll.
+
+LiveUpdates holds GET /events/<user_id> open on a background thread and
+hands every server-sent event to the GUI thread through event_received as
+a dict: {"event": "change" or "version", "version": N, "changes": [...]}.
+ExpenseSync.apply_event() decides whether the changes can be applied to
+the local cache directly or whether a sync is needed.
+
+The stream gets its own session without urllib3's retries. Those would
+sleep through a 503's Retry-After inside the request, where stop() can't
+reach them. Reconnects use exponential backoff, or the Retry-After of a 503.
+Every reconnect starts with a version event, so anything missed while
+disconnected is caught up by the sync it triggers. The thread stops for
+good on 401 (signed out), 403 and 404 (a backend without the stream).
+
+stop() returns at once. The reader notices at the next event or heartbeat
+and exits. Closing the response under it from the GUI thread would block
+until then anyway, as the read holds the response's buffer. The thread is
+a daemon, so it never holds up quitting the app.
+"""
+import json
+import threading
+
+import requests
+from PyQt5.QtCore import QObject, pyqtSignal
+
+import http_client
+
+# The server sends a heartbeat every 15 s; a silent connection after this long is dead
+READ_TIMEOUT = 45
+RETRY_MIN_SECONDS = 2
+RETRY_MAX_SECONDS = 60
+
+
+class _Signals(QObject):
+    # Emitted from the reader thread; the slot runs on the GUI thread
+    received = pyqtSignal(dict)
+
+
+class LiveUpdates(QObject):
+    """Reader for the backend's event stream, reconnecting until stopped"""
+
+    event_received = pyqtSignal(dict)
+
+    def __init__(self, user_id, headers, base_url=None, parent=None):
+        super().__init__(parent)
+        self.url = f"{(base_url or http_client.API_URL).rstrip('/')}/events/{user_id}"
+        self.headers = dict(headers, Accept='text/event-stream')
+        self.connected = False
+        self._stopped = threading.Event()
+        self._thread = None
+        # Unparented, so it stays valid for a reader thread that outlives this object
+        self._signals = _Signals()
+        self._signals.received.connect(self.event_received)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='finance-live', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop reconnecting; the current stream is dropped at its next event or heartbeat"""
+        self._stopped.set()
+
+    def _run(self):
+        session = requests.Session()
+        delay = RETRY_MIN_SECONDS
+        while not self._stopped.is_set():
+            try:
+                response = session.get(self.url, headers=self.headers, stream=True,
+                                       timeout=(http_client.CONNECT_TIMEOUT, READ_TIMEOUT))
+            except requests.exceptions.RequestException:
+                response = None
+
+            if response is not None:
+                status = response.status_code
+                if status in (401, 403, 404):
+                    response.close()
+                    break
+                if status == 200:
+                    delay = RETRY_MIN_SECONDS
+                    self._read(response)
+                elif response.headers.get('Retry-After', '').isdigit():
+                    delay = int(response.headers['Retry-After'])
+                response.close()
+
+            self.connected = False
+            self._stopped.wait(delay)
+            delay = min(delay * 2, RETRY_MAX_SECONDS)
+        session.close()
+
+    def _read(self, response):
+        """Parse text/event-stream until the stream ends, fails or stop() is called"""
+        self.connected = True
+        event, data = None, []
+        try:
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if self._stopped.is_set():
+                    return
+                if line:
+                    field, _, value = line.partition(':')
+                    value = value[1:] if value.startswith(' ') else value
+                    if field == 'event':
+                        event = value
+                    elif field == 'data':
+                        data.append(value)
+                    continue
+                # A blank line ends the event
+                if data:
+                    try:
+                        payload = json.loads('\n'.join(data))
+                    except ValueError:
+                        payload = None
+                    if isinstance(payload, dict) and not self._stopped.is_set():
+                        self._signals.received.emit(dict(payload, event=event or 'message'))
+                event, data = None, []
+        except (requests.exceptions.RequestException, OSError, ValueError):
+            pass  # Connection dropped; the caller reconnects
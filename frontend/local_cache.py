@@ -0,0 +1,268 @@
+"""On-disk copy of the signed-in user's data, so the dashboard opens offline.
+
+One SQLite file per backend (FINANCE_CACHE_DIR, ~/.cache/finance-dashboard
+by default) holds:
+
+- expense     the user's expenses as of the last sync
+- sync_state  the backend data version they were synced at (and the ETag
+              of the full listing, for backends without the changes feed)
+- payload     the last body of aggregate reads such as /visualize
+- outbox      expenses added in the dashboard that the backend hasn't
+              confirmed yet. They are listed first, with negative ids, until
+              a sync brings back the server's copy.
+
+Only the GUI thread touches the connection. sync.py keeps it up to date.
+"""
+import itertools
+import json
+import os
+import re
+import sqlite3
+import time
+
+CACHE_DIR = os.environ.get('FINANCE_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'finance-dashboard'))
+
+# Bump when the schema changes; older files are simply rebuilt from the backend
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS expense (
+    user_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    category TEXT NOT NULL,
+    amount REAL NOT NULL,
+    description TEXT,
+    PRIMARY KEY (user_id, id)
+);
+CREATE INDEX IF NOT EXISTS ix_expense_user_date ON expense (user_id, date, id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER,
+    etag TEXT,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS payload (
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    etag TEXT,
+    body TEXT NOT NULL,
+    PRIMARY KEY (user_id, name)
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    body TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    known_max_id INTEGER NOT NULL DEFAULT 0,
+    sent_at REAL,
+    created_at REAL NOT NULL
+);
+"""
+
+# Outbox states
+QUEUED = 'queued'        # Not sent yet, or sent and refused for a reason worth retrying
+SENT = 'sent'            # Backend answered 201; kept on screen until a sync brings its copy
+UNCERTAIN = 'uncertain'  # The connection failed mid-request, so the backend may have it
+
+DELETE_EXPENSE = "DELETE FROM expense WHERE user_id = ? AND id = ?"
+UPSERT_EXPENSE = (
+    "INSERT INTO expense (user_id, id, date, category, amount, description) "
+    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (user_id, id) DO UPDATE SET "
+    "date = excluded.date, category = excluded.category, amount = excluded.amount, "
+    "description = excluded.description"
+)
+
+
+def default_path(base_url):
+    """Cache file for a backend URL, e.g. ~/.cache/finance-dashboard/127.0.0.1_5000.db"""
+    name = re.sub(r'[^A-Za-z0-9.-]+', '_', base_url.split('://', 1)[-1]).strip('_')
+    return os.path.join(CACHE_DIR, f"{name or 'default'}.db")
+
+
+def _expense(row):
+    return {"id": row[0], "date": row[1], "category": row[2], "amount": row[3], "description": row[4]}
+
+
+class OutboxEntry:
+    """One expense waiting to be uploaded"""
+
+    __slots__ = ('id', 'expense', 'state', 'known_max_id', 'sent_at')
+
+    def __init__(self, id, body, state, known_max_id, sent_at):
+        self.id = id
+        self.expense = json.loads(body)
+        self.state = state
+        self.known_max_id = known_max_id  # Highest server id cached when it was queued
+        self.sent_at = sent_at            # When the last upload attempt ended
+
+
+class LocalCache:
+    """SQLite store behind the dashboard's expense table, charts and write-behind queue"""
+
+    def __init__(self, path):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                self.conn.executescript(
+                    "DROP TABLE IF EXISTS expense; DROP TABLE IF EXISTS sync_state; DROP TABLE IF EXISTS payload;"
+                )
+                self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # Expenses
+
+    def expense_page(self, user_id, cursor=None, limit=200):
+        """Return (expenses, next_cursor), newest first; the first page starts with the outbox"""
+        expenses = []
+        stmt = "SELECT id, date, category, amount, description FROM expense WHERE user_id = ?"
+        params = [user_id]
+        if cursor is None:
+            expenses = self.outbox_expenses(user_id)
+        else:
+            day, expense_id = cursor.split('|')
+            stmt += " AND (date, id) < (?, ?)"
+            params += [day, int(expense_id)]
+        stmt += " ORDER BY date DESC, id DESC LIMIT ?"
+        rows = self.conn.execute(stmt, params + [limit + 1]).fetchall()
+
+        expenses += [_expense(row) for row in rows[:limit]]
+        next_cursor = f"{rows[limit - 1][1]}|{rows[limit - 1][0]}" if len(rows) > limit else None
+        return expenses, next_cursor
+
+    def expense_count(self, user_id):
+        return self.conn.execute("SELECT count(*) FROM expense WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def apply_changes(self, user_id, changes):
+        """Upsert changed expenses and remove deleted ones, in feed order"""
+        with self.conn:
+            for deleted, run in itertools.groupby(changes, key=lambda change: bool(change.get('deleted'))):
+                if deleted:
+                    self.conn.executemany(DELETE_EXPENSE, [(user_id, change['id']) for change in run])
+                else:
+                    self.conn.executemany(
+                        UPSERT_EXPENSE,
+                        [(user_id, e['id'], e['date'], e['category'], e['amount'], e['description']) for e in run]
+                    )
+
+    def apply_change_columns(self, user_id, page):
+        """apply_changes() for a page of the feed in its columnar shape, without a dict per change"""
+        rows = zip(page['deleted'], page['ids'], page['dates'], page['categories'], page['amounts'],
+                   page['descriptions'])
+        with self.conn:
+            for deleted, run in itertools.groupby(rows, key=lambda row: row[0]):
+                if deleted:
+                    self.conn.executemany(DELETE_EXPENSE, [(user_id, row[1]) for row in run])
+                else:
+                    self.conn.executemany(UPSERT_EXPENSE, [(user_id,) + row[1:] for row in run])
+
+    def replace_expenses(self, user_id, expenses, etag=None):
+        """Swap in a complete listing (backends without the changes feed)"""
+        with self.conn:
+            self.conn.execute("DELETE FROM expense WHERE user_id = ?", (user_id,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO expense (user_id, id, date, category, amount, description) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(user_id, e['id'], e['date'], e['category'], e['amount'], e['description']) for e in expenses]
+            )
+            self._set_state(user_id, None, etag)
+
+    def clear_expenses(self, user_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM expense WHERE user_id = ?", (user_id,))
+            self.conn.execute("DELETE FROM sync_state WHERE user_id = ?", (user_id,))
+
+    # Sync state
+
+    def sync_state(self, user_id):
+        """(version, etag, synced_at) of the last completed sync, all None before the first"""
+        row = self.conn.execute("SELECT version, etag, synced_at FROM sync_state WHERE user_id = ?",
+                                (user_id,)).fetchone()
+        return row or (None, None, None)
+
+    def set_version(self, user_id, version):
+        with self.conn:
+            self._set_state(user_id, version, None)
+
+    def touch(self, user_id):
+        """Record that a sync found nothing new"""
+        with self.conn:
+            self.conn.execute("UPDATE sync_state SET synced_at = ? WHERE user_id = ?", (time.time(), user_id))
+
+    def _set_state(self, user_id, version, etag):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sync_state (user_id, version, etag, synced_at) VALUES (?, ?, ?, ?)",
+            (user_id, version, etag, time.time())
+        )
+
+    # Aggregate payloads
+
+    def payload(self, user_id, name):
+        """(etag, data) last saved under name, or (None, None)"""
+        row = self.conn.execute("SELECT etag, body FROM payload WHERE user_id = ? AND name = ?",
+                                (user_id, name)).fetchone()
+        return (row[0], json.loads(row[1])) if row else (None, None)
+
+    def save_payload(self, user_id, name, etag, data):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO payload (user_id, name, etag, body) VALUES (?, ?, ?, ?)",
+                              (user_id, name, etag, json.dumps(data)))
+
+    # Outbox
+
+    def enqueue(self, user_id, expense):
+        """Queue an expense for upload; returns its outbox id"""
+        with self.conn:
+            known_max_id = self.conn.execute("SELECT coalesce(max(id), 0) FROM expense WHERE user_id = ?",
+                                             (user_id,)).fetchone()[0]
+            cursor = self.conn.execute(
+                "INSERT INTO outbox (user_id, body, known_max_id, created_at) VALUES (?, ?, ?, ?)",
+                (user_id, json.dumps(expense), known_max_id, time.time())
+            )
+        return cursor.lastrowid
+
+    def outbox(self, user_id, state=None):
+        """Entries oldest first, optionally only those in one state"""
+        stmt = "SELECT id, body, state, known_max_id, sent_at FROM outbox WHERE user_id = ?"
+        params = [user_id]
+        if state is not None:
+            stmt += " AND state = ?"
+            params.append(state)
+        return [OutboxEntry(*row) for row in self.conn.execute(stmt + " ORDER BY id", params)]
+
+    def outbox_expenses(self, user_id):
+        """Outbox entries as expense rows, newest first, with negative ids"""
+        return [dict(entry.expense, id=-entry.id) for entry in reversed(self.outbox(user_id))]
+
+    def set_state(self, entry_id, state):
+        with self.conn:
+            self.conn.execute("UPDATE outbox SET state = ?, sent_at = ? WHERE id = ?",
+                              (state, None if state == QUEUED else time.time(), entry_id))
+
+    def drop(self, entry_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+
+    def drop_sent(self, user_id, synced_since):
+        """Remove sent entries whose server copy a sync started at synced_since has brought in"""
+        with self.conn:
+            return self.conn.execute("DELETE FROM outbox WHERE user_id = ? AND state = ? AND sent_at < ?",
+                                     (user_id, SENT, synced_since)).rowcount
+
+    def find_delivered(self, user_id, entry, exclude=()):
+        """Id of a server expense added after entry was queued with exactly its fields, or None"""
+        expense = entry.expense
+        rows = self.conn.execute(
+            "SELECT id FROM expense WHERE user_id = ? AND id > ? AND date = ? AND category = ? "
+            "AND amount = ? AND description IS ? ORDER BY id",
+            (user_id, entry.known_max_id, expense['date'], expense['category'], float(expense['amount']),
+             expense.get('description'))
+        )
+        return next((row[0] for row in rows if row[0] not in exclude), None)
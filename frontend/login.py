@@ -1,5 +1,4 @@
 import sys
-import requests
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, 
     QPushButton, QTabWidget, QMessageBox, QFrame
@@ -10,6 +9,7 @@ from PyQt5.QtGui import QFont
 # Import your main dashboard
 # Make sure to update the import path based on your project structure
 from frontend import FinanceDashboard
+from network import NetworkClient
 
 # Dark green aesthetic color palette (copied from your frontend)
 DARK_BG = "#0F171A"
@@ -23,6 +23,8 @@ HIGHLIGHT = "#7FFFD4"
 class AuthWindow(QWidget):
     def __init__(self):
         super().__init__()
+        # Shares http_client's connection pool with the dashboard opened after login
+        self.network = NetworkClient(parent=self)
         self.initUI()
         
     def initUI(self):
@@ -278,30 +280,28 @@ class AuthWindow(QWidget):
             return
         
         # Send login request to backend
-        try:
-            response = requests.post(
-                "http://127.0.0.1:5000/login",
-                json={"username": username, "password": password}
-            )
+        self.login_button.setEnabled(False)
+        self.network.post("/login", self.on_login, json={"username": username, "password": password})
+
+    def on_login(self, reply):
+        """Handle the backend's answer to a login request"""
+        self.login_button.setEnabled(True)
+        if reply.error:
+            QMessageBox.critical(self, "Connection Error", reply.error)
+        elif reply.status == 200:
+            user_id = reply.data.get("user_id")
+            token = reply.data.get("token")
+            
+            # Show success message
+            QMessageBox.information(self, "Success", "Login successful!")
             
-            if response.status_code == 200:
-                data = response.json()
-                user_id = data.get("user_id")
-                
-                # Show success message
-                QMessageBox.information(self, "Success", "Login successful!")
-                
-                # Open the dashboard with the user's ID
-                self.open_dashboard(user_id)
-            else:
-                error_msg = "Invalid username or password"
-                if response.json().get("error"):
-                    error_msg = response.json().get("error")
-                QMessageBox.warning(self, "Login Failed", error_msg)
-                
-        except requests.exceptions.RequestException:
-            QMessageBox.critical(self, "Connection Error", 
-                               "Could not connect to the server. Please check if the backend is running.")
+            # Open the dashboard with the user's ID
+            self.open_dashboard(user_id, token)
+        else:
+            error_msg = "Invalid username or password"
+            if (reply.data or {}).get("error"):
+                error_msg = reply.data.get("error")
+            QMessageBox.warning(self, "Login Failed", error_msg)
     
     def handle_register(self):
         """Handle registration button click"""
@@ -322,35 +322,33 @@ class AuthWindow(QWidget):
             return
             
         # Send registration request to backend
-        try:
-            response = requests.post(
-                "http://127.0.0.1:5000/register",
-                json={"username": username, "password": password}
+        self.register_button.setEnabled(False)
+        self.network.post("/register", self.on_register, json={"username": username, "password": password})
+
+    def on_register(self, reply):
+        """Handle the backend's answer to a registration request"""
+        self.register_button.setEnabled(True)
+        if reply.error:
+            QMessageBox.critical(self, "Connection Error", reply.error)
+        elif reply.status == 201:
+            QMessageBox.information(
+                self, 
+                "Success", 
+                "Account created successfully! You can now log in."
             )
-            
-            if response.status_code == 201:
-                QMessageBox.information(
-                    self, 
-                    "Success", 
-                    "Account created successfully! You can now log in."
-                )
-                # Switch to login tab
-                self.auth_tabs.setCurrentIndex(0)
-                self.login_username.setText(username)
-                self.login_password.clear()
-            else:
-                error_msg = "Registration failed"
-                if response.json().get("message"):
-                    error_msg = response.json().get("message")
-                QMessageBox.warning(self, "Registration Failed", error_msg)
-                
-        except requests.exceptions.RequestException:
-            QMessageBox.critical(self, "Connection Error", 
-                              "Could not connect to the server. Please check if the backend is running.")
+            # Switch to login tab
+            self.auth_tabs.setCurrentIndex(0)
+            self.login_username.setText(self.register_username.text().strip())
+            self.login_password.clear()
+        else:
+            error_msg = "Registration failed"
+            if (reply.data or {}).get("message"):
+                error_msg = reply.data.get("message")
+            QMessageBox.warning(self, "Registration Failed", error_msg)
     
-    def open_dashboard(self, user_id):
-        """Open the finance dashboard with the user's ID"""
-        self.dashboard = FinanceDashboard(user_id)
+    def open_dashboard(self, user_id, token=None):
+        """Open the finance dashboard with the user's ID and access token"""
+        self.dashboard = FinanceDashboard(user_id, token)
         self.dashboard.show()
         self.close()
 
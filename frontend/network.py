@@ -0,0 +1,197 @@
+"""Background HTTP for the PyQt windows.
+
+Requests go through the shared client in http_client.py on a small
+QThreadPool, and the JSON is decoded there too. The result comes back to
+the GUI thread as a Reply passed to the caller's callback, so a slow or dead
+backend never freezes the window.
+
+- Identical GETs that are already in flight (rapid Refresh clicks) share one
+  request; each distinct callback is called once with the shared Reply.
+- cancel(tag) drops the callbacks registered under a tag, e.g. when the user
+  leaves the tab that asked. A request that has already been sent still
+  runs to completion or timeout on its worker, but nobody hears about it.
+- Every request has the client's connect and read timeouts unless it
+  passes its own timeout.
+- conditional=True sends If-None-Match with the last ETag seen for the URL.
+  A 304 is delivered as status 200 with the remembered body and
+  changed=False. remember() seeds a validator saved from an earlier run.
+- headers are added to the client-wide ones for one request. Requests with
+  different headers (e.g. Accept) are never coalesced or share validators.
+"""
+import itertools
+import time
+
+import requests
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+import http_client
+
+MAX_THREADS = 4
+
+
+class Reply:
+    """Outcome of one request, delivered on the GUI thread"""
+
+    __slots__ = ('status', 'data', 'text', 'error', 'changed', 'elapsed', 'etag')
+
+    def __init__(self, status=None, data=None, text='', error=None, changed=True, elapsed=0.0, etag=None):
+        self.status = status    # HTTP status, or None if no response arrived
+        self.data = data        # Decoded JSON body, or None
+        self.text = text        # Raw body of error responses
+        self.error = error      # Connection/timeout message, or None
+        self.changed = changed  # False when a conditional GET came back 304
+        self.elapsed = elapsed  # Seconds from send to decoded body
+        self.etag = etag        # ETag response header, if any
+
+    @property
+    def ok(self):
+        return self.error is None and self.status is not None and 200 <= self.status < 300
+
+
+class _Signals(QObject):
+    # Emitted from worker threads; the slot runs on the GUI thread
+    finished = pyqtSignal(int, object)
+
+
+class _Job(QRunnable):
+    def __init__(self, job_id, signals, http, method, path, kwargs):
+        super().__init__()
+        self.job_id = job_id
+        self.signals = signals
+        self.http = http
+        self.method = method
+        self.path = path
+        self.kwargs = kwargs
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            response = self.http.request(self.method, self.path, **self.kwargs)
+        except requests.exceptions.Timeout:
+            result = (None, None, None, '', "The server took too long to respond.")
+        except requests.exceptions.RequestException:
+            result = (None, None, None, '', "Could not connect to the server. Please check if the backend is running.")
+        else:
+            try:
+                data = http_client.decode_json(response.content) if response.content else None
+            except ValueError:
+                data = None
+            text = response.text if response.status_code >= 400 else ''
+            result = (response.status_code, response.headers.get('ETag'), data, text, None)
+        self.signals.finished.emit(self.job_id, result + (time.perf_counter() - start,))
+
+
+def _key(path, params, headers):
+    """What identifies a GET for coalescing and validators"""
+    return path, tuple(sorted((params or {}).items())), tuple(sorted((headers or {}).items()))
+
+
+class _Pending:
+    __slots__ = ('key', 'conditional', 'callbacks')
+
+    def __init__(self, key, conditional):
+        self.key = key
+        self.conditional = conditional
+        self.callbacks = []  # (callback, tag) pairs
+
+
+class NetworkClient(QObject):
+    """Run HTTP requests off the GUI thread and call back with a Reply"""
+
+    def __init__(self, http=None, max_threads=MAX_THREADS, parent=None):
+        super().__init__(parent)
+        self.http = http or http_client.client
+        self.headers = {}  # Sent with every request, e.g. Authorization
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._ids = itertools.count()
+        self._pending = {}      # job id -> _Pending
+        self._in_flight = {}    # coalescing key -> job id, for GETs
+        self._validators = {}   # (path, params, headers) -> (ETag, decoded body)
+        self._signals = _Signals()
+        self._signals.finished.connect(self._finish)
+
+    def get(self, path, callback, params=None, tag=None, conditional=False, headers=None):
+        return self.request('GET', path, callback, params=params, tag=tag, conditional=conditional, headers=headers)
+
+    def post(self, path, callback=None, json=None, tag=None, timeout=None):
+        return self.request('POST', path, callback, json=json, tag=tag, timeout=timeout)
+
+    def request(self, method, path, callback=None, params=None, json=None, tag=None, conditional=False,
+                headers=None, timeout=None):
+        """Queue a request; callback(reply) runs on the GUI thread. Returns the job id."""
+        key = _key(path, params, headers)
+
+        if method == 'GET':
+            job_id = self._in_flight.get((key, conditional))
+            if job_id is not None:
+                pending = self._pending[job_id]
+                if callback is not None and all(callback != cb for cb, _ in pending.callbacks):
+                    pending.callbacks.append((callback, tag))
+                return job_id
+
+        job_id = next(self._ids)
+        pending = _Pending(key, conditional)
+        if callback is not None:
+            pending.callbacks.append((callback, tag))
+        self._pending[job_id] = pending
+
+        headers = {**self.headers, **(headers or {})}
+        if conditional and key in self._validators:
+            headers['If-None-Match'] = self._validators[key][0]
+        kwargs = {'params': params, 'headers': headers}
+        if json is not None:
+            kwargs['json'] = json
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        if method == 'GET':
+            self._in_flight[(key, conditional)] = job_id
+
+        self.pool.start(_Job(job_id, self._signals, self.http, method, path, kwargs))
+        return job_id
+
+    def remember(self, path, etag, data, params=None, headers=None):
+        """Treat data as the body last seen with etag, for conditional GETs of path"""
+        self._validators[_key(path, params, headers)] = (etag, data)
+
+    def cancel(self, tag):
+        """Forget the callbacks registered under tag; requests nobody waits for are dropped"""
+        for job_id, pending in list(self._pending.items()):
+            pending.callbacks = [(cb, t) for cb, t in pending.callbacks if t != tag]
+            if not pending.callbacks:
+                self._drop(job_id)
+
+    def cancel_all(self):
+        for job_id in list(self._pending):
+            self._drop(job_id)
+
+    def shutdown(self, msecs=2000):
+        """Cancel everything, discard queued jobs and wait briefly for running ones"""
+        self.cancel_all()
+        self.pool.clear()
+        return self.pool.waitForDone(msecs)
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def _drop(self, job_id):
+        pending = self._pending.pop(job_id, None)
+        if pending is not None and self._in_flight.get((pending.key, pending.conditional)) == job_id:
+            del self._in_flight[(pending.key, pending.conditional)]
+
+    def _finish(self, job_id, result):
+        pending = self._pending.get(job_id)
+        self._drop(job_id)
+        if pending is None:
+            return  # Cancelled
+
+        status, etag, data, text, error, elapsed = result
+        reply = Reply(status, data, text, error, True, elapsed, etag)
+        if pending.conditional:
+            if status == 304 and pending.key in self._validators:
+                reply.status, reply.data, reply.changed = 200, self._validators[pending.key][1], False
+            elif status == 200 and etag:
+                self._validators[pending.key] = (etag, data)
+
+        for callback, _ in pending.callbacks:
+            callback(reply)
@@ -0,0 +1,301 @@
+"""Keeps the local cache in step with the backend and uploads queued expenses.
+
+Reading: sync() asks GET /expenses/<user_id>/changes?since=<version> for the
+expenses inserted, updated or deleted since the version the cache was last
+synced at, following `next` until the feed is exhausted. The feed answers:
+
+    {"version": 42, "changes": [{"id": 7, "date": ..., ...}, {"id": 3, "deleted": true}], "next": null}
+
+The feed is asked for in its columnar shape (one array per field, see the
+backend's serialization.py), which is smaller and goes into the cache
+without building a dict per change. Backends that predate it answer in the
+shape above, which is still understood.
+
+A backend without the feed answers 404. The cache is then refreshed from
+the paginated listing instead, which costs one conditional request when
+nothing changed and the whole listing when something did.
+
+Writing: add() puts the expense in the cache's outbox and returns at once.
+The outbox is uploaded in order, one POST at a time. An entry the backend
+refuses with a 4xx (other than 401) is dropped and reported through
+rejected. If the connection fails mid-POST the backend may or may not have
+stored the expense. The entry is then marked uncertain, and on reconnect
+it is only re-sent if a sync shows no matching new expense.
+
+Live updates from live.py go through apply_event(). A change that follows
+straight on from the cached version is applied without a request; any
+other news from the stream triggers a sync.
+
+Failures put the dashboard in offline mode. It keeps showing the cache and
+retries with exponential backoff.
+"""
+import time
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from local_cache import QUEUED, SENT, UNCERTAIN
+
+FULL_PAGE_SIZE = 1000
+# Columns preferred, plain JSON accepted
+CHANGES_ACCEPT = 'application/vnd.finance.columns+json, application/json;q=0.9'
+RETRY_MIN_SECONDS = 2
+RETRY_MAX_SECONDS = 60
+
+
+class ExpenseSync(QObject):
+    """Delta sync into a LocalCache plus a write-behind queue, driven by a NetworkClient"""
+
+    # The cached expenses changed; reload what's on screen
+    expenses_changed = pyqtSignal()
+    # Human-readable state for a status line
+    status_changed = pyqtSignal(str)
+    # A queued expense the backend refused, with its reason
+    rejected = pyqtSignal(str)
+
+    def __init__(self, network, cache, user_id, parent=None):
+        super().__init__(parent)
+        self.network = network
+        self.cache = cache
+        self.user_id = user_id
+        self.online = None              # None until the first request answers
+        self.changes_supported = None   # False once the backend has 404'd the feed
+        self._syncing = False
+        self._sync_again = False
+        self._sync_started = 0.0
+        self._changed = False
+        self._uploading = False
+        self._full_rows = []
+        self._etag = None
+        self._retry_delay = RETRY_MIN_SECONDS
+        self._retry = QTimer(self)
+        self._retry.setSingleShot(True)
+        self._retry.timeout.connect(self.sync)
+
+        # Seed the listing's validator so an unchanged backend answers 304 after a restart
+        _, etag, _ = cache.sync_state(user_id)
+        if etag:
+            network.remember(self._listing_path, etag, None, self._listing_params())
+
+    @property
+    def _listing_path(self):
+        return f"/expenses/{self.user_id}"
+
+    # Reading
+
+    def sync(self):
+        """Bring the cache up to date; safe to call while a sync is running"""
+        if self._syncing:
+            self._sync_again = True
+            return
+        self._retry.stop()
+        self._syncing = True
+        self._changed = False
+        self._sync_started = time.time()
+        if self.changes_supported is False:
+            self._fetch_listing()
+        else:
+            self._fetch_changes(self.cache.sync_state(self.user_id)[0] or 0)
+
+    def _fetch_changes(self, since, after=None):
+        params = {"since": since}
+        if after:
+            params["after"] = after
+        self.network.get(f"/expenses/{self.user_id}/changes", lambda reply: self._on_changes(reply, since),
+                         params, tag="sync", headers={"Accept": CHANGES_ACCEPT})
+
+    def _on_changes(self, reply, since):
+        if reply.status == 404 and not reply.error:
+            self.changes_supported = False
+            self._fetch_listing()
+            return
+        if not reply.ok:
+            self._sync_failed(reply)
+            return
+        self.changes_supported = True
+
+        data = reply.data
+        if data["version"] < since:
+            # The backend's data is older than our copy (restored or reset): start over
+            self.cache.clear_expenses(self.user_id)
+            self._changed = True
+            self._fetch_changes(0)
+            return
+        if "ids" in data:
+            if data["ids"]:
+                self.cache.apply_change_columns(self.user_id, data)
+                self._changed = True
+        elif data["changes"]:
+            self.cache.apply_changes(self.user_id, data["changes"])
+            self._changed = True
+        if data.get("next"):
+            self._fetch_changes(since, data["next"])
+            return
+        self.cache.set_version(self.user_id, data["version"])
+        self._finished()
+
+    def apply_event(self, event):
+        """Take in a live update (see live.py), syncing when it can't be applied as it stands
+
+        A change event that directly follows the cached version is applied to
+        the cache on the spot. Anything else newer than the cache (a gap, a
+        bulk write without its changes, a version from a heartbeat) is
+        fetched from the changes feed.
+        """
+        version = event.get("version")
+        cached = self.cache.sync_state(self.user_id)[0]
+        if version is None or (cached is not None and version <= cached):
+            return  # Already have it, e.g. our own upload's copy came in with a sync
+        direct = (cached is not None and version == cached + 1 and "changes" in event
+                  and self.changes_supported and not self._syncing and not self._uploading
+                  and not self.cache.outbox(self.user_id, SENT) and not self.cache.outbox(self.user_id, UNCERTAIN))
+        if not direct:
+            self.sync()
+            return
+        self.cache.apply_changes(self.user_id, event["changes"])
+        self.cache.set_version(self.user_id, version)
+        self._set_online(True)
+        self.expenses_changed.emit()
+        self._report()
+
+    def _listing_params(self, cursor=None):
+        params = {"limit": FULL_PAGE_SIZE}
+        if cursor:
+            params["before"] = cursor
+        return params
+
+    def _fetch_listing(self, cursor=None):
+        self.network.get(self._listing_path, lambda reply: self._on_listing(reply, cursor),
+                         self._listing_params(cursor), tag="sync", conditional=cursor is None)
+
+    def _on_listing(self, reply, cursor):
+        if not reply.ok:
+            self._full_rows = []
+            self._sync_failed(reply)
+            return
+        if cursor is None:
+            if not reply.changed:
+                self.cache.touch(self.user_id)
+                self._finished()  # Newest page unchanged, so nothing is
+                return
+            self._full_rows = []
+            self._etag = reply.etag
+        self._full_rows += reply.data["expenses"]
+        if reply.data.get("next_cursor"):
+            self._fetch_listing(reply.data["next_cursor"])
+            return
+        self.cache.replace_expenses(self.user_id, self._full_rows, self._etag)
+        self._full_rows = []
+        self._changed = True
+        self._finished()
+
+    def _finished(self):
+        self._syncing = False
+        self._set_online(True)
+        if self.cache.drop_sent(self.user_id, self._sync_started):
+            self._changed = True
+        self._resolve_uncertain()
+        if self._changed:
+            self.expenses_changed.emit()
+        self._report()
+        if self._sync_again:
+            self._sync_again = False
+            self.sync()
+        else:
+            self.upload()
+
+    def _resolve_uncertain(self):
+        """Decide, now the cache is current, whether uploads cut off mid-request got through"""
+        claimed = set()
+        for entry in self.cache.outbox(self.user_id, UNCERTAIN):
+            if entry.sent_at >= self._sync_started:
+                continue  # This sync may have read the backend before the upload landed
+            expense_id = self.cache.find_delivered(self.user_id, entry, claimed)
+            if expense_id is None:
+                self.cache.set_state(entry.id, QUEUED)
+            else:
+                claimed.add(expense_id)
+                self.cache.drop(entry.id)
+                self._changed = True
+
+    # Writing
+
+    def add(self, expense):
+        """Queue an expense for upload and show it straight away"""
+        self.cache.enqueue(self.user_id, expense)
+        self.expenses_changed.emit()
+        self._report()
+        self.upload()
+
+    def upload(self):
+        """Send the oldest queued expense, if nothing is in flight and nothing is in doubt"""
+        if self._uploading or self.cache.outbox(self.user_id, UNCERTAIN):
+            return
+        queued = self.cache.outbox(self.user_id, QUEUED)
+        if not queued:
+            return
+        entry = queued[0]
+        self._uploading = True
+        self.network.post("/expenses", lambda reply: self._on_uploaded(reply, entry), json=entry.expense,
+                          tag="sync")
+
+    def _on_uploaded(self, reply, entry):
+        self._uploading = False
+        if reply.status == 201:
+            self.cache.set_state(entry.id, SENT)
+            self._set_online(True)
+            if self.cache.outbox(self.user_id, QUEUED):
+                self.upload()
+            else:
+                self.sync()  # Fetch the server's copies, which replace the sent entries
+            return
+
+        if reply.error:
+            # The request may have reached the backend before the connection failed
+            self.cache.set_state(entry.id, UNCERTAIN)
+        elif reply.status != 401 and 400 <= reply.status < 500 and reply.status != 429:
+            self.cache.drop(entry.id)
+            message = (reply.data or {}).get("error") or reply.text or f"HTTP {reply.status}"
+            self.expenses_changed.emit()
+            self.rejected.emit(f"{entry.expense['date']} {entry.expense['category']} "
+                               f"₹{float(entry.expense['amount']):,.2f}: {message}")
+            self._report()
+            self.upload()
+            return
+        self._offline(reply)
+
+    # State
+
+    def _sync_failed(self, reply):
+        self._syncing = False
+        self._sync_again = False
+        self._offline(reply)
+
+    def _offline(self, reply):
+        if reply.status == 401:
+            self.online = True
+            self.status_changed.emit("Session expired: sign in again to sync")
+            return
+        self._set_online(False)
+        self._report()
+        self._retry.start(int(self._retry_delay * 1000))
+        self._retry_delay = min(self._retry_delay * 2, RETRY_MAX_SECONDS)
+
+    def _set_online(self, online):
+        self.online = online
+        if online:
+            self._retry_delay = RETRY_MIN_SECONDS
+
+    def pending_count(self):
+        return len(self.cache.outbox(self.user_id))
+
+    def _report(self):
+        pending = self.pending_count()
+        waiting = f", {pending} waiting to upload" if pending else ""
+        if self.online is False:
+            _, _, synced_at = self.cache.sync_state(self.user_id)
+            since = time.strftime(" from %d %b %H:%M", time.localtime(synced_at)) if synced_at else ""
+            self.status_changed.emit(f"Offline: showing saved data{since}{waiting}")
+        elif self.online:
+            self.status_changed.emit(f"Synced {time.strftime('%H:%M')}{waiting}")
+        elif pending:
+            self.status_changed.emit(f"{pending} waiting to upload")
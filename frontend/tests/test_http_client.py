@@ -0,0 +1,73 @@
+"""HttpClient against a local stub server: connection reuse and retries.
+
+Run from frontend/:
+    python -m pytest tests
+"""
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_client import HttpClient  # noqa: E402
+
+REQUESTS = 50
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every GET with JSON; /flaky fails with 503 while the server's flaky count lasts"""
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.peers.add(self.client_address)
+        if self.path == '/flaky' and self.server.flaky:
+            self.server.flaky -= 1
+            status, body = 503, b'{"error": "Server busy, please retry"}'
+        else:
+            status, body = 200, b'{"message": "ok"}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 503:
+            self.send_header('Retry-After', '0')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.peers = set()
+    server.flaky = 2
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def stub(server):
+    client = HttpClient(f'http://127.0.0.1:{server.server_port}', backoff_factor=0)
+    yield client
+    client.close()
+
+
+def test_requests_reuse_one_connection(server, stub):
+    for expense_id in range(REQUESTS):
+        assert stub.get(f'/expenses/{expense_id}').status_code == 200
+    assert len(server.peers) == 1
+    assert stub.connections_opened() == 1
+    assert stub.metrics()['GET /expenses/{id}']['count'] == REQUESTS
+
+
+def test_503_is_retried(server, stub):
+    assert stub.get('/flaky').status_code == 200
+    assert server.flaky == 0
+    assert stub.metrics()['GET /flaky']['errors'] == 0